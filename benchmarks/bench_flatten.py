@@ -0,0 +1,73 @@
+# --------------------------------------------------------------
+# benchmarks/bench_flatten.py
+# transform.records_to_frame() vs the old per-record flatten loop
+# --------------------------------------------------------------
+#   python benchmarks/bench_flatten.py [n_records]
+# --------------------------------------------------------------
+
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transform import records_to_frame
+
+PRICE_KEYS = ["Elpris", "Påslag", "Elcertifikat", "Fast avgift kr/mån", "Moms", "Nätavgift/år"]
+
+
+def synthetic_records(n, seed=1):
+    rnd = random.Random(seed)
+    records = []
+    for i in range(n):
+        keys = rnd.sample(PRICE_KEYS, rnd.randint(2, len(PRICE_KEYS)))
+        records.append({
+            "scraped_zip_code": "11121",
+            "scraped_county": "Stockholm län",
+            "scraped_consumption_kwh": rnd.choice(["2000", "5000", "20000"]),
+            "url": f"https://elpriskollen.se/avtal/{i}",
+            "contract_name": f"Avtal {i % 500}",
+            "jämförpris": f"{rnd.randint(50, 400)},{rnd.randint(0, 99):02d} öre/kWh",
+            "consumption_info": f"vid {rnd.choice(['2 000', '5 000', '20 000'])} kWh/år",
+            "energy_sources": rnd.sample(["Vind", "Vatten", "Kärnkraft"], rnd.randint(0, 3)),
+            "price_breakdown": {k: f"{rnd.randint(1, 999)},{rnd.randint(0, 99):02d} öre/kWh" for k in keys},
+            "provider_phone": None,
+        })
+    return records
+
+
+def old_loop(data):
+    flat = []
+    for item in data:
+        row = item.copy()
+        pb = row.pop("price_breakdown", {})
+        for k, v in pb.items():
+            row[f"price_{k.replace(' ', '_').replace('/', '_')}"] = v
+        es = row.pop("energy_sources", [])
+        row["energy_sources"] = "; ".join(es) if es else ""
+        flat.append(row)
+    return pd.DataFrame(flat)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    records = synthetic_records(n)
+
+    old, t_old = timed(old_loop, records)
+    new, t_new = timed(records_to_frame, records)
+    typed, t_typed = timed(records_to_frame, records, True)
+
+    pd.testing.assert_frame_equal(old, new, check_dtype=False)
+    print(f"{n} records")
+    print(f"  old loop + DataFrame      {t_old:7.3f}s")
+    print(f"  records_to_frame          {t_new:7.3f}s  ({t_old / t_new:.1f}x)")
+    print(f"  records_to_frame(typed)   {t_typed:7.3f}s  ({len(typed.columns) - len(new.columns)} typed columns)")
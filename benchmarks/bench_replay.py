@@ -0,0 +1,138 @@
+# --------------------------------------------------------------
+# benchmarks/bench_replay.py
+# scrape_for_zip() end to end against the local stand-in site
+# --------------------------------------------------------------
+# No network needed: the stand-in (benchmarks/standin_site.py) runs in
+# this process and SITE_URL points the scraper at it. Reports
+#   records/s, pages/s, wall time, time per stage (tracing spans),
+#   wait time per step (Readiness),
+#   requests per type, peak RSS (this process + largest child, i.e.
+#   the browser)
+#
+#   python benchmarks/bench_replay.py --zips 0 --contracts 30 --latency-ms 50
+#   python benchmarks/bench_replay.py --detail-concurrency 1 --json serial.json
+#
+# Compare two fetch paths by running twice with the same site options
+# and diffing the --json outputs.
+# --------------------------------------------------------------
+
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from standin_site import StandinSite, serve
+
+
+def peak_rss_mb():
+    per_mb = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss: bytes vs KiB
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / per_mb
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / per_mb
+    return round(own, 1), round(children, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline scrape_for_zip benchmark")
+    parser.add_argument("--zips", default="0", help="ZIP indexes, e.g. 0 or 0,3,5-7")
+    parser.add_argument("--contracts", type=int, default=30, help="contracts per listing")
+    parser.add_argument("--page-size", type=int, default=10, help="cards per 'Visa mer' page")
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--detail-latency-ms", type=int)
+    parser.add_argument("--detail-concurrency", type=int, default=4, help="1 = serial detail loop")
+    parser.add_argument("--extractor", choices=["snapshot", "locators"],
+                        help="locators only applies to the serial loop (--detail-concurrency 1)")
+    parser.add_argument("--headed", action="store_true")
+    parser.add_argument("--json", help="write the results here")
+    args = parser.parse_args()
+
+    site = StandinSite(args.contracts, args.page_size, args.latency_ms, args.detail_latency_ms)
+    server, base_url = serve(site)
+    os.environ["SITE_URL"] = base_url  # read at import time by the scraper modules
+    os.environ.setdefault("RATE_LIMIT", "0")  # measure the scraper, not the politeness budget
+    if args.extractor:
+        os.environ["DETAIL_EXTRACTOR"] = args.extractor
+
+    from playwright.sync_api import sync_playwright
+
+    import scrape_elpriskollen as scraper
+    from detail_pages import CONTEXT_OPTIONS, DetailPool
+    from navigator import ResultsNavigator
+    from readiness import Readiness
+    from routing import RequestRouter
+    from tracing import TRACER
+
+    indexes = scraper.parse_zip_indexes(args.zips)
+    ready = Readiness()
+    router = RequestRouter()
+    records = 0
+    per_zip = []
+
+    print(f"Stand-in site on {base_url}: {args.contracts} contracts/listing, "
+          f"page size {args.page_size}, latency {args.latency_ms} ms")
+    started = time.monotonic()
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=not args.headed)
+        detail_pool = None
+        if args.detail_concurrency > 1:
+            detail_pool = DetailPool(pool_size=args.detail_concurrency, headless=not args.headed,
+                                     ready=ready, router=router).start()
+        try:
+            for i in indexes:
+                context = browser.new_context(**CONTEXT_OPTIONS)
+                router.attach(context)
+                page = context.new_page()
+                zip_started = time.monotonic()
+                n = len(scraper.scrape_for_zip(
+                    page, scraper.COUNTIES[i],
+                    detail_pool=detail_pool, ready=ready, navigator=ResultsNavigator(enabled=scraper.DEEP_LINKS),
+                ))
+                per_zip.append({"zip": scraper.COUNTIES[i]["zip_code"], "records": n,
+                                "wall_s": round(time.monotonic() - zip_started, 2)})
+                records += n
+                context.close()
+        finally:
+            if detail_pool is not None:
+                detail_pool.close()
+            browser.close()
+    wall = time.monotonic() - started
+    server.shutdown()
+
+    rss_self, rss_children = peak_rss_mb()
+    result = {
+        "options": vars(args),
+        "records": records,
+        "pages": site.pages(),
+        "requests": dict(site.hits),
+        "wall_s": round(wall, 2),
+        "records_per_s": round(records / wall, 2),
+        "pages_per_s": round(site.pages() / wall, 2),
+        "per_zip": per_zip,
+        "steps": ready.summary(),
+        "stages": TRACER.stages(),
+        "peak_rss_mb": {"python": rss_self, "largest_child": rss_children},
+    }
+
+    ready.print_summary()
+    TRACER.print_summary()
+    print("\nPer ZIP:")
+    for z in per_zip:
+        print(f"  {z['zip']}  {z['records']:>5} records  {z['wall_s']:>8.2f}s")
+    print(f"\nRequests served: {result['requests']}")
+    print(f"Records: {records} in {wall:.2f}s → {result['records_per_s']} records/s, "
+          f"{result['pages_per_s']} pages/s")
+    print(f"Peak RSS: python {rss_self} MB, largest child {rss_children} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"Results → {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+# --------------------------------------------------------------
+# benchmarks/standin_site.py
+# Local stand-in for elpriskollen.se (wizard, listing, detail pages)
+# --------------------------------------------------------------
+# Same DOM hooks the scraper uses (#pcode, #annual_consumption,
+# .contractTypeButtons, FAST PRIS durations, Fortsätt, result cards,
+# "Visa mer", detail-page blocks), synthetic but deterministic content.
+#
+#   /                                 homepage + cookie banner + wizard
+#   /resultat?postnummer=&forbrukning=&avtalstyp=[&bindningstid=]
+#                                     first PAGE_SIZE cards + "Visa mer"
+#   /api/steg                         wizard step (JS fetch)
+#   /api/avtal?...&offset=            next page of cards (JSON)
+#   /api/avtalslista?...&offset=&limit=
+#                                     contract objects + total (JSON), one
+#                                     page of them fetched by the results
+#                                     page on load (capture mode input)
+#   /avtal/<id>?forbrukning=          contract detail page
+#   /api/avtalsdetalj/<id>?forbrukning=
+#                                     detail fields (JSON), fetched by the
+#                                     detail page on load
+#
+# Every request waits `latency_ms` (detail pages `detail_latency_ms`).
+#
+#   python benchmarks/standin_site.py --port 8765 --contracts 40
+#   SITE_URL=http://127.0.0.1:8765 python scrape_elpriskollen.py
+# --------------------------------------------------------------
+
+import argparse
+import html
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PROVIDERS = [
+    "Norrsken Energi", "Vattenfall Lokal", "Gröna Elbolaget", "Kustkraft", "Fjällström El",
+    "Sydel", "Mälarenergi Handel", "Bergslagens Kraft", "Östersjö Energi", "Skogsbrukets El",
+]
+CONTRACT_TYPES = ["Kvartspris", "Timpris", "Rörligt pris", "Mixat pris", "Fast pris"]
+ENERGY_MIX = ["Vind", "Vatten", "Solkraft", "Kärnkraft", "Förnybar", "Residualmix"]
+DURATIONS = ["1 år", "2 år", "3 år", "4 år", "5 år"]
+
+
+def price_area(zip_code):
+    first = int(zip_code[0])
+    return "SE1" if first == 9 else "SE2" if first == 8 else "SE3" if first >= 5 or first <= 1 else "SE4"
+
+
+def swedish(value, decimals=2):
+    text = f"{value:,.{decimals}f}".replace(",", " ").replace(".", ",")
+    return text
+
+# --------------------------------------------------------------
+class StandinSite:
+    """Content + counters. One contract list per (zip, consumption, type)."""
+
+    def __init__(self, contracts=30, page_size=10, latency_ms=0, detail_latency_ms=None, seed=1):
+        self.contracts = contracts
+        self.page_size = page_size
+        self.latency_ms = latency_ms
+        self.detail_latency_ms = latency_ms if detail_latency_ms is None else detail_latency_ms
+        self.seed = seed
+        self.hits = {}
+        self._lock = threading.Lock()
+
+    def count(self, kind):
+        with self._lock:
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+
+    def pages(self):
+        """HTML documents served (what a browser navigates to)."""
+        return sum(self.hits.get(k, 0) for k in ("home", "results", "detail"))
+
+    def listing(self, zip_code, consumption, type_index, duration=None):
+        rnd = random.Random(f"{self.seed}|{zip_code}|{consumption}|{type_index}")
+        cards = []
+        for i in range(self.contracts):
+            provider = PROVIDERS[rnd.randrange(len(PROVIDERS))]
+            if type_index == 5:
+                months = None
+                binding = DURATIONS[(duration or 5) - 1]
+            else:
+                months = rnd.choice([0, 12, 24])
+                binding = f"{months} månader" if months else "Tillsvidare"
+            cards.append({
+                "id": f"{zip_code}-{type_index}-{i}",
+                "provider": provider,
+                "name": f"{provider} {CONTRACT_TYPES[type_index - 1]} {i + 1}",
+                "duration": binding,
+                "jamforpris": rnd.uniform(40, 260),
+                "seed": rnd.random(),
+            })
+        return cards
+
+    def detail(self, contract_id, consumption):
+        zip_code, type_index, i = contract_id.rsplit("-", 2)
+        card = self.listing(zip_code, consumption, int(type_index))[int(i)]
+        rnd = random.Random(card["seed"])
+        return card, {
+            "type": CONTRACT_TYPES[int(type_index) - 1],
+            "area": f"Elområde {price_area(zip_code)}",
+            "prices": {
+                "Elpris": f"{swedish(rnd.uniform(20, 180))} öre/kWh",
+                "Påslag": f"{swedish(rnd.uniform(0, 9))} öre/kWh",
+                "Elcertifikat": f"{swedish(rnd.uniform(0, 2))} öre/kWh",
+                "Fast avgift": f"{swedish(rnd.uniform(0, 69), 0)} kr/mån",
+                "Total årskostnad": f"{swedish(card['jamforpris'] * int(consumption) / 100, 0)} kr/år",
+            },
+            "energy": rnd.sample(ENERGY_MIX, rnd.randint(1, 3)),
+            "notice": rnd.choice(["1 månad", "3 månader", "ingen"]),
+        }
+
+# --------------------------------------------------------------
+# HTML
+
+PAGE = """<!doctype html>
+<html lang="sv"><head><meta charset="utf-8"><title>{title}</title></head>
+<body>{body}</body></html>"""
+
+HOME_BODY = """
+<div id="cookie-banner"><p>Vi använder kakor.</p><button type="button"
+  onclick="document.getElementById('cookie-banner').remove()">Godkänn alla kakor</button></div>
+<div id="app"><div id="wizard">
+  <label>Postnummer <input id="pcode"></label>
+  <button id="next-page" type="button">Nästa</button>
+</div></div>
+<script>
+const state = {};
+const wizard = () => document.getElementById("wizard");
+async function step(name) { await fetch("/api/steg?steg=" + name); }
+function resultsUrl() {
+  let url = "/resultat?postnummer=" + state.pcode + "&forbrukning=" + state.kwh + "&avtalstyp=" + state.type;
+  if (state.duration) url += "&bindningstid=" + state.duration;
+  return url;
+}
+function chooseType(i) {
+  state.type = i;
+  document.querySelector(".fastaDesktop").style.display = i === 5 ? "block" : "none";
+  const go = document.querySelector(".epk-button a");
+  go.href = resultsUrl();
+  go.style.display = "inline-block";
+}
+function chooseDuration(years) {
+  state.duration = years;
+  document.querySelector(".epk-button a").href = resultsUrl();
+}
+document.addEventListener("click", async (e) => {
+  if (e.target.id !== "next-page") return;
+  if (!state.pcode) {
+    state.pcode = document.getElementById("pcode").value;
+    await step("postnummer");
+    wizard().innerHTML = '<label>Årsförbrukning <input id="annual_consumption"></label>' +
+      '<button id="next-page" type="button">Nästa</button>';
+  } else {
+    state.kwh = document.getElementById("annual_consumption").value;
+    await step("forbrukning");
+    wizard().innerHTML = CONTRACT_STEP;
+  }
+});
+const CONTRACT_STEP = `
+<div class="guide__preamble"><div class="env-form-element">
+  <div class="contractTypeButtons">TYPE_BUTTONS</div>
+  <div class="fastaDesktop" style="display:none"><div class="contractTypeFastChild">DURATION_BUTTONS</div></div>
+</div></div>
+<div class="epk-button"><a class="env-button" style="display:none" href="#">Fortsätt</a></div>`;
+</script>"""
+
+CARD = """<div class="pLyFbiEj6YnPeSF9DI94">
+  <h3>{provider}</h3><p>{name}</p><p>Bindningstid: {duration}</p><p>{price} öre/kWh</p>
+  <div class="aVZNlNTkwbkNs_DcrCqg"><a class="env-button" href="{href}">Till avtalet</a></div>
+</div>"""
+
+RESULTS_BODY = """
+<div id="app"><h1>Elavtal för {zip_code}</h1><div id="cards">{cards}</div>
+{show_more}</div>
+<script>
+fetch("/api/avtalslista{query}&offset=0&limit={shown}");
+let offset = {shown};
+async function showMore() {{
+  const r = await fetch("/api/avtal{query}&offset=" + offset);
+  const data = await r.json();
+  document.getElementById("cards").insertAdjacentHTML("beforeend", data.cards.join(""));
+  offset += data.cards.length;
+  if (!data.more) document.getElementById("show-more").remove();
+}}
+</script>"""
+
+SHOW_MORE = '<button id="show-more" class="env-button" type="button" onclick="showMore()">Visa mer</button>'
+
+DETAIL_BODY = """
+<div class="SvveEH5y1QdtM2MuMz07">
+  <div class="e3icZ8YXD7PTtS8321U3">
+    <div class="AOqumsb2RS0O78r9kzMX">{type}</div><div class="AOqumsb2RS0O78r9kzMX">{area}</div>
+  </div>
+  <h1>{name}</h1>
+</div>
+<div class="gdeuxYpfTrq6O5EdKun6"><h2>{price} öre/kWh</h2><p>Vid en förbrukning på {kwh} kWh/år</p></div>
+<table class="env-table env-table--zebra"><tbody>{rows}</tbody></table>
+<div class="AWGCPcYaBUXjAUTBLl0c">
+  <h3>{provider}</h3>
+  <h4>Telefon</h4><a href="tel:0771100100">0771-100 100</a>
+  <h4>E-post</h4><a href="mailto:kund@{domain}.se">kund@{domain}.se</a>
+</div>
+<div class="Tgc321GpCPUvHqOKChsl">
+  <a target="_blank" href="https://{domain}.se/byt">Byt avtal</a>
+  <a target="_blank" href="https://{domain}.se/villkor.pdf">Villkor</a>
+  <a target="_blank" href="https://{domain}.se">Webbplats</a>
+</div>
+<section>
+  <p>Elens ursprung: {energy}.</p>
+  <p>Uppsägningstid: {notice}. Fakturering sker månadsvis i efterskott.</p>
+  <p>Betalning via autogiro, e-faktura eller Swish.</p>
+  <p>Avtalet förlängs automatiskt och övergår till tillsvidare.</p>
+</section>
+<script>fetch("/api/avtalsdetalj/{id}?forbrukning={consumption}");</script>"""
+
+
+def home_page():
+    types = "".join(
+        f'<a class="selectButton" href="javascript:void(0)" onclick="chooseType({i})">{t}</a>'
+        for i, t in enumerate(CONTRACT_TYPES, start=1)
+    )
+    durations = '<div><span>Bindningstid</span></div>' + "".join(
+        f'<div><a href="javascript:void(0)" onclick="chooseDuration({y})">{y} år</a></div>'
+        for y in range(1, 6)
+    )
+    body = HOME_BODY.replace("TYPE_BUTTONS", types).replace("DURATION_BUTTONS", durations)
+    return PAGE.format(title="Elpriskollen (stand-in)", body=body)
+
+
+def card_html(card, consumption):
+    return CARD.format(
+        provider=html.escape(card["provider"]),
+        name=html.escape(card["name"]),
+        duration=card["duration"],
+        price=swedish(card["jamforpris"]),
+        href=f"/avtal/{card['id']}?forbrukning={consumption}",
+    )
+
+
+def results_page(site, q):
+    zip_code, consumption = q["postnummer"], q["forbrukning"]
+    cards = site.listing(zip_code, consumption, int(q["avtalstyp"]), int(q.get("bindningstid") or 5))
+    shown = cards[:site.page_size]
+    query = "?" + "&".join(f"{k}={v}" for k, v in q.items() if k != "offset")
+    body = RESULTS_BODY.format(
+        zip_code=zip_code,
+        cards="".join(card_html(c, consumption) for c in shown),
+        show_more=SHOW_MORE if len(cards) > len(shown) else "",
+        shown=len(shown),
+        query=query,
+    )
+    return PAGE.format(title=f"Elavtal {zip_code} – Elpriskollen (stand-in)", body=body)
+
+
+def more_cards(site, q):
+    consumption = q["forbrukning"]
+    cards = site.listing(q["postnummer"], consumption, int(q["avtalstyp"]), int(q.get("bindningstid") or 5))
+    offset = int(q.get("offset", 0))
+    page = cards[offset:offset + site.page_size]
+    return {"cards": [card_html(c, consumption) for c in page], "more": offset + len(page) < len(cards)}
+
+
+def contract_list(site, q):
+    consumption = q["forbrukning"]
+    cards = site.listing(q["postnummer"], consumption, int(q["avtalstyp"]), int(q.get("bindningstid") or 5))
+    offset, limit = int(q.get("offset", 0)), int(q.get("limit", site.page_size))
+    return {
+        "total": len(cards),
+        "offset": offset,
+        "contracts": [{
+            "id": c["id"],
+            "url": f"/avtal/{c['id']}?forbrukning={consumption}",
+            "contractName": c["name"],
+            "supplierName": c["provider"],
+            "contractDuration": c["duration"],
+            "comparisonPrice": f"{swedish(c['jamforpris'])} öre/kWh",
+        } for c in cards[offset:offset + limit]],
+    }
+
+
+def domain(provider):
+    return provider.split()[0].lower().replace("ö", "o").replace("ä", "a").replace("å", "a")
+
+
+def contract_detail(site, contract_id, consumption):
+    card, info = site.detail(contract_id, consumption)
+    return {
+        "id": contract_id,
+        "contractType": info["type"],
+        "priceArea": info["area"],
+        "contractName": card["name"],
+        "supplierName": card["provider"],
+        "consumptionText": f"Vid en förbrukning på {swedish(int(consumption), 0)} kWh/år",
+        "comparisonPrice": f"{swedish(card['jamforpris'])} öre/kWh",
+        "energySources": info["energy"],
+        "priceBreakdown": info["prices"],
+        "noticePeriod": info["notice"],
+        "billingOptions": "Månadsvis i efterskott",
+        "changeContractUrl": f"https://{domain(card['provider'])}.se/byt",
+        "termsUrl": f"https://{domain(card['provider'])}.se/villkor.pdf",
+        "website": f"https://{domain(card['provider'])}.se",
+        "phone": "0771-100 100",
+        "email": f"kund@{domain(card['provider'])}.se",
+    }
+
+
+def detail_page(site, contract_id, consumption):
+    card, info = site.detail(contract_id, consumption)
+    body = DETAIL_BODY.format(
+        id=contract_id,
+        consumption=consumption,
+        type=info["type"],
+        area=info["area"],
+        name=html.escape(card["name"]),
+        price=swedish(card["jamforpris"]),
+        kwh=swedish(int(consumption), 0),
+        rows="".join(f"<tr><td>{k}</td><td>{v}</td></tr>" for k, v in info["prices"].items()),
+        provider=html.escape(card["provider"]),
+        domain=domain(card["provider"]),
+        energy=", ".join(info["energy"]),
+        notice=info["notice"],
+    )
+    return PAGE.format(title=f"{html.escape(card['name'])} – Elpriskollen (stand-in)", body=body)
+
+# --------------------------------------------------------------
+def make_handler(site):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, content_type="text/html; charset=utf-8"):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                if url.path.startswith("/avtal/"):
+                    site.count("detail")
+                    time.sleep(site.detail_latency_ms / 1000)
+                    self._send(200, detail_page(site, url.path[len("/avtal/"):], q.get("forbrukning", "2000")))
+                    return
+                time.sleep(site.latency_ms / 1000)
+                if url.path == "/":
+                    site.count("home")
+                    self._send(200, home_page())
+                elif url.path == "/resultat":
+                    site.count("results")
+                    self._send(200, results_page(site, q))
+                elif url.path == "/api/avtal":
+                    site.count("api")
+                    self._send(200, json.dumps(more_cards(site, q)), "application/json")
+                elif url.path == "/api/avtalslista":
+                    site.count("api")
+                    self._send(200, json.dumps(contract_list(site, q), ensure_ascii=False), "application/json")
+                elif url.path.startswith("/api/avtalsdetalj/"):
+                    site.count("api_detail")
+                    detail = contract_detail(site, url.path[len("/api/avtalsdetalj/"):], q.get("forbrukning", "2000"))
+                    self._send(200, json.dumps(detail, ensure_ascii=False), "application/json")
+                elif url.path == "/api/steg":
+                    site.count("api")
+                    self._send(200, "{}", "application/json")
+                else:
+                    site.count("other")
+                    self._send(404, "not found", "text/plain")
+            except (KeyError, ValueError, IndexError) as e:
+                self._send(400, f"bad request: {e}", "text/plain")
+
+    return Handler
+
+
+def serve(site, port=0):
+    """Starts the server in a daemon thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(site))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# --------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the elpriskollen stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--contracts", type=int, default=30, help="contracts per listing")
+    parser.add_argument("--page-size", type=int, default=10, help="cards per 'Visa mer' page")
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--detail-latency-ms", type=int)
+    args = parser.parse_args()
+
+    site = StandinSite(args.contracts, args.page_size, args.latency_ms, args.detail_latency_ms)
+    server, url = serve(site, args.port)
+    print(f"Stand-in site on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,352 @@
+# --------------------------------------------------------------
+# capture.py
+# Network-capture mode: build records from the site's JSON/XHR
+# --------------------------------------------------------------
+# - ResponseCapture hooks page.on("response") and keeps every JSON
+#   payload from elpriskollen.se seen during the wizard
+# - The contract list is the biggest list of objects that maps to
+#   a contract name; each object → same record schema as the DOM path
+# - Listings are paginated: when the payload's URL has an offset /
+#   page parameter, the next pages are requested through
+#   context.request until the payload's total is reached (or a page
+#   comes back short). Fewer objects than that total, or than the
+#   cards rendered in the DOM → returns None (DOM fallback)
+# - If listing objects lack the detail fields, the detail endpoint is
+#   learned once (one real detail-page visit) and then replayed for
+#   every contract id through context.request (pooled HTTP, shares
+#   the browser's cookies)
+# - Nothing recognised, or a detail that can't be read → returns None,
+#   caller falls back to the DOM for the whole result view
+#
+# The JSON key names are not documented. DEFAULT_FIELD_MAP is a best
+# guess; dump real payloads with CAPTURE_DUMP_DIR and override with
+# CAPTURE_FIELD_MAP=path/to/field_map.json
+# --------------------------------------------------------------
+
+import json
+import os
+import re
+from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+
+from detail_pages import make_record
+from navigator import SITE_URL
+from throttle import THROTTLE
+
+# ==================== CONFIGURATION ====================
+
+CAPTURE_MODE = os.getenv("CAPTURE_MODE", "false").lower() == "true"
+CAPTURE_DUMP_DIR = os.getenv("CAPTURE_DUMP_DIR", "")
+CAPTURE_FIELD_MAP = os.getenv("CAPTURE_FIELD_MAP", "")
+# e.g. "https://elpriskollen.se/avtal/{id}" when the JSON only has ids
+CAPTURE_DETAIL_URL = os.getenv("CAPTURE_DETAIL_URL", "")
+CAPTURE_MAX_PAGES = int(os.getenv("CAPTURE_MAX_PAGES", "50"))
+
+CAPTURE_HOST = urlparse(SITE_URL).netloc
+SITE_ROOT = SITE_URL
+
+# record field → candidate keys (dotted paths), first non-empty wins
+DEFAULT_FIELD_MAP = {
+    "id": ["id", "contractId", "productId", "uuid"],
+    "url": ["url", "href", "link", "detailUrl", "path"],
+    "contract_duration": ["contractDuration", "duration", "bindingTime", "contractLength"],
+    "title": ["pageTitle"],
+    "contract_type": ["contractType", "contractTypeName", "priceType", "type"],
+    "electrical_area": ["priceArea", "electricityArea", "elomrade", "area"],
+    "contract_name": ["contractName", "productName", "name", "title"],
+    "provider_name": ["supplierName", "companyName", "providerName", "supplier.name", "company.name"],
+    "consumption_info": ["consumptionInfo", "consumptionText"],
+    "jämförpris": ["comparisonPrice", "jamforpris", "comparePrice", "totalPrice"],
+    "energy_sources": ["energySources", "energySource", "origin"],
+    "price_breakdown": ["priceBreakdown", "priceComponents", "prices", "costs"],
+    "notice_period": ["noticePeriod", "terminationPeriod"],
+    "billing_options": ["billingOptions", "billing", "invoicing"],
+    "payment_options": ["paymentOptions", "paymentMethods"],
+    "expiry_info": ["expiryInfo", "afterExpiry"],
+    "change_contract_link": ["changeContractUrl", "orderUrl", "signUpUrl"],
+    "terms_link": ["termsUrl", "termsLink", "conditionsUrl"],
+    "supplier_website": ["supplierWebsite", "website", "supplier.website", "company.website"],
+    "provider_phone": ["phone", "supplierPhone", "supplier.phone", "company.phone"],
+    "provider_email": ["email", "supplierEmail", "supplier.email", "company.email"],
+}
+
+
+# listing size next to (or above) the contract list
+TOTAL_KEYS = ["total", "totalCount", "totalHits", "numberOfHits", "count",
+              "meta.total", "pagination.total", "paging.total"]
+# query parameters that page a listing: advance by objects / by pages
+OFFSET_PARAMS = ["offset", "skip", "start", "from"]
+PAGE_PARAMS = ["page", "pageNumber", "sida"]
+
+
+def load_field_map():
+    field_map = dict(DEFAULT_FIELD_MAP)
+    if CAPTURE_FIELD_MAP:
+        with open(CAPTURE_FIELD_MAP, "r", encoding="utf-8") as f:
+            field_map.update(json.load(f))
+    return field_map
+
+# --------------------------------------------------------------
+# JSON → record fields
+
+def get_path(obj, path):
+    for part in path.split("."):
+        if not isinstance(obj, dict) or part not in obj:
+            return None
+        obj = obj[part]
+    return obj
+
+
+def pick(obj, candidates):
+    for path in candidates:
+        value = get_path(obj, path)
+        if value not in (None, "", [], {}):
+            return value
+    return None
+
+
+def as_text(value):
+    if value is None:
+        return None
+    return value.strip() if isinstance(value, str) else str(value)
+
+
+def as_price_breakdown(value):
+    """Accepts {"name": value} or [{"name"/"label": .., "value"/"price": ..}]."""
+    if isinstance(value, dict):
+        return {str(k).strip(): as_text(v) for k, v in value.items()}
+    breakdown = {}
+    for row in value or []:
+        if isinstance(row, dict):
+            k = pick(row, ["name", "label", "title", "key"])
+            v = pick(row, ["value", "price", "amount", "text"])
+            if k is not None:
+                breakdown[str(k).strip()] = as_text(v)
+    return breakdown
+
+
+def as_energy_sources(value):
+    if isinstance(value, str):
+        return [value.strip().capitalize()]
+    if isinstance(value, dict):
+        return sorted(str(k).capitalize() for k, v in value.items() if v)
+    return sorted({str(v).strip().capitalize() for v in value or [] if v})
+
+
+def fields_from_json(obj, field_map):
+    fields = {key: pick(obj, candidates) for key, candidates in field_map.items()}
+    fields["price_breakdown"] = as_price_breakdown(fields["price_breakdown"])
+    fields["energy_sources"] = as_energy_sources(fields["energy_sources"])
+    for key, value in fields.items():
+        if key not in ("price_breakdown", "energy_sources"):
+            fields[key] = as_text(value)
+    email = fields["provider_email"]
+    if email and email.startswith("mailto:"):
+        fields["provider_email"] = email[7:].strip()
+    return fields
+
+
+def detail_url(fields):
+    url = fields.get("url")
+    if url:
+        return url if url.startswith("http") else SITE_ROOT + url
+    if fields.get("id") and CAPTURE_DETAIL_URL:
+        return CAPTURE_DETAIL_URL.format(id=fields["id"])
+    return None
+
+
+def iter_object_lists(body, parent=None):
+    """Yields (list, dict holding it) for every list of dicts anywhere
+    inside a JSON payload."""
+    if isinstance(body, list):
+        if body and all(isinstance(x, dict) for x in body):
+            yield body, parent
+        for x in body:
+            yield from iter_object_lists(x)
+    elif isinstance(body, dict):
+        for v in body.values():
+            yield from iter_object_lists(v, body)
+
+
+def listed_total(*containers):
+    """Listing size announced by the payload (first container that has one)."""
+    for container in containers:
+        value = pick(container, TOTAL_KEYS) if isinstance(container, dict) else None
+        try:
+            if value is not None:
+                return int(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def next_page_url(url, param, value):
+    parts = urlparse(url)
+    query = parse_qs(parts.query, keep_blank_values=True)
+    query[param] = [str(value)]
+    return urlunparse(parts._replace(query=urlencode(query, doseq=True)))
+
+# --------------------------------------------------------------
+class ResponseCapture:
+    def __init__(self, page, field_map=None):
+        self.field_map = field_map or load_field_map()
+        self.payloads = []
+        self.detail_template = None  # learned detail endpoint, "{id}" placeholder
+        page.on("response", self._on_response)
+
+    def _on_response(self, response):
+        if CAPTURE_HOST not in response.url:
+            return
+        if "json" not in (response.headers.get("content-type") or ""):
+            return
+        try:
+            body = response.json()
+        except Exception:
+            return
+        self.payloads.append({
+            "url": response.url,
+            "method": response.request.method,
+            "status": response.status,
+            "body": body,
+        })
+
+    def clear(self):
+        self.payloads = []
+
+    def dump(self, name):
+        if not CAPTURE_DUMP_DIR:
+            return
+        os.makedirs(CAPTURE_DUMP_DIR, exist_ok=True)
+        with open(os.path.join(CAPTURE_DUMP_DIR, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(self.payloads, f, indent=2, ensure_ascii=False)
+
+    # --- listing ---
+    def contract_list(self, body):
+        """(biggest list of contract objects, listed total) in one payload body."""
+        best, total = [], None
+        name_keys = self.field_map["contract_name"]
+        for objs, parent in iter_object_lists(body):
+            if len(objs) > len(best) and all(pick(o, name_keys) is not None for o in objs):
+                best, total = objs, listed_total(parent, body)
+        return best, total
+
+    def contract_objects(self):
+        """(contract objects, listed total or None, payload they came from)."""
+        best, total, source = [], None, None
+        for payload in self.payloads:
+            objs, listed = self.contract_list(payload["body"])
+            if len(objs) > len(best):
+                best, total, source = objs, listed, payload
+        return best, total, source
+
+    def object_key(self, obj):
+        key = pick(obj, self.field_map["id"]) or pick(obj, self.field_map["url"])
+        return str(key) if key is not None else json.dumps(obj, sort_keys=True)
+
+    def follow_paging(self, request, source, objs, total):
+        """Requests the pages after `source` (offset / page query parameter)
+        until `total` objects, an empty or short page, or CAPTURE_MAX_PAGES."""
+        query = parse_qs(urlparse(source["url"]).query)
+        param = next((p for p in OFFSET_PARAMS + PAGE_PARAMS if p in query), None)
+        if param is None or source["method"] != "GET":
+            return objs
+        try:
+            start = int(query[param][0])
+        except ValueError:
+            return objs
+        page_size = len(objs)
+        objs = list(objs)
+        seen = {self.object_key(o) for o in objs}
+        for page_no in range(1, CAPTURE_MAX_PAGES):
+            if total is not None and len(objs) >= total:
+                break
+            value = start + len(objs) if param in OFFSET_PARAMS else start + page_no
+            THROTTLE.acquire("api")
+            response = request.get(next_page_url(source["url"], param, value), timeout=60000)
+            THROTTLE.observe(response.status)
+            if not response.ok:
+                print(f"  capture: HTTP {response.status} for listing page {page_no + 1}")
+                break
+            more, _ = self.contract_list(response.json())
+            new = [o for o in more if self.object_key(o) not in seen]
+            if not new:
+                break
+            seen.update(self.object_key(o) for o in new)
+            objs.extend(new)
+            if total is None and len(more) < page_size:
+                break
+        return objs
+
+    # --- detail endpoint: learn once, then replay ---
+    def learn_detail_template(self, page, url, contract_id):
+        self.clear()
+        THROTTLE.goto(page, url, timeout=60000)
+        page.wait_for_load_state("networkidle")
+        for payload in self.payloads:
+            if contract_id in payload["url"] and payload["method"] == "GET":
+                self.detail_template = payload["url"].replace(contract_id, "{id}")
+                print(f"  capture: detail endpoint {self.detail_template}")
+                return payload["body"]
+        return None
+
+    def replay_detail(self, request, contract_id):
+        THROTTLE.acquire("api")
+        response = request.get(self.detail_template.format(id=contract_id), timeout=60000)
+        THROTTLE.observe(response.status)  # context.request calls bypass the response listener
+        if not response.ok:
+            raise RuntimeError(f"HTTP {response.status} for contract {contract_id}")
+        return response.json()
+
+    # --------------------------------------------------------------
+    def records(self, page, labels, rendered=0):
+        """Builds records for the current result view from captured JSON.
+        `rendered`: contract cards in the DOM. Returns None when no contract
+        payload was recognised, the JSON has fewer contracts than listed,
+        or a contract's detail could not be read. Learning the detail
+        endpoint navigates `page` away from the result view."""
+        objs, total, source = self.contract_objects()
+        if not objs:
+            print("  capture: no contract payload recognised")
+            return None
+        if total is None or total > len(objs):
+            objs = self.follow_paging(page.context.request, source, objs, total)
+        expected = max(total or 0, rendered)
+        if len(objs) < expected:
+            print(f"  capture: JSON has {len(objs)} of {expected} listed contracts")
+            return None
+
+        listing = [fields_from_json(o, self.field_map) for o in objs]
+        urls = [detail_url(f) for f in listing]
+        if None in urls:
+            return None
+        needs_detail = not any(f["price_breakdown"] for f in listing)
+        if needs_detail and not all(f["id"] for f in listing):
+            print("  capture: listing objects have no detail fields and no ids")
+            return None
+
+        # a contract whose detail can't be read must not go missing
+        # silently: any failure hands the whole view to the DOM path
+        records = []
+        for fields, url in zip(listing, urls):
+            if needs_detail:
+                try:
+                    if self.detail_template is None:
+                        body = self.learn_detail_template(page, url, fields["id"])
+                        if body is None:
+                            print("  capture: no detail endpoint seen on the detail page")
+                            return None
+                    else:
+                        body = self.replay_detail(page.context.request, fields["id"])
+                except Exception as e:
+                    print(f"  capture: detail {fields['id']} failed: {e}")
+                    return None
+                detail = fields_from_json(body, self.field_map)
+                fields.update({k: v for k, v in detail.items() if v not in (None, [], {})})
+            item = {"url": url, "contract_duration": fields["contract_duration"]}
+            records.append(make_record(labels, item, fields))
+            print(f"  Captured: {fields['contract_name']}")
+
+        return records
+
+
+def capture_name(labels):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", "{zip_code}_{consumption}_{contract_type}".format(**labels))
@@ -0,0 +1,495 @@
+# --------------------------------------------------------------
+# detail_pages.py
+# Contract detail-page extraction + pooled concurrent fetching
+# --------------------------------------------------------------
+# - scrape_detail_page():       serial path, reuses the wizard page
+# - scrape_detail_page_async(): snapshot extraction on an async page
+# - Extractors (DETAIL_EXTRACTOR):
+#     "snapshot" → one page.evaluate() returns a raw JSON snapshot,
+#                  parse_snapshot() turns it into fields (no browser)
+#     "locators" → the original per-field locator round trips
+#                  (serial path only; the pool always uses "snapshot")
+# - providers=ProviderCache: contact lookups skipped for known
+#   suppliers, provider fields kept consistent (providers.py)
+# - DetailPool:                 N async pages in a background loop,
+#                               max-in-flight limit, records returned
+#                               in the same order as the input URLs;
+#                               tabs recycled / replaced on crash or
+#                               hang, the page retried (page_pool.py)
+# --------------------------------------------------------------
+
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+
+from playwright.async_api import async_playwright
+
+from providers import provider_id
+from readiness import evaluate, evaluate_async
+from text_fields import extract_text_fields
+from throttle import THROTTLE
+from page_pool import PagePool, watch
+from tracing import span
+
+# ==================== CONFIGURATION ====================
+
+CONTEXT_OPTIONS = {
+    "viewport": {"width": 1920, "height": 1080},
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+}
+
+# "snapshot" (1 IPC call per page) or "locators" (~20 calls per page)
+DETAIL_EXTRACTOR = os.getenv("DETAIL_EXTRACTOR", "snapshot")
+
+# If set, every raw snapshot is also written here (for offline parser work)
+DETAIL_SNAPSHOT_DIR = os.getenv("DETAIL_SNAPSHOT_DIR", "")
+
+# Pool side: one detail page (navigation + extraction) is abandoned after
+# this long, and its tab probed / replaced like after any other error
+DETAIL_PAGE_TIMEOUT_S = float(os.getenv("DETAIL_PAGE_TIMEOUT_S", "120"))
+
+
+HEADER_SELECTOR = "div.SvveEH5y1QdtM2MuMz07 div.e3icZ8YXD7PTtS8321U3 div.AOqumsb2RS0O78r9kzMX"
+NAME_SELECTOR = "div.SvveEH5y1QdtM2MuMz07 h1"
+PROVIDER_SELECTOR = "div.AWGCPcYaBUXjAUTBLl0c h3"
+JAMFORPRIS_SELECTOR = "div.gdeuxYpfTrq6O5EdKun6 h2"
+CONSUMPTION_SELECTOR = "div.gdeuxYpfTrq6O5EdKun6 p"
+PRICE_ROW_SELECTOR = "table.env-table.env-table--zebra tbody tr"
+PHONE_SELECTOR = "div.AWGCPcYaBUXjAUTBLl0c h4:has-text('Telefon') + a"
+EMAIL_SELECTOR = "div.AWGCPcYaBUXjAUTBLl0c h4:has-text('E-post') + a"
+LINKS_SELECTOR = "div.Tgc321GpCPUvHqOKChsl a[target='_blank']"
+
+# --------------------------------------------------------------
+def make_record(labels, item, fields):
+    """Builds the output record. `labels` carries the wizard selection,
+    `item` the listing card data, `fields` what was read off the detail page.
+
+    selected_contract_type is the contract type picked in the wizard
+    (e.g. "FAST PRIS"). The old serial loop wrote the detail page's h1,
+    the contract name, there instead. Rows scraped before that change
+    hold contract names in this column (history, the sheet), and their
+    upload keys don't match new rows of the same contract."""
+    return {
+        "scraped_zip_code": labels["zip_code"],
+        "scraped_county": labels["county"],
+        "scraped_town": labels["town"],
+        "scraped_consumption_kwh": labels["consumption"],
+        "selected_contract_type": labels["contract_type"],
+        "url": item["url"],
+        "title": fields["title"],
+        "contract_duration": item["contract_duration"],
+        "contract_type": fields["contract_type"],
+        "electrical_area": fields["electrical_area"],
+        "contract_name": fields["contract_name"],
+        "provider_name": fields["provider_name"],
+        "consumption_info": fields["consumption_info"],
+        "jämförpris": fields["jämförpris"],
+        "energy_sources": fields["energy_sources"],
+        "price_breakdown": fields["price_breakdown"],
+        "notice_period": fields["notice_period"],
+        "billing_options": fields["billing_options"],
+        "payment_options": fields["payment_options"],
+        "expiry_info": fields["expiry_info"],
+        "change_contract_link": fields["change_contract_link"],
+        "terms_link": fields["terms_link"],
+        "supplier_website": fields["supplier_website"],
+        "provider_phone": fields["provider_phone"],
+        "provider_email": fields["provider_email"],
+        "provider_id": provider_id(fields["provider_name"], fields["supplier_website"]),
+    }
+
+
+def with_providers(providers, fields):
+    return providers.apply(fields) if providers is not None else fields
+
+# --------------------------------------------------------------
+# Locator extractor: one browser round trip per field
+
+def extract_fields_locators(page, providers=None):
+    # Header
+    contract_type = electrical_area = None
+    try:
+        headers = page.locator(HEADER_SELECTOR).all()
+        contract_type = headers[0].inner_text().strip() if len(headers) > 0 else None
+        electrical_area = headers[1].inner_text().strip() if len(headers) > 1 else None
+    except Exception:
+        pass
+
+    contract_name = page.locator(NAME_SELECTOR).inner_text().strip()
+    provider_name = page.locator(PROVIDER_SELECTOR).inner_text().strip()
+    jämförpris_block = page.locator(JAMFORPRIS_SELECTOR).first.inner_text().strip()
+    consumption_info = page.locator(CONSUMPTION_SELECTOR).first.inner_text().strip()
+
+    # Price table
+    price_breakdown = {}
+    try:
+        for r in page.locator(PRICE_ROW_SELECTOR).all():
+            cells = r.locator("td").all()
+            if len(cells) >= 2:
+                price_breakdown[cells[0].inner_text().strip()] = cells[1].inner_text().strip()
+    except Exception:
+        pass
+
+    # Contact (each lookup skipped once the provider has that value cached)
+    known = (providers.known(provider_name) if providers is not None else None) or {}
+    provider_phone, provider_email = known.get("provider_phone"), known.get("provider_email")
+    if provider_phone is None:
+        try:
+            provider_phone = page.locator(PHONE_SELECTOR).inner_text().strip()
+        except Exception:
+            pass
+
+    if provider_email is None:
+        try:
+            mail_href = page.locator(EMAIL_SELECTOR).get_attribute("href")
+            if mail_href and mail_href.startswith("mailto:"):
+                provider_email = mail_href[7:].strip()
+        except Exception:
+            pass
+
+    # Links
+    change_link = terms_link = website_link = None
+    try:
+        links = page.locator(LINKS_SELECTOR).all()
+        change_link = links[0].get_attribute("href") if len(links) > 0 else None
+        terms_link = links[1].get_attribute("href") if len(links) > 1 else None
+        website_link = links[2].get_attribute("href") if len(links) > 2 else None
+    except Exception:
+        pass
+
+    # Energy sources + text fields (one body snapshot, one pass)
+    text_fields = extract_text_fields("")
+    try:
+        text_fields = extract_text_fields(page.inner_text("body"))
+    except Exception:
+        pass
+
+    return with_providers(providers, {
+        "title": page.title(),
+        "contract_type": contract_type,
+        "electrical_area": electrical_area,
+        "contract_name": contract_name,
+        "provider_name": provider_name,
+        "consumption_info": consumption_info,
+        "jämförpris": jämförpris_block,
+        "price_breakdown": price_breakdown,
+        **text_fields,
+        "change_contract_link": change_link,
+        "terms_link": terms_link,
+        "supplier_website": website_link,
+        "provider_phone": provider_phone,
+        "provider_email": provider_email,
+    })
+
+
+# --------------------------------------------------------------
+# Snapshot extractor: one evaluate() returns everything as JSON
+
+SNAPSHOT_SELECTORS = {
+    "header": HEADER_SELECTOR,
+    "name": NAME_SELECTOR,
+    "provider": PROVIDER_SELECTOR,
+    "jamforpris": JAMFORPRIS_SELECTOR,
+    "consumption": CONSUMPTION_SELECTOR,
+    "price_row": PRICE_ROW_SELECTOR,
+    "contact_heading": "div.AWGCPcYaBUXjAUTBLl0c h4",
+    "links": LINKS_SELECTOR,
+}
+
+SNAPSHOT_JS = """
+(sel) => {
+    const all = (s, root = document) => [...root.querySelectorAll(s)];
+    const text = (el) => el ? el.innerText : null;
+    const contact = (label) => {
+        const h4 = all(sel.contact_heading).find(h => h.textContent.toLowerCase().includes(label));
+        const a = h4 ? h4.nextElementSibling : null;
+        return a && a.tagName === "A" ? a : null;
+    };
+    const email = contact("e-post");
+    return {
+        url: location.href,
+        title: document.title,
+        headers: all(sel.header).map(el => el.innerText),
+        contract_name: text(document.querySelector(sel.name)),
+        provider_name: text(document.querySelector(sel.provider)),
+        jamforpris: text(document.querySelector(sel.jamforpris)),
+        consumption_info: text(document.querySelector(sel.consumption)),
+        price_rows: all(sel.price_row).map(tr => all("td", tr).map(td => td.innerText)),
+        phone: text(contact("telefon")),
+        email_href: email ? email.getAttribute("href") : null,
+        links: all(sel.links).map(a => a.getAttribute("href")),
+        body_text: document.body ? document.body.innerText : "",
+    };
+}
+"""
+
+
+def parse_snapshot(snapshot):
+    """Pure-Python half of the snapshot extractor: raw snapshot → fields.
+    Raises ValueError when a field the locator path requires is missing."""
+    for key in ("contract_name", "provider_name", "jamforpris", "consumption_info"):
+        if snapshot.get(key) is None:
+            raise ValueError(f"detail page has no {key}")
+
+    headers = snapshot.get("headers") or []
+    links = snapshot.get("links") or []
+
+    price_breakdown = {}
+    for cells in snapshot.get("price_rows") or []:
+        if len(cells) >= 2:
+            price_breakdown[cells[0].strip()] = cells[1].strip()
+
+    provider_email = None
+    mail_href = snapshot.get("email_href")
+    if mail_href and mail_href.startswith("mailto:"):
+        provider_email = mail_href[7:].strip()
+
+    phone = snapshot.get("phone")
+
+    return {
+        "title": snapshot.get("title"),
+        "contract_type": headers[0].strip() if len(headers) > 0 else None,
+        "electrical_area": headers[1].strip() if len(headers) > 1 else None,
+        "contract_name": snapshot["contract_name"].strip(),
+        "provider_name": snapshot["provider_name"].strip(),
+        "consumption_info": snapshot["consumption_info"].strip(),
+        "jämförpris": snapshot["jamforpris"].strip(),
+        "price_breakdown": price_breakdown,
+        **extract_text_fields(snapshot.get("body_text")),
+        "change_contract_link": links[0] if len(links) > 0 else None,
+        "terms_link": links[1] if len(links) > 1 else None,
+        "supplier_website": links[2] if len(links) > 2 else None,
+        "provider_phone": phone.strip() if phone is not None else None,
+        "provider_email": provider_email,
+    }
+
+
+def save_snapshot(snapshot):
+    if not DETAIL_SNAPSHOT_DIR:
+        return
+    os.makedirs(DETAIL_SNAPSHOT_DIR, exist_ok=True)
+    name = re.sub(r"[^A-Za-z0-9_-]+", "_", snapshot.get("url", "").split("://", 1)[-1]).strip("_")
+    with open(os.path.join(DETAIL_SNAPSHOT_DIR, f"{name or 'snapshot'}.json"), "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2, ensure_ascii=False)
+
+
+def extract_fields_snapshot(page, providers=None):
+    page.wait_for_selector(NAME_SELECTOR)
+    snapshot = evaluate(page, SNAPSHOT_JS, SNAPSHOT_SELECTORS)
+    save_snapshot(snapshot)
+    return with_providers(providers, parse_snapshot(snapshot))
+
+
+async def extract_fields_snapshot_async(page, providers=None):
+    await page.wait_for_selector(NAME_SELECTOR)
+    snapshot = await evaluate_async(page, SNAPSHOT_JS, SNAPSHOT_SELECTORS)
+    save_snapshot(snapshot)
+    return with_providers(providers, parse_snapshot(snapshot))
+
+# --------------------------------------------------------------
+EXTRACTORS = {
+    "snapshot": extract_fields_snapshot,
+    "locators": extract_fields_locators,
+}
+
+
+def scrape_detail_page(page, item, labels, extractor=None, ready=None, providers=None):
+    with span("detail_navigation", labels, url=item["url"]):
+        THROTTLE.goto(page, item["url"], timeout=60000)
+        if ready is not None:
+            ready.network_idle(page, "detail")
+        else:
+            page.wait_for_timeout(2500)
+    with span("detail_extraction", labels, url=item["url"]):
+        fields = EXTRACTORS[extractor or DETAIL_EXTRACTOR](page, providers)
+    return make_record(labels, item, fields)
+
+
+async def scrape_detail_page_async(page, item, labels, ready=None, providers=None):
+    with span("detail_navigation", labels, url=item["url"]):
+        await THROTTLE.goto_async(page, item["url"], timeout=60000)
+        if ready is not None:
+            await ready.network_idle_async(page, "detail")
+        else:
+            await page.wait_for_timeout(2500)
+    with span("detail_extraction", labels, url=item["url"]):
+        fields = await extract_fields_snapshot_async(page, providers)
+    return make_record(labels, item, fields)
+
+# --------------------------------------------------------------
+class DetailPool:
+    """Fetches detail pages concurrently on a pool of async Playwright pages.
+
+    The async browser lives in its own thread + event loop, so the sync
+    wizard page in run() keeps working untouched. fetch() blocks until the
+    whole batch is done and returns records in input order (failed pages
+    are dropped, exactly like the serial loop)."""
+
+    def __init__(self, pool_size=4, max_in_flight=None, contexts=1, headless=True, ready=None,
+                 router=None, har=None, providers=None, pages=None):
+        self.pages = pages or PagePool()
+        self.providers = providers
+        self.ready = ready
+        self.router = router
+        self.har = har
+        self.pool_size = max(1, pool_size)
+        self.max_in_flight = max(1, min(max_in_flight or self.pool_size, self.pool_size))
+        self.contexts = max(1, min(contexts, self.pool_size))
+        self.headless = headless
+        self._loop = None
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._call(self._start())
+        return self
+
+    async def _start(self):
+        self._pw = await async_playwright().start()
+        self._browser = await self._pw.chromium.launch(headless=self.headless)
+        self._generations = [0] * self.contexts
+        self._contexts = [await self._new_context(i) for i in range(self.contexts)]
+        self._rebuilding = asyncio.Lock()
+        self._pages = asyncio.Queue()
+        self._states = {}  # page -> navigation / crash state (page_pool.watch) + its context index
+        for i in range(self.pool_size):
+            self._pages.put_nowait(self._watch(await self._contexts[i % self.contexts].new_page(), i % self.contexts))
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+
+    async def _new_context(self, i):
+        # a rebuilt context records to its own HAR archive, like PageSlot
+        name = f"detail_{i}" if self._generations[i] == 0 else f"detail_{i}_r{self._generations[i]}"
+        har_options = self.har.context_options(name) if self.har is not None else {}
+        context = await self._browser.new_context(**CONTEXT_OPTIONS, **har_options)
+        if self.har is not None:
+            await self.har.attach_async(context)
+        if self.router is not None:
+            await self.router.attach_async(context)
+        THROTTLE.attach(context)
+        return context
+
+    def fetch(self, items, labels, on_record=None):
+        """on_record(record) is called (from the pool thread) as each page completes."""
+        return self._call(self._fetch(items, labels, on_record))
+
+    async def _fetch(self, items, labels, on_record):
+        records = await asyncio.gather(*(self._fetch_one(item, labels, on_record) for item in items))
+        return [r for r in records if r is not None]
+
+    def _watch(self, page, context_index):
+        self._states[page] = watch(page, {"context": context_index})
+        return page
+
+    async def _replace(self, page, reason):
+        """A fresh tab in place of `page`. When its context can no longer
+        open one, the context is rebuilt (and the browser relaunched if it
+        is gone). Never raises: if nothing works, `page` is handed back
+        with its state, so the pool keeps its size and later fetches fail
+        fast instead of waiting for a tab forever."""
+        i = self._states[page]["context"]
+        try:
+            if page.context is self._contexts[i]:
+                new_page = await self.pages.recycle_async(page, reason)
+            else:  # another tab already rebuilt this context
+                self.pages.count(reason)
+                new_page = await self._rebuild_context(i, page.context, reason)
+        except Exception as e:
+            try:
+                new_page = await self._rebuild_context(i, page.context, e)
+            except Exception as e:
+                print(f"  Detail tab could not be replaced: {e}")
+                return page
+        self._states.pop(page, None)
+        return self._watch(new_page, i)
+
+    async def _rebuild_context(self, i, broken, error):
+        """New page on a rebuilt context `i`; `broken` is the context the
+        failing tab belonged to (already replaced by another tab → reuse)."""
+        async with self._rebuilding:
+            if self._contexts[i] is broken:
+                print(f"  Detail context {i} broken ({error}), rebuilding it")
+                try:
+                    await broken.close()  # flushes a recorded HAR
+                except Exception:
+                    pass
+                if not self._browser.is_connected():
+                    print("  Detail browser gone, relaunching it")
+                    self.pages.count("browser")
+                    self._browser = await self._pw.chromium.launch(headless=self.headless)
+                self._generations[i] += 1
+                self._contexts[i] = await self._new_context(i)
+            return await self._contexts[i].new_page()
+
+    async def _fetch_one(self, item, labels, on_record):
+        async with self._slots:
+            page = await self._pages.get()
+            try:
+                for attempt in range(self.pages.retries + 1):
+                    try:
+                        record = await asyncio.wait_for(
+                            scrape_detail_page_async(page, item, labels, self.ready, self.providers),
+                            DETAIL_PAGE_TIMEOUT_S,
+                        )
+                        if on_record is not None:
+                            on_record(record)
+                        print(f"  Scraped: {record['contract_name']}")
+                        return record
+                    except asyncio.TimeoutError:
+                        error = TimeoutError(f"no result within {DETAIL_PAGE_TIMEOUT_S:.0f}s")
+                    except Exception as e:
+                        error = e
+                    state = self._states[page]
+                    if await self.pages.healthy_async(page, state):
+                        break  # the page itself failed, not the tab: don't retry
+                    page = await self._replace(page, "crash" if state["crashed"] or page.is_closed() else "hung")
+                    if attempt < self.pages.retries:
+                        print(f"  Detail tab broke on {item['url']}, retrying on a fresh tab")
+                        self.pages.count_retry()
+                print(f"  Error on detail page {item['url']}: {error}")
+                return None
+            finally:
+                try:
+                    reason = self.pages.recycle_reason(self._states[page])
+                    if reason is not None:
+                        page = await self._replace(page, reason)
+                finally:
+                    self._pages.put_nowait(page)  # a tab always goes back, or fetch() would wait forever
+
+    def close(self):
+        if self._loop is None:
+            return
+        try:
+            self._call(self._close())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+
+    async def _close(self):
+        for context in self._contexts:
+            await context.close()  # flushes a recorded HAR
+        await self._browser.close()
+        await self._pw.stop()
+
+
+# --------------------------------------------------------------
+if __name__ == "__main__":
+    # Offline: python detail_pages.py snapshot.json [...] → parsed fields
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8") as f:
+            print(json.dumps(parse_snapshot(json.load(f)), indent=2, ensure_ascii=False))
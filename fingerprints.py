@@ -0,0 +1,148 @@
+# --------------------------------------------------------------
+# fingerprints.py
+# Incremental scraping: skip detail pages whose listing card is unchanged
+# --------------------------------------------------------------
+# The store keeps, per (zip, consumption, contract type) task and
+# detail URL, a hash of the listing card (card text + href) and the
+# record scraped last time. With INCREMENTAL=true a card whose hash
+# matches is not revisited; its previous record is carried forward.
+#
+# The store is a JSON file (FINGERPRINT_PATH) rewritten at the end
+# of each run; keep it between runs (e.g. CI cache) to benefit.
+#
+# ListingIndex does the same across ZIPs within one run: ZIPs in the
+# same elområde usually get the identical listing for a consumption
+# and contract type. After step 9 the whole listing (hrefs, durations,
+# card hashes) is hashed; a ZIP whose listing matches one already
+# scraped reuses those detail records, retagged with its own ZIP /
+# county / town (LISTING_DEDUP=false turns it off).
+# --------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import threading
+
+# ==================== CONFIGURATION ====================
+
+INCREMENTAL = os.getenv("INCREMENTAL", "false").lower() == "true"
+FINGERPRINT_PATH = os.getenv("FINGERPRINT_PATH", "fingerprints.json")
+LISTING_DEDUP = os.getenv("LISTING_DEDUP", "true").lower() == "true"
+
+
+def card_hash(text, href):
+    return hashlib.sha1(f"{text}\n{href}".encode("utf-8")).hexdigest()
+
+
+def task_id(labels):
+    return "|".join((labels["zip_code"], labels["consumption"], labels["contract_type"]))
+
+
+def listing_hash(items):
+    """Order-independent hash of a listing: every card's href, duration
+    and card hash (the card text carries the displayed prices)."""
+    lines = sorted(f"{i['url']}\t{i.get('contract_duration')}\t{i.get('card_hash')}" for i in items)
+    return hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def retag(record, labels):
+    return {
+        **record,
+        "scraped_zip_code": labels["zip_code"],
+        "scraped_county": labels["county"],
+        "scraped_town": labels["town"],
+    }
+
+# --------------------------------------------------------------
+class FingerprintStore:
+    def __init__(self, path=FINGERPRINT_PATH):
+        self.path = path
+        self.tasks = {}  # task id -> {url: {"hash": ..., "record": {...}}}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.tasks = json.load(f)
+            print(f"Loaded fingerprints for {len(self.tasks)} tasks from {path}")
+
+    def unchanged(self, labels, items):
+        """{url: previous record} for items whose card hash is unchanged."""
+        known = self.tasks.get(task_id(labels), {})
+        carried = {}
+        for item in items:
+            entry = known.get(item["url"])
+            if entry is not None and entry["hash"] == item.get("card_hash"):
+                carried[item["url"]] = entry["record"]
+        with self._lock:
+            self.hits += len(carried)
+            self.misses += len(items) - len(carried)
+        return carried
+
+    def update(self, labels, items, records):
+        """Replaces the task's entries with this run's cards. Cards whose
+        detail page failed are left out so they are fetched next time."""
+        by_url = {r["url"]: r for r in records}
+        entries = {}
+        for item in items:
+            if item["url"] in by_url and item.get("card_hash"):
+                entries[item["url"]] = {"hash": item["card_hash"], "record": by_url[item["url"]]}
+        with self._lock:
+            self.tasks[task_id(labels)] = entries
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.tasks, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def print_summary(self):
+        total = self.hits + self.misses
+        saved = f" ({100 * self.hits / total:.0f}% of detail pages avoided)" if total else ""
+        print(f"\nFingerprints: {self.hits} unchanged cards, {self.misses} new/changed{saved}")
+
+# --------------------------------------------------------------
+class ListingIndex:
+    def __init__(self):
+        self.listings = {}  # (consumption, contract type, listing hash) -> (zip, [record, ...])
+        self.hits = 0
+        self.misses = 0
+        self.pages_saved = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(labels, items):
+        return (labels["consumption"], labels["contract_type"], listing_hash(items))
+
+    def lookup(self, labels, items):
+        """Records of an identical listing scraped earlier in the run,
+        retagged for `labels`; None if there is none."""
+        if not items:
+            return None
+        with self._lock:
+            entry = self.listings.get(self.key(labels, items))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.pages_saved += len(items)
+        source_zip, records = entry
+        by_url = {r["url"]: r for r in records}
+        print(f"  Listing identical to {source_zip}: reusing {len(records)} detail records")
+        return [retag(by_url[item["url"]], labels) for item in items if item["url"] in by_url]  # this listing's order
+
+    def add(self, labels, items, records):
+        """Indexes a finished listing; only complete ones (a record for
+        every card) so a failed detail page is not copied to other ZIPs."""
+        if not items or {r["url"] for r in records} != {i["url"] for i in items}:
+            return
+        with self._lock:
+            self.listings.setdefault(self.key(labels, items), (labels["zip_code"], list(records)))
+
+    def print_summary(self):
+        total = self.hits + self.misses
+        if not total:
+            return
+        print(f"\nListing dedup: {self.hits} of {total} listings matched an earlier ZIP, "
+              f"{self.pages_saved} detail page loads saved")
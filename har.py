@@ -0,0 +1,137 @@
+# --------------------------------------------------------------
+# har.py
+# Record a browser session to HAR, replay it without network
+# --------------------------------------------------------------
+#   python scrape_elpriskollen.py --record-har      → har/*.zip
+#   python scrape_elpriskollen.py --replay-har      ← har/*.zip
+#   (--record-har=DIR / --replay-har=DIR, or RECORD_HAR / REPLAY_HAR)
+#
+# - Record: every browser context (one per ZIP, plus the detail pool
+#   contexts) writes its own HAR archive, saved when it closes
+# - Replay: every context answers requests from all archives via
+#   route_from_har(); a request no archive has is a miss. Misses
+#   are aborted (HAR_MISS=network lets them through instead),
+#   counted, and written to har_misses.txt so a stale recording
+#   shows up at the end of the run
+# --------------------------------------------------------------
+
+import glob
+import os
+import sys
+import threading
+
+# ==================== CONFIGURATION ====================
+
+HAR_DIR = "har"
+HAR_MISS = os.getenv("HAR_MISS", "abort")  # abort | network
+HAR_MISSES_PATH = os.getenv("HAR_MISSES_PATH", "har_misses.txt")
+
+
+def argv_dir(flag, env):
+    """--flag → HAR_DIR, --flag=DIR → DIR, else the env var (or None)."""
+    for arg in sys.argv[1:]:
+        if arg == flag:
+            return HAR_DIR
+        if arg.startswith(flag + "="):
+            return arg.split("=", 1)[1] or HAR_DIR
+    return os.getenv(env) or None
+
+
+RECORD_HAR = argv_dir("--record-har", "RECORD_HAR")
+REPLAY_HAR = argv_dir("--replay-har", "REPLAY_HAR")
+
+# --------------------------------------------------------------
+class HarSession:
+    def __init__(self, record_dir=None, replay_dir=None):
+        if record_dir and replay_dir:
+            raise ValueError("--record-har and --replay-har are mutually exclusive")
+        self.record_dir = record_dir
+        self.replay_dir = replay_dir
+        self.archives = []
+        self.hits = 0
+        self.misses = {}  # url -> count
+        self._lock = threading.Lock()
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+            for old in glob.glob(os.path.join(record_dir, "*.zip")):
+                os.remove(old)
+            print(f"Recording HAR archives → {record_dir}/")
+        if replay_dir:
+            self.archives = sorted(glob.glob(os.path.join(replay_dir, "*.zip")) + glob.glob(os.path.join(replay_dir, "*.har")))
+            if not self.archives:
+                raise FileNotFoundError(f"No HAR archives in {replay_dir}/ (record with --record-har first)")
+            print(f"Replaying {len(self.archives)} HAR archives from {replay_dir}/ (misses: {HAR_MISS})")
+
+    def context_options(self, name):
+        """Extra new_context() kwargs; `name` labels the archive."""
+        if not self.record_dir:
+            return {}
+        return {
+            "record_har_path": os.path.join(self.record_dir, f"{name}.zip"),
+            "record_har_mode": "full",
+            "record_har_content": "attach",
+        }
+
+    def _miss(self, url):
+        with self._lock:
+            self.misses[url] = self.misses.get(url, 0) + 1
+
+    def _hit(self):
+        with self._lock:
+            self.hits += 1
+
+    # --- sync contexts ---
+    # Attach BEFORE RequestRouter: routes run newest first, so the router
+    # still blocks images etc., what it lets through is answered from the
+    # archives, and only what no archive has reaches the miss handler
+    def attach(self, context):
+        if not self.replay_dir:
+            return context
+        context.route("**/*", self._handle_miss)
+        for archive in self.archives:
+            context.route_from_har(archive, not_found="fallback")
+        context.on("requestfinished", self._finished)
+        return context
+
+    def _handle_miss(self, route):
+        self._miss(route.request.url)
+        if HAR_MISS == "network":
+            route.fallback()
+        else:
+            route.abort()
+
+    def _finished(self, request):
+        if request.url not in self.misses:
+            self._hit()
+
+    # --- async contexts (DetailPool) ---
+    async def attach_async(self, context):
+        if not self.replay_dir:
+            return context
+        await context.route("**/*", self._handle_miss_async)
+        for archive in self.archives:
+            await context.route_from_har(archive, not_found="fallback")
+        context.on("requestfinished", self._finished)
+        return context
+
+    async def _handle_miss_async(self, route):
+        self._miss(route.request.url)
+        if HAR_MISS == "network":
+            await route.fallback()
+        else:
+            await route.abort()
+
+    # --------------------------------------------------------------
+    def print_summary(self):
+        if not self.replay_dir:
+            return
+        total = sum(self.misses.values())
+        print(f"\nHAR replay: {self.hits} requests served from archives, {total} misses ({len(self.misses)} URLs)")
+        if not self.misses:
+            return
+        for url, n in sorted(self.misses.items(), key=lambda kv: -kv[1])[:10]:
+            print(f"  miss x{n}: {url}")
+        with open(HAR_MISSES_PATH, "w", encoding="utf-8") as f:
+            for url, n in sorted(self.misses.items()):
+                f.write(f"{n}\t{url}\n")
+        print(f"  Recording looks stale: all misses → {HAR_MISSES_PATH}")
@@ -0,0 +1,141 @@
+# --------------------------------------------------------------
+# history_store.py
+# Partitioned Parquet history of every run
+# --------------------------------------------------------------
+# Layout (hive partitioning, one directory per scrape date + county):
+#   history/scrape_date=2026-10-12/scraped_county=Sk%C3%A5ne%20l%C3%A4n/run-<ts>-0-0.parquet
+#   (partition values are URL-encoded by Arrow)
+#
+# - Typed schema derived from detail_pages.make_record(): strings,
+#   consumption as int, energy_sources list, price_breakdown map,
+#   plus scrape_date (date) and scraped_at (timestamp)
+# - append_run(): each run adds new files, nothing is rewritten
+# - load(): partition + column pruning, e.g.
+#     load(county="Skåne län", since="2026-10-01")
+#
+#   python history_store.py --county "Skåne län" --since 2026-10-01
+# --------------------------------------------------------------
+
+import argparse
+import datetime as dt
+import os
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from detail_pages import make_record
+
+# ==================== CONFIGURATION ====================
+
+HISTORY_DIR = os.getenv("HISTORY_DIR", "history")
+HISTORY_BATCH_ROWS = int(os.getenv("HISTORY_BATCH_ROWS", "20000"))
+
+
+class _Blank(dict):
+    def __missing__(self, key):
+        return None
+
+
+# Field order exactly as the scraper produces it
+RECORD_FIELDS = list(make_record(_Blank(), _Blank(), _Blank()))
+
+TYPE_OVERRIDES = {
+    "scraped_consumption_kwh": pa.int32(),
+    "energy_sources": pa.list_(pa.string()),
+    "price_breakdown": pa.map_(pa.string(), pa.string()),
+}
+
+PARTITION_SCHEMA = pa.schema([
+    ("scrape_date", pa.date32()),
+    ("scraped_county", pa.string()),
+])
+
+HISTORY_SCHEMA = pa.schema(
+    [(name, TYPE_OVERRIDES.get(name, pa.string())) for name in RECORD_FIELDS]
+    + [("scraped_at", pa.timestamp("s")), ("scrape_date", pa.date32())]
+)
+
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+
+
+def to_row(record, scraped_at):
+    row = {name: record.get(name) for name in RECORD_FIELDS}
+    kwh = row["scraped_consumption_kwh"]
+    row["scraped_consumption_kwh"] = int(kwh) if kwh not in (None, "") else None
+    row["energy_sources"] = row["energy_sources"] or []
+    row["price_breakdown"] = list((row["price_breakdown"] or {}).items())
+    row["scraped_at"] = scraped_at
+    row["scrape_date"] = scraped_at.date()
+    return row
+
+# --------------------------------------------------------------
+def append_run(records, scraped_at=None, base_dir=HISTORY_DIR):
+    """Appends one run's records (any iterable) as new Parquet files.
+    Returns the number of rows written."""
+    scraped_at = (scraped_at or dt.datetime.now()).replace(microsecond=0)
+    run_id = scraped_at.strftime("%Y%m%dT%H%M%S")
+    batch, batches, total = [], 0, 0
+
+    def flush():
+        nonlocal batch, batches
+        if not batch:
+            return
+        ds.write_dataset(
+            pa.Table.from_pylist(batch, schema=HISTORY_SCHEMA),
+            base_dir,
+            format="parquet",
+            partitioning=PARTITIONING,
+            basename_template=f"run-{run_id}-{batches}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        batch = []
+        batches += 1
+
+    for record in records:
+        batch.append(to_row(record, scraped_at))
+        total += 1
+        if len(batch) >= HISTORY_BATCH_ROWS:
+            flush()
+    flush()
+    return total
+
+
+def dataset(base_dir=HISTORY_DIR):
+    return ds.dataset(base_dir, format="parquet", partitioning=PARTITIONING, schema=HISTORY_SCHEMA)
+
+
+def load(county=None, since=None, until=None, columns=None, base_dir=HISTORY_DIR):
+    """DataFrame of the matching partitions only (predicate pushdown)."""
+    flt = None
+    conditions = []
+    if county is not None:
+        conditions.append(ds.field("scraped_county") == county)
+    if since is not None:
+        conditions.append(ds.field("scrape_date") >= pa.scalar(dt.date.fromisoformat(str(since))))
+    if until is not None:
+        conditions.append(ds.field("scrape_date") <= pa.scalar(dt.date.fromisoformat(str(until))))
+    for c in conditions:
+        flt = c if flt is None else flt & c
+
+    df = dataset(base_dir).to_table(columns=columns, filter=flt).to_pandas()
+    if "price_breakdown" in df.columns:
+        df["price_breakdown"] = df["price_breakdown"].map(lambda pb: dict(pb) if pb is not None else {})
+    return df
+
+# --------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the scrape history")
+    parser.add_argument("--county")
+    parser.add_argument("--since")
+    parser.add_argument("--until")
+    parser.add_argument("--columns", help="comma-separated")
+    args = parser.parse_args()
+
+    df = load(
+        county=args.county,
+        since=args.since,
+        until=args.until,
+        columns=args.columns.split(",") if args.columns else None,
+    )
+    print(df)
+    print(f"\n{len(df)} rows")
@@ -0,0 +1,132 @@
+# --------------------------------------------------------------
+# journal.py
+# Append-only JSONL checkpoint journal + resume
+# --------------------------------------------------------------
+# One line per event, flushed as it happens:
+#   {"type": "detail", "task": [zip, kwh, type], "url": ..., "record": {...}}
+#   {"type": "task",   "task": [zip, kwh, type], "urls": [...]}
+# "task" lines are written only when a (zip, consumption, contract
+# type) pass has finished; "urls" is the listing order of its records.
+#
+# With --resume (or RESUME=true) finished tasks are skipped outright
+# and detail pages already journaled are not fetched again.
+#
+#   python journal.py rebuild   → combined_output.* from the journal
+# --------------------------------------------------------------
+
+import json
+import os
+import sys
+import threading
+
+# ==================== CONFIGURATION ====================
+
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", "scrape_journal.jsonl")
+RESUME = "--resume" in sys.argv or os.getenv("RESUME", "false").lower() == "true"
+
+
+def task_key(labels):
+    return (labels["zip_code"], labels["consumption"], labels["contract_type"])
+
+# --------------------------------------------------------------
+class Journal:
+    def __init__(self, path=JOURNAL_PATH, resume=RESUME):
+        self.path = path
+        self.details = {}  # task -> {url: record}
+        self.tasks = {}    # task -> [url, ...] (finished tasks only)
+        if resume and os.path.exists(path):
+            self._load()
+            print(f"Resuming from {path}: {len(self.tasks)} tasks done, "
+                  f"{sum(len(d) for d in self.details.values())} detail pages journaled")
+        self._lock = threading.Lock()
+        self._f = open(path, "a" if resume else "w", encoding="utf-8")
+        if resume and self._f.tell() > 0 and not self._ends_with_newline():
+            self._f.write("\n")  # don't glue new entries onto a torn line
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                task = tuple(entry["task"])
+                if entry["type"] == "detail":
+                    self.details.setdefault(task, {})[entry["url"]] = entry["record"]
+                elif entry["type"] == "task":
+                    self.tasks[task] = entry["urls"]
+
+    def _write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+
+    # --- writing ---
+    def record_detail(self, labels, record):
+        task = task_key(labels)
+        with self._lock:
+            self.details.setdefault(task, {})[record["url"]] = record
+        self._write({"type": "detail", "task": list(task), "url": record["url"], "record": record})
+
+    def record_task(self, labels, records):
+        task = task_key(labels)
+        urls = [r["url"] for r in records]
+        with self._lock:
+            self.tasks[task] = urls
+        self._write({"type": "task", "task": list(task), "urls": urls})
+
+    # --- reading ---
+    def task_done(self, labels):
+        return task_key(labels) in self.tasks
+
+    def task_records(self, labels):
+        task = task_key(labels)
+        details = self.details.get(task, {})
+        return [details[url] for url in self.tasks.get(task, []) if url in details]
+
+    def cached_details(self, labels):
+        return dict(self.details.get(task_key(labels), {}))
+
+    def all_records(self):
+        """Every finished task's records, in the order the tasks finished."""
+        records = []
+        for task, urls in self.tasks.items():
+            details = self.details.get(task, {})
+            records.extend(details[url] for url in urls if url in details)
+        return records
+
+    def close(self):
+        self._f.close()
+
+
+def merge_in_listing_order(items, cached, fresh):
+    """Listing order, journaled records first choice, fresh ones for the rest.
+    Items whose detail page failed (neither cached nor fresh) are dropped."""
+    by_url = {}
+    for record in fresh:
+        by_url.setdefault(record["url"], []).append(record)
+    records = []
+    for item in items:
+        url = item["url"]
+        if url in cached:
+            records.append(cached[url])
+        elif by_url.get(url):
+            records.append(by_url[url].pop(0))
+    return records
+
+# --------------------------------------------------------------
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["rebuild"]:
+        from scrape_elpriskollen import save_combined_output
+
+        journal = Journal(resume=True)
+        journal.close()
+        save_combined_output(journal.all_records())
+    else:
+        print("Usage: python journal.py rebuild")
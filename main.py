@@ -1,10 +1,11 @@
 from playwright.sync_api import sync_playwright
-import time
-import json
-import pandas as pd
 import re
 import os
 
+from readiness import Readiness
+from throttle import THROTTLE
+from output_stream import STREAM_DIR, StreamPart, export_streams
+
 # ===== SWEDISH COUNTIES & ZIP CODES =====
 COUNTIES = [
     {"county": "Stockholm län", "town": "Stockholm", "zip_code": "11121"},
@@ -33,13 +34,17 @@ COUNTIES = [
 # ===== CONFIG =====
 CONSUMPTION_KWH = "2000"  # You can change this
 HEADLESS_MODE = False     # Set to True for faster background runs
-DELAY_BETWEEN_ZIPS = 5    # Seconds to pause between ZIPs (be kind to server)
+# Politeness: every goto / click goes through THROTTLE (RATE_LIMIT etc., see throttle.py)
+
+CARD_SELECTOR = "div.pLyFbiEj6YnPeSF9DI94"
 
-def scrape_for_zip(page, zip_info):
+def scrape_for_zip(page, zip_info, ready=None, part=None):
     """
     Scrapes all data for one ZIP code.
-    Returns list of scraped records.
+    Returns list of scraped records; each one is also written to `part`
+    (a StreamPart) as soon as it is scraped.
     """
+    ready = ready or Readiness()
     zip_code = zip_info["zip_code"]
     county = zip_info["county"]
     town = zip_info["town"]
@@ -47,47 +52,46 @@ def scrape_for_zip(page, zip_info):
     print(f"\n📍 Starting scrape for {county} ({town}) - ZIP: {zip_code}")
 
     # Step 1: Go to homepage
-    page.goto("https://elpriskollen.se/", timeout=60000)
+    THROTTLE.goto(page, "https://elpriskollen.se/", timeout=60000)
+    ready.selector(page, "homepage", "#pcode")
 
     # Step 2: Enter ZIP code
     page.fill("#pcode", zip_code)
-    page.click("#next-page")
-    page.wait_for_timeout(2000)
-    time.sleep(5)
+    THROTTLE.click(page, "#next-page")
+    ready.selector(page, "zip", "#annual_consumption")
 
     # Step 3: Enter consumption
     page.fill("#annual_consumption", CONSUMPTION_KWH)
-    page.click("#next-page")
-    page.wait_for_timeout(2000)
-    time.sleep(5)
+    THROTTLE.click(page, "#next-page")
     # Step 4: Click 3rd contract type button (Mixavtal)
-    page.click("#app > div > div.guide__preamble > div.env-form-element > div.contractTypeButtons > a:nth-child(3)")
-    page.wait_for_timeout(2000)
-    time.sleep(5)
+    contract_button = "#app > div > div.guide__preamble > div.env-form-element > div.contractTypeButtons > a:nth-child(3)"
+    ready.selector(page, "consumption", contract_button)
+    THROTTLE.click(page, contract_button)
     # Step 5: Click final "Nästa" button
-    page.click("#app > div > div.epk-button > a.env-button")
-    page.wait_for_timeout(3000)
-    time.sleep(30)
+    continue_button = "#app > div > div.epk-button > a.env-button"
+    ready.selector(page, "continue", continue_button)
+    THROTTLE.click(page, continue_button)
+    ready.network_idle(page, "results")
+    ready.count_settled(page, "results", CARD_SELECTOR)
     # Step 6: Keep scrolling + clicking "Show more" while it exists
     while True:
         try:
             show_more = page.locator("button.env-button:has-text('Visa mer'), button.env-button:has-text('Show more')").first
 
             if show_more.is_visible():
-                # Scroll to 90% of page height
-                page.evaluate("window.scrollTo(0, document.body.scrollHeight * 0.9)")
-
-                # Optional: Wait a moment after scroll
-                page.wait_for_timeout(500)
+                shown = page.locator(CARD_SELECTOR).count()
 
                 # Ensure button is in view
                 show_more.scroll_into_view_if_needed()
 
                 # Click it
-                show_more.click()
+                THROTTLE.click(show_more)
 
                 print("✅ Clicked 'Show more' — loading more contracts...")
-                page.wait_for_timeout(2000)  # Let new content load
+                # Let new content load
+                if not ready.count_above(page, "show_more", CARD_SELECTOR, shown):
+                    print("⏹️ 'Show more' did not add any contracts.")
+                    break
 
             else:
                 print("⏹️ No more 'Show more' buttons found.")
@@ -98,7 +102,7 @@ def scrape_for_zip(page, zip_info):
             break
 
     # Step 7: Collect all profile URLs + CONTRACT DURATION from main page
-    profile_cards = page.locator("div.pLyFbiEj6YnPeSF9DI94").all()
+    profile_cards = page.locator(CARD_SELECTOR).all()
     urls_and_durations = []
 
     for card in profile_cards:
@@ -133,8 +137,8 @@ def scrape_for_zip(page, zip_info):
         contract_duration = item["contract_duration"]
 
         try:
-            page.goto(url, timeout=60000)
-            page.wait_for_timeout(2000)
+            THROTTLE.goto(page, url, timeout=60000)
+            ready.network_idle(page, "detail")
 
             # --- SCRAPE PROFILE DATA ---
 
@@ -275,6 +279,8 @@ def scrape_for_zip(page, zip_info):
             }
 
             results.append(data)
+            if part is not None:
+                part.write(data)
             print(f"✅ Scraped: {contract_name or 'Unknown'}")
 
         except Exception as e:
@@ -284,72 +290,39 @@ def scrape_for_zip(page, zip_info):
     print(f"🎉 Done for {zip_code} — Scraped {len(results)} profiles.")
     return results
 
-def save_individual_output(data, zip_code):
-    """Save individual JSON and Excel files per ZIP"""
-    # JSON
-    json_filename = f"output_{zip_code}.json"
-    with open(json_filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
-    # Excel
-    flat_data = []
-    for item in data:
-        flat = item.copy()
-        price_bd = flat.pop("price_breakdown", {})
-        for k, v in price_bd.items():
-            flat[f"price_{k.replace(' ', '_').replace('/', '_')}"] = v
-        energy_sources = flat.pop("energy_sources", [])
-        flat["energy_sources"] = "; ".join(energy_sources) if energy_sources else None
-        flat_data.append(flat)
-
-    df = pd.DataFrame(flat_data)
-    excel_filename = f"output_{zip_code}.xlsx"
-    df.to_excel(excel_filename, index=False, engine="openpyxl")
-
-    return json_filename, excel_filename
-
-def save_combined_output(all_data):
-    """Save one master JSON and Excel with all ZIPs combined"""
-    # JSON
-    with open("combined_output.json", "w", encoding="utf-8") as f:
-        json.dump(all_data, f, indent=2, ensure_ascii=False)
-
-    # Excel
-    flat_data = []
-    for item in all_data:
-        flat = item.copy()
-        price_bd = flat.pop("price_breakdown", {})
-        for k, v in price_bd.items():
-            flat[f"price_{k.replace(' ', '_').replace('/', '_')}"] = v
-        energy_sources = flat.pop("energy_sources", [])
-        flat["energy_sources"] = "; ".join(energy_sources) if energy_sources else None
-        flat_data.append(flat)
-
-    df = pd.DataFrame(flat_data)
-    df.to_excel("combined_output.xlsx", index=False, engine="openpyxl")
+def save_individual_output(zip_code):
+    """Save individual JSON and Excel files per ZIP (from its stream part)"""
+    name = f"output_{zip_code}"
+    export_streams(STREAM_DIR, [name], prefix=name, formats=("json", "xlsx"))
+
+    return f"{name}.json", f"{name}.xlsx"
+
+def save_combined_output(names):
+    """Save one master JSON and Excel with all ZIPs combined, from their stream parts"""
+    total = export_streams(STREAM_DIR, names, formats=("json", "xlsx"))
 
     print("\n📊 Combined files saved: combined_output.json, combined_output.xlsx")
+    return total
 
 def run():
-    all_results = []
+    names = []  # stream parts of the ZIPs scraped, in order
 
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=HEADLESS_MODE)
         page = browser.new_page()
+        THROTTLE.attach(page.context)
+        ready = Readiness()
 
         for zip_info in COUNTIES:
+            name = f"output_{zip_info['zip_code']}"
+            names.append(name)
             try:
-                # Scrape for current ZIP
-                results = scrape_for_zip(page, zip_info)
-                all_results.extend(results)
+                # Scrape for current ZIP, records streamed to its part
+                with StreamPart(STREAM_DIR, name) as part:
+                    scrape_for_zip(page, zip_info, ready, part)
 
                 # Save individual files
-                save_individual_output(results, zip_info["zip_code"])
-
-                # Pause before next ZIP (be respectful)
-                if COUNTIES.index(zip_info) < len(COUNTIES) - 1:
-                    print(f"\n⏳ Waiting {DELAY_BETWEEN_ZIPS} seconds before next ZIP...")
-                    time.sleep(DELAY_BETWEEN_ZIPS)
+                save_individual_output(zip_info["zip_code"])
 
             except Exception as e:
                 print(f"🔥 CRITICAL ERROR on {zip_info['zip_code']}: {e}")
@@ -357,14 +330,16 @@ def run():
 
         browser.close()
 
+    ready.print_summary()
+    THROTTLE.print_summary()
+
     # Save combined files
-    save_combined_output(all_results)
+    total = save_combined_output(names)
 
-    print(f"\n✅✅✅ ALL DONE! Total records scraped: {len(all_results)}")
+    print(f"\n✅✅✅ ALL DONE! Total records scraped: {total}")
     print("📁 Individual files: output_XXXXX.json/.xlsx")
     print("📁 Combined files: combined_output.json/.xlsx")
 
-
 if __name__ == "__main__":
     run()
 
@@ -0,0 +1,102 @@
+# --------------------------------------------------------------
+# navigator.py
+# Deep-link straight to result views instead of replaying the wizard
+# --------------------------------------------------------------
+# - After a wizard pass the results URL is turned into a template:
+#   the ZIP and consumption values become {zip} / {consumption}.
+#   One template per contract type (the type encoding is unknown,
+#   so it is learned, not guessed).
+# - Later passes for the same contract type go straight to the
+#   formatted URL; if that shows no result cards, the wizard runs.
+# - Cookie consent is handled once per browser context.
+# --------------------------------------------------------------
+
+import os
+import re
+
+from throttle import THROTTLE
+from tracing import span
+
+# Site root; point it at a local stand-in with SITE_URL=http://127.0.0.1:8765
+SITE_URL = os.getenv("SITE_URL", "https://elpriskollen.se").rstrip("/")
+HOMEPAGE = SITE_URL + "/"
+
+
+def exact_value_re(value):
+    # "2000" must not match inside "20000"
+    return re.compile(rf"(?<![0-9]){re.escape(value)}(?![0-9])")
+
+
+def make_template(url, zip_code, consumption):
+    """Returns the URL with {zip}/{consumption} placeholders, or None when
+    the URL doesn't carry both values exactly once (e.g. state kept in
+    the JS app only)."""
+    if url.rstrip("/") == HOMEPAGE.rstrip("/"):
+        return None
+    template = url.replace("{", "{{").replace("}", "}}")
+    for value, name in ((zip_code, "zip"), (consumption, "consumption")):
+        pattern = exact_value_re(value)
+        if len(pattern.findall(template)) != 1:
+            return None
+        template = pattern.sub("{" + name + "}", template)
+    return template
+
+# --------------------------------------------------------------
+class ResultsNavigator:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.templates = {}  # contract type -> URL template
+        self.consent_done = False
+        self.deep_links = 0
+        self.wizard_runs = 0
+        self.fallbacks = 0
+
+    # --- cookie banner, once per context ---
+    def accept_cookies(self, page, ready):
+        if self.consent_done:
+            return
+        try:
+            if ready.selector(page, "cookie", "role=button[name='Godkänn alla kakor']"):
+                cookie_btn = page.get_by_role("button", name="Godkänn alla kakor")
+                THROTTLE.click(cookie_btn)
+                cookie_btn.wait_for(state="hidden", timeout=ready.deadlines["cookie"])
+        except Exception:
+            pass
+        self.consent_done = True
+
+    # --------------------------------------------------------------
+    def open_results(self, page, labels, ready, wizard, card_selector):
+        """Brings `page` to the result view for `labels`. `wizard` is the
+        fallback callable(page) -> bool. Returns False if both fail."""
+        template = self.templates.get(labels["contract_type"]) if self.enabled else None
+        if template is not None:
+            url = template.format(zip=labels["zip_code"], consumption=labels["consumption"])
+            try:
+                with span("deep_link", labels):
+                    THROTTLE.goto(page, url, timeout=60000)
+                    ready.network_idle(page, "results")
+                    shown = ready.count_settled(page, "results", card_selector)
+                if shown > 0:
+                    self.deep_links += 1
+                    print(f"  → deep link: {url}")
+                    return True
+            except Exception as e:
+                print(f"  Deep link failed: {e}")
+            self.fallbacks += 1
+            print("  → deep link showed no results, using the wizard")
+
+        self.wizard_runs += 1
+        if not wizard(page):
+            return False
+        if self.enabled and labels["contract_type"] not in self.templates:
+            template = make_template(page.url, labels["zip_code"], labels["consumption"])
+            if template is not None:
+                self.templates[labels["contract_type"]] = template
+                print(f"  → learned deep link for {labels['contract_type']}: {template}")
+        return True
+
+    def print_summary(self):
+        print(
+            f"\nResult views: {self.deep_links} deep links, {self.wizard_runs} wizard runs "
+            f"({self.fallbacks} deep-link fallbacks), {len(self.templates)} templates learned"
+        )
@@ -0,0 +1,196 @@
+# --------------------------------------------------------------
+# output_stream.py
+# Streaming output: records are written as they are produced
+# --------------------------------------------------------------
+# - StreamPart: one stream per ZIP (or per save), two files as it goes
+#     <name>.jsonl              one record per line
+#     <name>-00000.parquet ...  flattened rows (transform.records_to_frame),
+#                               STREAM_CHUNK_ROWS per chunk
+# - export_streams(): builds combined_output.{jsonl,json,xlsx,csv}
+#   from the parts, chunk by chunk, so peak memory stays at one chunk
+#   no matter how many records the run produced
+# - expand_inputs() / iter_input_records(): reading record files back
+#   (upload_to_sheets.py, query.py)
+# --------------------------------------------------------------
+
+import csv
+import glob
+import json
+import os
+
+import pandas as pd
+from openpyxl import Workbook
+
+from transform import records_to_frame
+
+# ==================== CONFIGURATION ====================
+
+STREAM_DIR = os.getenv("STREAM_DIR", "output_stream")
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "5000"))
+JSON_INPUT = "combined_output.json"
+JSONL_INPUT = "combined_output.jsonl"
+
+
+def jsonl_path(directory, name):
+    return os.path.join(directory, f"{name}.jsonl")
+
+
+def chunk_paths(directory, name):
+    return sorted(glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(name)}-*.parquet")))
+
+# --------------------------------------------------------------
+class StreamPart:
+    def __init__(self, directory, name, chunk_rows=STREAM_CHUNK_ROWS):
+        os.makedirs(directory, exist_ok=True)
+        for old in chunk_paths(directory, name):
+            os.remove(old)
+        self.directory = directory
+        self.name = name
+        self.chunk_rows = chunk_rows
+        self.count = 0
+        self._records = []
+        self._chunks = 0
+        self._f = open(jsonl_path(directory, name), "w", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, record):
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._records.append(record)
+        self.count += 1
+        if len(self._records) >= self.chunk_rows:
+            self._flush_chunk()
+
+    def _flush_chunk(self):
+        if not self._records:
+            return
+        path = os.path.join(self.directory, f"{self.name}-{self._chunks:05d}.parquet")
+        records_to_frame(self._records).to_parquet(path, index=False)
+        self._records = []
+        self._chunks += 1
+
+    def close(self):
+        self._flush_chunk()
+        self._f.close()
+
+# --------------------------------------------------------------
+# Exports, built from the streams after the run
+
+def iter_jsonl_lines(directory, names):
+    for name in names:
+        path = jsonl_path(directory, name)
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def iter_records(directory, names):
+    for line in iter_jsonl_lines(directory, names):
+        yield json.loads(line)
+
+
+def iter_chunks(directory, names):
+    for name in names:
+        for path in chunk_paths(directory, name):
+            df = pd.read_parquet(path)
+            yield df.astype(object).where(df.notna(), None)
+
+
+def all_columns(directory, names):
+    """Union of chunk columns in first-seen order (same as pd.DataFrame(rows))."""
+    import pyarrow.parquet as pq
+
+    columns = {}
+    for name in names:
+        for path in chunk_paths(directory, name):
+            for col in pq.read_schema(path).names:
+                columns.setdefault(col, None)
+    return list(columns)
+
+
+def export_jsonl(directory, names, path):
+    count = 0
+    with open(path, "w", encoding="utf-8") as out:
+        for line in iter_jsonl_lines(directory, names):
+            out.write(line)
+            count += 1
+    return count
+
+
+def export_json(directory, names, path):
+    """Same bytes as json.dump(records, f, indent=2, ensure_ascii=False)."""
+    with open(path, "w", encoding="utf-8") as out:
+        first = True
+        for line in iter_jsonl_lines(directory, names):
+            item = json.dumps(json.loads(line), indent=2, ensure_ascii=False)
+            out.write("[\n" if first else ",\n")
+            out.write("\n".join("  " + l for l in item.split("\n")))
+            first = False
+        out.write("[]" if first else "\n]")
+
+
+def export_xlsx(directory, names, path, columns):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(columns)
+    for df in iter_chunks(directory, names):
+        for row in df.reindex(columns=columns).itertuples(index=False, name=None):
+            ws.append([None if v is None or v != v else v for v in row])
+    wb.save(path)
+
+
+def export_csv(directory, names, path, columns):
+    with open(path, "w", encoding="utf-8", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for df in iter_chunks(directory, names):
+            for row in df.reindex(columns=columns).itertuples(index=False, name=None):
+                writer.writerow(["" if v is None or v != v else v for v in row])
+
+
+def export_streams(directory, names, prefix="combined_output", formats=("jsonl", "json", "xlsx", "csv")):
+    """Concatenates the named parts, in order, into <prefix>.<format>.
+    Returns the number of records."""
+    columns = all_columns(directory, names)
+    count = sum(1 for _ in iter_jsonl_lines(directory, names)) if "jsonl" not in formats else 0
+    if "jsonl" in formats:
+        count = export_jsonl(directory, names, f"{prefix}.jsonl")
+    if "json" in formats:
+        export_json(directory, names, f"{prefix}.json")
+    if "xlsx" in formats:
+        export_xlsx(directory, names, f"{prefix}.xlsx", columns)
+    if "csv" in formats:
+        export_csv(directory, names, f"{prefix}.csv", columns)
+    return count
+
+# --------------------------------------------------------------
+# Reading record files back (shard outputs, combined_output.*)
+
+def expand_inputs(paths):
+    if not paths:
+        return [JSONL_INPUT] if os.path.exists(JSONL_INPUT) else [JSON_INPUT]
+    files = []
+    for p in paths:
+        files.extend(sorted(glob.glob(p)) or [p])
+    return files
+
+
+def iter_input_records(paths):
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"{path} not found.")
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from json.load(f)
@@ -0,0 +1,264 @@
+# --------------------------------------------------------------
+# page_pool.py
+# Self-healing browser pages: recycle, detect crashes / hangs, retry
+# --------------------------------------------------------------
+# PageSlot owns one context + page (a ZIP's wizard page). It is
+# rebuilt — fresh context, same HAR / router / throttle setup — when
+#   - the page crashed, was closed, or no longer runs JS within
+#     PAGE_PROBE_MS (hung renderer)
+#   - it has done PAGE_MAX_NAVIGATIONS navigations
+#   - the browser process tree is above BROWSER_MAX_RSS_MB
+# The scheduler runs every (consumption, contract type) pass through
+# PagePool.run_pass(): a pass that raised or left the page unhealthy
+# is retried on the rebuilt page (PAGE_RETRIES times, a rebuild that
+# fails counts as one); detail pages it already fetched come back from
+# the journal.
+#
+# DetailPool tabs use the same caps and probes (recycle_async /
+# healthy_async); a context that can't open a tab any more is rebuilt,
+# the browser relaunched when it is gone.
+# --------------------------------------------------------------
+
+import os
+import threading
+import time
+
+# ==================== CONFIGURATION ====================
+
+PAGE_MAX_NAVIGATIONS = int(os.getenv("PAGE_MAX_NAVIGATIONS", "150"))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "2500"))  # 0 = no memory cap
+PAGE_RETRIES = int(os.getenv("PAGE_RETRIES", "2"))
+PAGE_PROBE_MS = int(os.getenv("PAGE_PROBE_MS", "5000"))
+
+# A page recycled for memory must have done at least this much work,
+# so one fat page does not make every worker rebuild in a loop
+RSS_MIN_NAVIGATIONS = 10
+RSS_CHECK_SECONDS = 5  # /proc is scanned at most this often
+
+PROBE_JS = "() => true"
+
+
+def process_tree_rss_mb(root=None):
+    """RSS of `root` (default: this process) and all its descendants —
+    the Playwright drivers and every Chromium process they started.
+    None where /proc is not available."""
+    root = root or os.getpid()
+    try:
+        pids = [int(p) for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return None
+    parents, rss = {}, {}
+    page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "r") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            parents[pid] = int(fields[1])
+            with open(f"/proc/{pid}/statm", "r") as f:
+                rss[pid] = int(f.read().split()[1]) * page_kb
+        except (OSError, IndexError, ValueError):
+            continue
+    children = {}
+    for pid, ppid in parents.items():
+        children.setdefault(ppid, []).append(pid)
+    total, todo = 0, [root]
+    while todo:
+        pid = todo.pop()
+        total += rss.get(pid, 0)
+        todo.extend(children.get(pid, ()))
+    return total / 1024
+
+
+def watch(page, state):
+    """Counts main-frame navigations and crashes of `page` into `state`."""
+    state["navigations"] = 0
+    state["crashed"] = False
+
+    def on_nav(frame):
+        if frame == page.main_frame:
+            state["navigations"] += 1
+
+    def on_crash(_):
+        state["crashed"] = True
+
+    page.on("framenavigated", on_nav)
+    page.on("crash", on_crash)
+    return state
+
+# --------------------------------------------------------------
+class PagePool:
+    """Run-wide caps and counters; hands out PageSlots."""
+
+    def __init__(self, max_navigations=PAGE_MAX_NAVIGATIONS, max_rss_mb=BROWSER_MAX_RSS_MB,
+                 retries=PAGE_RETRIES, probe_ms=PAGE_PROBE_MS):
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self.retries = retries
+        self.probe_ms = probe_ms
+        self.recycles = {}  # reason -> count
+        self.retried = 0
+        self.failed = 0     # passes given up after all retries
+        self.peak_rss_mb = 0.0
+        self._rss = (0.0, None)  # (monotonic time, MB) of the last scan
+        self._lock = threading.Lock()
+
+    def count(self, reason):
+        with self._lock:
+            self.recycles[reason] = self.recycles.get(reason, 0) + 1
+
+    def count_retry(self):
+        with self._lock:
+            self.retried += 1
+
+    def rss_mb(self):
+        if not self.max_rss_mb:
+            return None
+        checked, rss = self._rss
+        if time.monotonic() - checked < RSS_CHECK_SECONDS:
+            return rss
+        rss = process_tree_rss_mb()
+        with self._lock:
+            self._rss = (time.monotonic(), rss)
+            if rss is not None:
+                self.peak_rss_mb = max(self.peak_rss_mb, rss)
+        return rss
+
+    def recycle_reason(self, state):
+        """Why a healthy page should still be replaced now, or None."""
+        if self.max_navigations and state["navigations"] >= self.max_navigations:
+            return "navigations"
+        if state["navigations"] >= RSS_MIN_NAVIGATIONS:
+            rss = self.rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                return "memory"
+        return None
+
+    def slot(self, browser, name, setup, on_open=None):
+        return PageSlot(self, browser, name, setup, on_open)
+
+    # --- one pass with retries ---
+    def run_pass(self, slot, fn, label=""):
+        """fn(page) → result. Retried on a rebuilt page when it raises or
+        leaves the page crashed / hung; a rebuild that fails uses up an
+        attempt too. The last error is re-raised."""
+        broken = None
+        for attempt in range(self.retries + 1):
+            error = None
+            if broken is not None:
+                try:
+                    slot.rebuild(broken)
+                    broken = None
+                except Exception as e:
+                    error = e
+            if error is None:
+                try:
+                    result = fn(slot.page)
+                except Exception as e:
+                    result, error = None, e
+                reason = slot.unhealthy_reason()
+                if error is None and reason is None:
+                    slot.maybe_recycle()
+                    return result
+            else:
+                result, reason = None, broken  # the page is still the broken one
+            if attempt == self.retries:
+                with self._lock:
+                    self.failed += 1
+                if error is not None:
+                    raise error
+                return result  # page broke after the pass finished: keep what it got
+            self.count_retry()
+            print(f"  page {reason or 'error'} ({error or 'unhealthy'}) on {label}, "
+                  f"retrying on a fresh page ({attempt + 1}/{self.retries})")
+            broken = reason or "error"
+
+    # --- async pages (DetailPool) ---
+    async def healthy_async(self, page, state):
+        if state["crashed"] or page.is_closed():
+            return False
+        try:
+            await page.wait_for_function(PROBE_JS, timeout=self.probe_ms)
+            return True
+        except Exception:
+            return False
+
+    async def recycle_async(self, page, reason):
+        """Fresh page in the same context in place of `page`."""
+        self.count(reason)
+        new_page = await page.context.new_page()
+        try:
+            await page.close()
+        except Exception:
+            pass  # crashed pages may refuse to close cleanly
+        return new_page
+
+    # --------------------------------------------------------------
+    def metrics(self):
+        with self._lock:
+            out = {
+                "page_retries_total": self.retried,
+                "page_failed_passes_total": self.failed,
+                "browser_peak_rss_megabytes": round(self.peak_rss_mb, 1),
+            }
+            for reason in ("crash", "hung", "error", "navigations", "memory", "browser"):
+                out[f"page_recycles_{reason}_total"] = self.recycles.get(reason, 0)
+        return out
+
+    def print_summary(self):
+        recycles = ", ".join(f"{n} {r}" for r, n in sorted(self.recycles.items())) or "none"
+        peak = f", browser peak RSS {self.peak_rss_mb:.0f} MB" if self.peak_rss_mb else ""
+        print(f"\nPage pool: recycles {recycles}; {self.retried} passes retried, {self.failed} failed{peak}")
+
+# --------------------------------------------------------------
+class PageSlot:
+    """One rebuildable context + page. `setup(context, name)` attaches
+    HAR / routing / throttling to each new context; `on_open(page)`
+    lets the caller reset per-page state (capture, cookie consent)."""
+
+    def __init__(self, pool, browser, name, setup, on_open=None):
+        self.pool = pool
+        self.browser = browser
+        self.name = name
+        self.setup = setup
+        self.on_open = on_open
+        self.generation = 0
+        self.context = None
+        self.page = None
+        self.state = {}
+        self._open()
+
+    def _open(self):
+        # a rebuilt context records to its own HAR archive
+        name = self.name if self.generation == 0 else f"{self.name}_r{self.generation}"
+        self.context = self.setup(name)
+        self.page = self.context.new_page()
+        watch(self.page, self.state)
+        if self.on_open is not None:
+            self.on_open(self.page)
+
+    def unhealthy_reason(self):
+        if self.state["crashed"] or self.page.is_closed():
+            return "crash"
+        try:
+            self.page.wait_for_function(PROBE_JS, timeout=self.pool.probe_ms)
+        except Exception:
+            return "hung"
+        return None
+
+    def maybe_recycle(self):
+        reason = self.pool.recycle_reason(self.state)
+        if reason is not None:
+            print(f"  recycling page after {self.state['navigations']} navigations ({reason})")
+            self.rebuild(reason)
+
+    def rebuild(self, reason):
+        self.pool.count(reason)
+        self.close()
+        self.generation += 1
+        self._open()
+
+    def close(self):
+        try:
+            self.context.close()
+        except Exception:
+            pass  # the context may already be gone with a crashed target
@@ -0,0 +1,314 @@
+# --------------------------------------------------------------
+# planner.py
+# Scrape grid → tasks → k-of-n shards, with a cost estimate
+# --------------------------------------------------------------
+# Grid = ZIPs × consumption levels × contract types; one task per
+# (zip, consumption, contract type). Sources, later ones win:
+#   defaults below < GRID_CONFIG json file < env < CLI
+#
+#   {"zips": "0,3,5-7",                      # or "all", or [0, 3]
+#    "counties": [{"county": ..., "town": ..., "zip_code": ...}],
+#    "consumption_levels": ["2000", "5000"],
+#    "contract_types": ["TIMPRIS", "FAST PRIS"]}
+#
+#   env: ZIP_INDEXES / ZIP_INDEX, CONSUMPTION_LEVELS, CONTRACT_TYPES, SHARD
+#   CLI: --grid FILE --zips 0,3 --consumptions 2000 --contract-types TIMPRIS
+#        --shard 2/4 --plan-only
+#
+# Sharding: tasks are spread over n shards longest-first onto the
+# least loaded shard (durations from TASK_STATS_PATH, learned from
+# the tracing spans of earlier runs), so every shard process computes
+# the same split and shard k takes its part.
+#
+#   python planner.py --shard 1/4      → print the plan, scrape nothing
+# --------------------------------------------------------------
+
+import argparse
+import json
+import os
+import sys
+
+from fingerprints import task_id
+
+# ==================== CONFIGURATION ====================
+
+COUNTIES = [
+    {"county": "Stockholm län", "town": "Stockholm", "zip_code": "11121"},
+    {"county": "Uppsala län", "town": "Uppsala", "zip_code": "75310"},
+    {"county": "Södermanlands län", "town": "Nyköping", "zip_code": "61131"},
+    {"county": "Östergötlands län", "town": "Linköping", "zip_code": "58222"},
+    {"county": "Jönköpings län", "town": "Jönköping", "zip_code": "55315"},
+    {"county": "Kronobergs län", "town": "Växjö", "zip_code": "35222"},
+    {"county": "Kalmar län", "town": "Kalmar", "zip_code": "39231"},
+    {"county": "Gotlands län", "town": "Visby", "zip_code": "62157"},
+    {"county": "Blekinge län", "town": "Karlskrona", "zip_code": "37131"},
+    {"county": "Skåne län", "town": "Malmö", "zip_code": "21122"},
+    {"county": "Hallands län", "town": "Halmstad", "zip_code": "30243"},
+    {"county": "Västra Götalands län", "town": "Göteborg", "zip_code": "41103"},
+    {"county": "Värmlands län", "town": "Karlstad", "zip_code": "65224"},
+    {"county": "Örebro län", "town": "Örebro", "zip_code": "70210"},
+    {"county": "Västmanlands län", "town": "Västerås", "zip_code": "72211"},
+    {"county": "Dalarnas län", "town": "Falun", "zip_code": "79171"},
+    {"county": "Gävleborgs län", "town": "Gävle", "zip_code": "80320"},
+    {"county": "Västernorrlands län", "town": "Härnösand", "zip_code": "87131"},
+    {"county": "Jämtlands län", "town": "Östersund", "zip_code": "83131"},
+    {"county": "Västerbottens län", "town": "Umeå", "zip_code": "90327"},
+    {"county": "Norrbottens län", "town": "Luleå", "zip_code": "97231"},
+]
+
+CONSUMPTION_LEVELS = ["2000", "5000", "20000"]
+
+# In the order of the site's buttons (nth-child index = position + 1)
+CONTRACT_TYPES = [
+    "KVARTSPRIS",
+    "TIMPRIS",
+    "RÖRLIGT PRIS (MÅNADSBASERAT)",
+    "MIXAT PRIS 1 ÅR",
+    "FAST PRIS"
+]
+
+GRID_CONFIG = os.getenv("GRID_CONFIG", "")
+TASK_STATS_PATH = os.getenv("TASK_STATS_PATH", "task_stats.json")
+
+# Estimates for tasks never seen before
+DEFAULT_TASK_SECONDS = 90.0
+DEFAULT_TASK_CARDS = 25
+PAGES_PER_TASK = 2    # homepage/wizard + result view, before detail pages
+STATS_ALPHA = 0.5     # weight of the newest run in the moving average
+
+# Spans (tracing.py) that together make up one task
+TASK_STAGES = ("results_view", "capture", "visa_mer", "card_collection", "details")
+
+
+def parse_zip_indexes(spec, counties=COUNTIES):
+    if isinstance(spec, list):
+        indexes = [int(i) for i in spec]
+    elif str(spec).strip().lower() == "all":
+        return list(range(len(counties)))
+    else:
+        indexes = []
+        for part in str(spec).split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if "-" in part:
+                lo, hi = part.split("-", 1)
+                indexes.extend(range(int(lo), int(hi) + 1))
+            else:
+                indexes.append(int(part))
+    bad = [i for i in indexes if not 0 <= i < len(counties)]
+    if bad:
+        raise ValueError(f"Invalid ZIP indexes {bad}. Must be 0–{len(counties) - 1}.")
+    return sorted(set(indexes))
+
+
+def parse_contract_type(value):
+    """Contract type from a name (case-insensitive, unique prefix is
+    enough, e.g. "fast") or its button number 1–5."""
+    value = (value or "").strip()
+    if value.isdigit() and 1 <= int(value) <= len(CONTRACT_TYPES):
+        return CONTRACT_TYPES[int(value) - 1]
+    upper = value.upper()
+    if upper in CONTRACT_TYPES:
+        return upper
+    matches = [t for t in CONTRACT_TYPES if upper and t.startswith(upper)]
+    if len(matches) != 1:
+        raise ValueError(f"type must be one of {CONTRACT_TYPES} or 1–{len(CONTRACT_TYPES)}")
+    return matches[0]
+
+
+def split_list(value):
+    if isinstance(value, list):
+        return [str(v).strip() for v in value]
+    return [v.strip() for v in str(value).split(",") if v.strip()]
+
+
+def parse_shard(spec):
+    """"2/4" → (2, 4); shards are numbered from 1."""
+    if not spec:
+        return 1, 1
+    k, n = (int(x) for x in str(spec).split("/", 1))
+    if not 1 <= k <= n:
+        raise ValueError(f"Invalid shard {spec}: expected k/n with 1 <= k <= n")
+    return k, n
+
+# --------------------------------------------------------------
+# Grid
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape grid planner", add_help=False)
+    parser.add_argument("--grid", help="JSON grid config")
+    parser.add_argument("--zips", help='ZIP indexes: "all" or e.g. "0,3,5-7"')
+    parser.add_argument("--consumptions", help="comma-separated kWh levels")
+    parser.add_argument("--contract-types", help="comma-separated contract type names")
+    parser.add_argument("--shard", help="k/n, e.g. 2/4")
+    parser.add_argument("--workers", type=int, help="for the wall-time estimate")
+    parser.add_argument("--plan-only", action="store_true", help="print the plan and exit")
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)  # --resume etc. pass through
+    return args
+
+
+def load_grid(args):
+    grid = {}
+    path = args.grid or GRID_CONFIG
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            grid = json.load(f)
+
+    counties = grid.get("counties") or COUNTIES
+    zips = grid.get("zips")
+    if os.getenv("ZIP_INDEXES"):
+        zips = os.getenv("ZIP_INDEXES")
+    elif os.getenv("ZIP_INDEX"):
+        zips = os.getenv("ZIP_INDEX")
+    zips = args.zips or zips or "0"
+
+    consumptions = args.consumptions or os.getenv("CONSUMPTION_LEVELS") or grid.get("consumption_levels")
+    contract_types = args.contract_types or os.getenv("CONTRACT_TYPES") or grid.get("contract_types")
+    contract_types = split_list(contract_types) if contract_types else list(CONTRACT_TYPES)
+    try:
+        contract_types = [parse_contract_type(t) for t in contract_types]
+    except ValueError as e:
+        raise ValueError(f"Unknown contract type in {contract_types}: {e}") from None
+
+    return {
+        "counties": counties,
+        "indexes": parse_zip_indexes(zips, counties),
+        "consumption_levels": split_list(consumptions) if consumptions else list(CONSUMPTION_LEVELS),
+        "contract_types": [t for t in CONTRACT_TYPES if t in contract_types],
+    }
+
+
+def expand(grid):
+    """One task per (zip, consumption, contract type), in scrape order."""
+    tasks = []
+    for index in grid["indexes"]:
+        zip_info = grid["counties"][index]
+        for consumption in grid["consumption_levels"]:
+            for contract_type in grid["contract_types"]:
+                tasks.append({
+                    "index": index,
+                    "zip_info": zip_info,
+                    "zip_code": zip_info["zip_code"],
+                    "consumption": consumption,
+                    "contract_type": contract_type,
+                })
+    return tasks
+
+# --------------------------------------------------------------
+# Durations from earlier runs
+
+def load_stats(path=TASK_STATS_PATH):
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def estimate(task, stats, fallback_seconds):
+    entry = stats.get(task_id(task))
+    if entry:
+        return entry["seconds"], entry["cards"]
+    return fallback_seconds, DEFAULT_TASK_CARDS
+
+
+def update_stats(tracer, path=TASK_STATS_PATH):
+    """Folds this run's task spans into the moving averages; returns #tasks."""
+    if not path:
+        return 0
+    seconds, cards = {}, {}
+    for name, _, dur, _, attrs, _ in list(tracer.spans):
+        if name not in TASK_STAGES or not attrs.get("zip"):
+            continue
+        key = task_id({"zip_code": attrs["zip"], "consumption": attrs["consumption"],
+                       "contract_type": attrs["contract"]})
+        seconds[key] = seconds.get(key, 0.0) + dur
+        if name == "card_collection" and "cards" in attrs:
+            cards[key] = attrs["cards"]
+    stats = load_stats(path)
+    for key, secs in seconds.items():
+        old = stats.get(key)
+        new = {"seconds": secs, "cards": cards.get(key, old["cards"] if old else DEFAULT_TASK_CARDS)}
+        if old:
+            new = {k: STATS_ALPHA * new[k] + (1 - STATS_ALPHA) * old[k] for k in new}
+        stats[key] = {"seconds": round(new["seconds"], 2), "cards": round(new["cards"], 1)}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=1, ensure_ascii=False)
+    os.replace(tmp, path)
+    return len(seconds)
+
+# --------------------------------------------------------------
+# Plan
+
+def balance(weights, n):
+    """Longest first onto the least loaded bin; returns [(load, [i, ...]), ...]."""
+    bins = [[0.0, []] for _ in range(n)]
+    for i in sorted(range(len(weights)), key=lambda i: (-weights[i], i)):
+        target = min(range(n), key=lambda b: (bins[b][0], b))
+        bins[target][0] += weights[i]
+        bins[target][1].append(i)
+    return bins
+
+
+def make_plan(args=None, stats=None):
+    args = args or parse_args()
+    grid = load_grid(args)
+    stats = load_stats() if stats is None else stats
+    known = sorted(e["seconds"] for e in stats.values())
+    fallback = known[len(known) // 2] if known else DEFAULT_TASK_SECONDS
+
+    tasks = expand(grid)
+    for task in tasks:
+        task["est_seconds"], task["est_cards"] = estimate(task, stats, fallback)
+        task["learned"] = task_id(task) in stats
+
+    k, n = parse_shard(args.shard or os.getenv("SHARD", ""))
+    shards = balance([t["est_seconds"] for t in tasks], n)
+    mine = set(shards[k - 1][1])
+    tasks = [t for i, t in enumerate(tasks) if i in mine]  # keep scrape order
+
+    jobs = {}
+    for task in tasks:
+        job = jobs.setdefault(task["index"], {"index": task["index"], "zip_info": task["zip_info"],
+                                              "passes": [], "est_seconds": 0.0})
+        job["passes"].append((task["consumption"], task["contract_type"]))
+        job["est_seconds"] += task["est_seconds"]
+
+    return {
+        "shard": (k, n),
+        "shard_seconds": [round(load, 1) for load, _ in shards],
+        "tasks": tasks,
+        "jobs": [jobs[i] for i in sorted(jobs)],
+        "plan_only": args.plan_only,
+        "workers": args.workers,
+    }
+
+
+def estimate_wall(plan, workers):
+    """ZIPs run in parallel on `workers` contexts, tasks of one ZIP in sequence."""
+    workers = max(1, min(workers, len(plan["jobs"]) or 1))
+    bins = balance([job["est_seconds"] for job in plan["jobs"]], workers)
+    return max((load for load, _ in bins), default=0.0), workers
+
+
+def print_plan(plan, workers):
+    tasks = plan["tasks"]
+    k, n = plan["shard"]
+    pages = sum(PAGES_PER_TASK + t["est_cards"] for t in tasks)
+    wall, workers = estimate_wall(plan, plan["workers"] or workers)
+    learned = sum(t["learned"] for t in tasks)
+    print(f"Plan: shard {k}/{n}, {len(tasks)} tasks over {len(plan['jobs'])} ZIPs "
+          f"({learned} with history, the rest at defaults)")
+    for job in plan["jobs"]:
+        print(f"  {job['zip_info']['zip_code']} {job['zip_info']['town']:<12} {len(job['passes']):>3} tasks  "
+              f"~{job['est_seconds'] / 60:6.1f} min")
+    if n > 1:
+        print(f"  shard loads (min): {', '.join(f'{s / 60:.1f}' for s in plan['shard_seconds'])}")
+    print(f"Estimate: ~{pages:.0f} page loads, ~{wall / 60:.1f} min wall time with {workers} workers "
+          f"(~{sum(t['est_seconds'] for t in tasks) / 60:.1f} min serial)")
+
+# --------------------------------------------------------------
+if __name__ == "__main__":
+    plan = make_plan()
+    print_plan(plan, int(os.getenv("SCHEDULER_WORKERS", "3")))
@@ -0,0 +1,120 @@
+# --------------------------------------------------------------
+# providers.py
+# Provider dimension: contact data extracted once per provider
+# --------------------------------------------------------------
+# provider_name / provider_phone / provider_email / supplier_website
+# are the same on every contract of a supplier. ProviderCache keeps
+# them per provider_id (slug of the name, or the website host when
+# the name is missing):
+# - the locator extractor (DETAIL_EXTRACTOR=locators) skips the phone
+#   / e-mail lookup once that value is cached for the provider; the
+#   default snapshot extractor reads them in the same evaluate() anyway,
+#   so it only registers them and saves nothing
+# - cached values only fill fields a record is missing
+# - every record carries provider_id; the providers table is written
+#   to providers.json / providers.csv at the end of the run
+# - NORMALIZE_PROVIDERS=true also drops phone / e-mail / website from
+#   the records themselves (join on provider_id to get them back)
+# --------------------------------------------------------------
+
+import csv
+import json
+import os
+import re
+import threading
+import unicodedata
+from urllib.parse import urlparse
+
+# ==================== CONFIGURATION ====================
+
+PROVIDERS_PATH = os.getenv("PROVIDERS_PATH", "providers")  # → providers.json / .csv
+NORMALIZE_PROVIDERS = os.getenv("NORMALIZE_PROVIDERS", "false").lower() == "true"
+
+PROVIDER_FIELDS = ["provider_name", "provider_phone", "provider_email", "supplier_website"]
+CONTACT_FIELDS = PROVIDER_FIELDS[1:]
+
+
+def slug(text):
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def provider_id(name, website=None):
+    """Stable key for a provider: name slug, else website host, else None."""
+    if name and slug(name):
+        return slug(name)
+    if website:
+        host = urlparse(website if "//" in website else "//" + website).netloc.lower()
+        return host[4:] if host.startswith("www.") else host or None
+    return None
+
+# --------------------------------------------------------------
+class ProviderCache:
+    def __init__(self):
+        self.providers = {}  # provider_id -> {provider_id, provider_name, phone, email, website}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def known(self, name):
+        """Cached entry for a provider name, or None. A hit means both
+        phone and e-mail are cached; a field still None has to be looked
+        up again (it may just be missing from the page it was first seen on)."""
+        pid = provider_id(name)
+        with self._lock:
+            entry = self.providers.get(pid) if pid else None
+            if entry is not None and entry["provider_phone"] is not None and entry["provider_email"] is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return dict(entry) if entry is not None else None
+
+    def apply(self, fields):
+        """Registers the provider of `fields` (first non-empty value wins) and
+        fills the provider fields `fields` is missing from the cache; what
+        the record's own page said is kept. Returns `fields`."""
+        pid = provider_id(fields.get("provider_name"), fields.get("supplier_website"))
+        if pid is None:
+            return fields
+        with self._lock:
+            entry = self.providers.setdefault(pid, {"provider_id": pid, **{f: None for f in PROVIDER_FIELDS}})
+            for f in PROVIDER_FIELDS:
+                if entry[f] is None and fields.get(f):
+                    entry[f] = fields[f]
+            for f in PROVIDER_FIELDS:
+                if not fields.get(f) and entry[f] is not None:
+                    fields[f] = entry[f]
+        return fields
+
+    def add_records(self, records):
+        """Registers providers of records that skipped extraction (journal,
+        fingerprints, capture), so the table covers the whole run."""
+        for record in records:
+            if record.get("provider_id") or record.get("provider_name"):
+                self.apply({f: record.get(f) for f in PROVIDER_FIELDS})
+
+    def table(self):
+        with self._lock:
+            return sorted((dict(e) for e in self.providers.values()), key=lambda e: e["provider_id"])
+
+    def save(self, prefix=PROVIDERS_PATH):
+        rows = self.table()
+        with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+        with open(f"{prefix}.csv", "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["provider_id", *PROVIDER_FIELDS])
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def print_summary(self):
+        total = self.hits + self.misses
+        saved = f", contact lookups skipped on {self.hits} of {total} pages" if total else ""
+        print(f"\nProviders: {len(self.providers)} distinct{saved}")
+
+
+def normalize_record(record):
+    """Record without the provider contact columns (kept in the providers table)."""
+    if not record.get("provider_id"):
+        return record
+    return {k: v for k, v in record.items() if k not in CONTACT_FIELDS}
@@ -0,0 +1,299 @@
+# --------------------------------------------------------------
+# query.py
+# Indexed in-memory query engine over scraped contracts
+# --------------------------------------------------------------
+# ContractStore loads records (combined_output.json / .jsonl, typed
+# Parquet, or the whole history/ dataset) into a compact column store:
+#   - zip, county, electrical_area, consumption, contract type,
+#     provider and scrape date as integer codes, each with an inverted
+#     index value → sorted row ids (filters intersect those, smallest
+#     first, nothing is scanned)
+#   - jämförpris parsed once into a float array (öre/kWh)
+#   - display columns dictionary-encoded (codes + distinct values)
+#
+#   python query.py top --kwh 5000 --type fast -k 5
+#   python query.py cheapest --by county --type "FAST PRIS" --kwh 5000
+#   python query.py group --by area --type timpris
+#   python query.py provider "Vattenfall" [--kwh 2000]
+#   python query.py --history history/ shell     ← load once, query interactively
+#   python query.py --from-history top           ← --history HISTORY_DIR
+#
+# A history source is restricted to its latest scrape date unless
+# --date YYYY-MM-DD or --all-dates is given.
+# --------------------------------------------------------------
+
+import argparse
+import shlex
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from output_stream import expand_inputs, iter_input_records
+from planner import parse_contract_type
+from providers import provider_id, slug
+from transform import parse_quantity
+import history_store
+
+# ==================== CONFIGURATION ====================
+
+# filter name → record column; all of these are indexed
+INDEXED = {
+    "zip": "scraped_zip_code",
+    "county": "scraped_county",
+    "area": "electrical_area",
+    "kwh": "scraped_consumption_kwh",
+    "type": "selected_contract_type",
+    "provider": "provider_id",
+    "date": "scrape_date",
+}
+
+DISPLAY_COLUMNS = ["provider_name", "contract_name", "contract_duration", "jämförpris", "url"]
+PRICE_COLUMN = "jämförpris"
+TO_ORE = {"öre/kWh": 1.0, "öre": 1.0, "kr/kWh": 100.0, "kr": 100.0}
+
+# --------------------------------------------------------------
+def read_frame(paths=None, history=None):
+    """Raw records as a DataFrame, only the columns the store keeps."""
+    columns = [*INDEXED.values(), *DISPLAY_COLUMNS]
+    if history:
+        table = history_store.dataset(history)
+        names = [c for c in columns if c in table.schema.names]
+        return table.to_table(columns=names).to_pandas()
+    frames, records = [], []
+    for path in expand_inputs(paths):
+        if path.endswith(".parquet"):
+            df = pd.read_parquet(path)
+            frames.append(df[[c for c in columns if c in df.columns]])
+        else:
+            records.extend(iter_input_records([path]))
+    if records:
+        df = pd.DataFrame.from_records(records)
+        frames.append(df[[c for c in columns if c in df.columns]])
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def to_ore(series):
+    values, units = parse_quantity(series)
+    factor = units.map(TO_ORE).astype("float64").fillna(1.0)  # no unit: already öre/kWh
+    return (values.astype("float64") * factor).to_numpy()
+
+
+def ids_union(arrays):
+    return arrays[0] if len(arrays) == 1 else np.unique(np.concatenate(arrays))
+
+# --------------------------------------------------------------
+class ContractStore:
+    def __init__(self, frame):
+        self.n = len(frame)
+        if "provider_id" not in frame.columns:
+            frame["provider_id"] = None
+        # older outputs have no provider_id: derive it like the scraper does
+        missing = frame["provider_id"].isna()
+        if missing.any() and "provider_name" in frame.columns:
+            frame.loc[missing, "provider_id"] = frame.loc[missing, "provider_name"].map(
+                lambda name: provider_id(name) if isinstance(name, str) else None)
+
+        self.codes = {}   # column → int32 codes (-1 = missing)
+        self.values = {}  # column → distinct values (str), code = position
+        self.index = {}   # column → {value: sorted row ids}
+        for column in INDEXED.values():
+            if column not in frame.columns:
+                continue
+            as_str = frame[column].map(lambda v: None if v is None or v != v else str(v))
+            codes, uniques = pd.factorize(as_str, sort=True)
+            codes = codes.astype(np.int32)
+            self.codes[column] = codes
+            self.values[column] = np.asarray(uniques, dtype=object)
+            order = np.argsort(codes, kind="stable").astype(np.int32)
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            start = int((codes < 0).sum())  # missing values sort first
+            bounds = np.cumsum(np.concatenate([[start], counts]))
+            self.index[column] = {v: order[bounds[i]:bounds[i + 1]] for i, v in enumerate(uniques)}
+
+        self.price = to_ore(frame[PRICE_COLUMN]) if PRICE_COLUMN in frame.columns else np.full(self.n, np.nan)
+        self.display = {}  # column → (int32 codes, distinct values), like a categorical
+        for c in DISPLAY_COLUMNS:
+            if c in frame.columns:
+                codes, uniques = pd.factorize(frame[c])
+                self.display[c] = (codes.astype(np.int32), np.append(np.asarray(uniques, dtype=object), None))
+
+    @classmethod
+    def load(cls, paths=None, history=None):
+        return cls(read_frame(paths, history))
+
+    # --------------------------------------------------------------
+    def column(self, name):
+        column = INDEXED.get(name, name)
+        if column not in self.index:
+            raise ValueError(f"no {name} column in the loaded data")
+        return column
+
+    def normalize(self, name, value):
+        if name == "type":
+            return parse_contract_type(value)
+        if name == "provider":
+            return provider_id(value) or slug(value)
+        if name == "date" and value == "latest":
+            return self.values[self.column("date")][-1] if len(self.values[self.column("date")]) else None
+        return str(value)
+
+    def rows(self, **filters):
+        """Row ids matching every filter (a list value matches any of its
+        items), from the inverted indexes only."""
+        id_sets = []
+        for name, value in filters.items():
+            if value is None:
+                continue
+            column = self.column(name)
+            wanted = value if isinstance(value, (list, tuple)) else [value]
+            empty = np.empty(0, dtype=np.int32)
+            id_sets.append(ids_union([self.index[column].get(self.normalize(name, v), empty) for v in wanted]))
+        if not id_sets:
+            return np.arange(self.n, dtype=np.int32)
+        id_sets.sort(key=len)
+        ids = id_sets[0]
+        for other in id_sets[1:]:
+            if not len(ids):
+                break
+            ids = np.intersect1d(ids, other, assume_unique=True)
+        return ids
+
+    def frame(self, ids, price=True):
+        """Display rows for `ids`, with the indexed columns decoded."""
+        out = {}
+        for name, column in INDEXED.items():
+            if column in self.codes and name != "provider":
+                codes = self.codes[column][ids]
+                out[name] = np.where(codes >= 0, self.values[column][codes], None)
+        df = pd.DataFrame(out)
+        for c, (codes, uniques) in self.display.items():
+            df[c] = uniques[codes[ids]]  # -1 (missing) → the trailing None
+        if price:
+            df["öre_kwh"] = self.price[ids]
+        return df
+
+    # --- queries ---
+    def top_k(self, k=10, **filters):
+        """The k cheapest contracts by jämförpris."""
+        ids = self.rows(**filters)
+        ids = ids[~np.isnan(self.price[ids])]
+        if len(ids) > k:
+            ids = ids[np.argpartition(self.price[ids], k - 1)[:k]]
+        return self.frame(ids[np.argsort(self.price[ids], kind="stable")])
+
+    def cheapest_by(self, by, k=1, **filters):
+        """The k cheapest contracts within each value of `by` (e.g. county)."""
+        column = self.column(by)
+        ids = self.rows(**filters)
+        ids = ids[~np.isnan(self.price[ids]) & (self.codes[column][ids] >= 0)]
+        groups = self.codes[column][ids]
+        order = np.lexsort((self.price[ids], groups))
+        ids, groups = ids[order], groups[order]
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        rank = np.arange(len(ids)) - np.repeat(starts, np.diff(np.r_[starts, len(ids)]))
+        return self.frame(ids[rank < k])
+
+    def group_by(self, by, **filters):
+        """Contracts and jämförpris statistics per value of `by`."""
+        column = self.column(by)
+        ids = self.rows(**filters)
+        ids = ids[self.codes[column][ids] >= 0]
+        stats = (
+            pd.DataFrame({"group": self.codes[column][ids], "price": self.price[ids]})
+            .groupby("group")["price"]
+            .agg(contracts="size", priced="count", min="min", median="median", mean="mean", max="max")
+        )
+        stats.index = self.values[column][stats.index.to_numpy()]
+        stats.index.name = by
+        return stats.round(2)
+
+    def provider(self, name, **filters):
+        """Every contract of one provider (name or provider_id), cheapest first."""
+        ids = self.rows(provider=name, **filters)
+        return self.frame(ids[np.argsort(self.price[ids], kind="stable")])
+
+    def summary(self):
+        sizes = ", ".join(f"{len(self.index[c])} {name}" for name, c in INDEXED.items() if c in self.index)
+        return f"{self.n} contracts; {sizes}"
+
+# --------------------------------------------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(description="Query scraped contracts")
+    parser.add_argument("--from", dest="paths", action="append",
+                        help="JSON / JSONL / Parquet file or glob (repeatable; default combined_output)")
+    parser.add_argument("--history", metavar="DIR", help="Parquet history dir")
+    parser.add_argument("--from-history", dest="history", action="store_const", const=history_store.HISTORY_DIR,
+                        help=f"same as --history {history_store.HISTORY_DIR}")
+    parser.add_argument("--all-dates", action="store_true", help="history: don't restrict to the latest date")
+    add_query_args(parser)
+    return parser
+
+
+def add_query_args(parser):
+    parser.add_argument("command", nargs="?", default="top", choices=["top", "cheapest", "group", "provider", "shell"])
+    parser.add_argument("name", nargs="?", help="provider name (provider command)")
+    parser.add_argument("-k", type=int, default=None, help="top: 10, cheapest: 1 per group")
+    parser.add_argument("--by", default="county", choices=[n for n in INDEXED if n != "provider"] + ["provider"])
+    for name in INDEXED:
+        parser.add_argument(f"--{name}", action="append", help="filter; repeat for any-of")
+
+
+def run_query(store, args, latest=None):
+    filters = {name: getattr(args, name) for name in INDEXED if name != "provider" or args.command != "provider"}
+    if filters.get("date") is None and latest is not None:
+        filters["date"] = latest
+    if args.command == "top":
+        return store.top_k(args.k or 10, **filters)
+    if args.command == "cheapest":
+        return store.cheapest_by(args.by, args.k or 1, **filters)
+    if args.command == "group":
+        return store.group_by(args.by, **filters)
+    if args.command == "provider":
+        if not args.name:
+            raise ValueError("provider needs a name")
+        return store.provider(args.name, **{k: v for k, v in filters.items() if k != "provider"})
+    raise ValueError(f"unknown command {args.command}")
+
+
+def show(store, args, latest):
+    started = time.perf_counter()
+    try:
+        result = run_query(store, args, latest)
+    except ValueError as e:
+        print(f"error: {e}")
+        return
+    took = (time.perf_counter() - started) * 1000
+    with pd.option_context("display.max_rows", 200, "display.max_colwidth", 40, "display.width", 200):
+        print(result.to_string(index=args.command == "group") if len(result) else "(no matches)")
+    print(f"\n{len(result)} rows in {took:.1f} ms")
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    started = time.perf_counter()
+    store = ContractStore.load(args.paths, args.history)
+    has_dates = INDEXED["date"] in store.index
+    latest = "latest" if has_dates and not args.all_dates else None
+    print(f"Loaded {store.summary()} in {time.perf_counter() - started:.2f}s"
+          + (" (latest date only)" if latest else ""))
+
+    if args.command != "shell":
+        show(store, args, latest)
+        sys.exit(0)
+
+    shell = argparse.ArgumentParser(prog="", add_help=False, exit_on_error=False)
+    add_query_args(shell)
+    print("Commands: top | cheapest | group | provider NAME, with --kwh --type --county ... (Ctrl+D to quit)")
+    while True:
+        try:
+            line = input("query> ").strip()
+        except EOFError:
+            break
+        if not line:
+            continue
+        try:
+            show(store, shell.parse_args(shlex.split(line)), latest)
+        except (argparse.ArgumentError, SystemExit) as e:
+            print(f"error: {e}")
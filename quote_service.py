@@ -0,0 +1,326 @@
+# --------------------------------------------------------------
+# quote_service.py
+# Long-running quote service: warm browser + local HTTP/JSON API
+# --------------------------------------------------------------
+#   python quote_service.py [--port 8080] [--host 127.0.0.1]
+#
+#   GET /quotes?zip=11121&kwh=5000&type=FAST PRIS
+#       → {"zip", "kwh", "type", "cached", "age_s", "count", "quotes": [records]}
+#       type: a CONTRACT_TYPES name (case-insensitive, unique prefix
+#       such as "fast" is enough) or its button number 1–5
+#   GET /health    GET /stats
+#
+# - One Chromium stays up; QUOTE_WORKERS threads each keep a warm
+#   context (PageSlot, so crashes are rebuilt) and their learned deep
+#   links, and scrape a miss with the same iter_zip_records pass as
+#   a full run (throttled, detail pool, provider cache)
+# - Listings are cached for QUOTE_TTL_S, at most QUOTE_CACHE_SIZE of
+#   them (least recently used evicted); concurrent requests for the
+#   same quote share one scrape
+# --------------------------------------------------------------
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from playwright.sync_api import sync_playwright
+
+from detail_pages import DetailPool
+from navigator import ResultsNavigator
+from page_pool import PagePool
+from planner import COUNTIES, parse_contract_type
+from providers import ProviderCache
+from readiness import Readiness
+from routing import RequestRouter
+from throttle import THROTTLE
+import scrape_elpriskollen as scraper
+
+# ==================== CONFIGURATION ====================
+
+QUOTE_HOST = os.getenv("QUOTE_HOST", "127.0.0.1")
+QUOTE_PORT = int(os.getenv("QUOTE_PORT", "8080"))
+QUOTE_WORKERS = int(os.getenv("QUOTE_WORKERS", "2"))
+QUOTE_TTL_S = float(os.getenv("QUOTE_TTL_S", "900"))
+QUOTE_CACHE_SIZE = int(os.getenv("QUOTE_CACHE_SIZE", "256"))
+QUOTE_TIMEOUT_S = float(os.getenv("QUOTE_TIMEOUT_S", "300"))
+
+ZIPS = {c["zip_code"]: c for c in COUNTIES}
+
+
+def parse_query(q):
+    """(zip, kwh, contract type) from query params; ValueError on bad input."""
+    zip_code = (q.get("zip") or "").replace(" ", "")
+    kwh = (q.get("kwh") or "").replace(" ", "")
+    if not (zip_code.isdigit() and len(zip_code) == 5):
+        raise ValueError("zip must be a 5-digit postal code")
+    if not kwh.isdigit() or int(kwh) <= 0:
+        raise ValueError("kwh must be a positive integer")
+    return zip_code, kwh, parse_contract_type(q.get("type"))
+
+# --------------------------------------------------------------
+class QuoteCache:
+    """TTL + LRU cache of listings: key → (stored at, records)."""
+
+    def __init__(self, ttl=QUOTE_TTL_S, size=QUOTE_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                del self.entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, records):
+        with self._lock:
+            self.entries[key] = (time.monotonic(), records)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "expired": self.expired, "evicted": self.evicted}
+
+
+class QuoteService:
+    """Cache + request coalescing in front of `scrape(zip, kwh, type)`."""
+
+    def __init__(self, scrape, cache=None, timeout=QUOTE_TIMEOUT_S):
+        self.scrape = scrape
+        self.cache = cache or QuoteCache()
+        self.timeout = timeout
+        self.in_flight = {}  # key -> Future
+        self.coalesced = 0
+        self.scrapes = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def quote(self, zip_code, kwh, contract_type):
+        key = (zip_code, kwh, contract_type)
+        result = {"zip": zip_code, "kwh": kwh, "type": contract_type}
+        entry = self.cache.get(key)
+        if entry is not None:
+            return {**result, "cached": True, "age_s": round(time.monotonic() - entry[0], 1),
+                    "count": len(entry[1]), "quotes": entry[1]}
+
+        with self._lock:
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = Future()
+                self.scrapes += 1
+            else:
+                self.coalesced += 1
+        if owner:
+            try:
+                records = self.scrape(zip_code, kwh, contract_type)
+                if records:  # an empty listing is more likely a failed pass than a real answer
+                    self.cache.put(key, records)
+                future.set_result(records)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self.in_flight[key]
+        records = future.result(timeout=self.timeout)
+        return {**result, "cached": False, "age_s": 0.0, "count": len(records), "quotes": records}
+
+    def stats(self):
+        with self._lock:
+            own = {"scrapes": self.scrapes, "coalesced": self.coalesced, "errors": self.errors,
+                   "in_flight": len(self.in_flight)}
+        return {**own, "cache": self.cache.stats()}
+
+# --------------------------------------------------------------
+class BrowserWorkers:
+    """One Chromium (launched by its own thread, shared over CDP) and
+    `workers` threads that each keep a warm context and scrape passes."""
+
+    def __init__(self, workers=QUOTE_WORKERS, headless=scraper.HEADLESS_MODE):
+        self.workers = max(1, workers)
+        self.headless = headless
+        self.jobs = queue.Queue()
+        self.ready = Readiness()
+        self.router = RequestRouter()
+        self.pages = PagePool()
+        self.providers = ProviderCache()
+        self.detail_pool = None
+        self._stop = threading.Event()
+        self._launched = threading.Event()
+        self._threads = []
+
+    def start(self):
+        port = scraper.free_port()
+        self._threads.append(threading.Thread(target=self._own_browser, args=(port,), daemon=True))
+        self._threads[0].start()
+        self._launched.wait()
+        if scraper.DETAIL_CONCURRENCY > 1:
+            self.detail_pool = DetailPool(
+                pool_size=scraper.DETAIL_CONCURRENCY,
+                max_in_flight=scraper.DETAIL_MAX_IN_FLIGHT,
+                headless=self.headless,
+                ready=self.ready,
+                router=self.router,
+                providers=self.providers,
+                pages=self.pages,
+            ).start()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, args=(f"http://127.0.0.1:{port}", i), daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def _own_browser(self, port):
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=self.headless, args=[f"--remote-debugging-port={port}"])
+            self._launched.set()
+            self._stop.wait()
+            browser.close()
+
+    def _work(self, cdp_url, i):
+        with sync_playwright() as p:
+            browser = p.chromium.connect_over_cdp(cdp_url)
+            navigator = ResultsNavigator(enabled=scraper.DEEP_LINKS)
+
+            def setup(name):
+                context = browser.new_context(**scraper.CONTEXT_OPTIONS)
+                self.router.attach(context)
+                THROTTLE.attach(context)
+                return context
+
+            def on_open(page):
+                navigator.consent_done = False
+
+            slot = self.pages.slot(browser, f"quote_{i}", setup, on_open)
+            try:
+                while not self._stop.is_set():
+                    try:
+                        (zip_code, kwh, contract_type), future = self.jobs.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    zip_info = ZIPS.get(zip_code, {"county": None, "town": None, "zip_code": zip_code})
+                    try:
+                        future.set_result(self.pages.run_pass(slot, lambda page: scraper.scrape_for_zip(
+                            page, zip_info, passes=[(kwh, contract_type)], ready=self.ready,
+                            navigator=navigator, detail_pool=self.detail_pool, providers=self.providers,
+                        ), f"{zip_code} {kwh} kWh {contract_type}"))
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                slot.close()
+
+    def scrape(self, zip_code, kwh, contract_type):
+        future = Future()
+        self.jobs.put(((zip_code, kwh, contract_type), future))
+        return future.result(timeout=QUOTE_TIMEOUT_S)
+
+    def close(self):
+        self._stop.set()
+        for t in self._threads[1:]:
+            t.join()
+        if self.detail_pool is not None:
+            self.detail_pool.close()
+        self._threads[0].join()
+
+# --------------------------------------------------------------
+def make_handler(service, workers=None):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == "/health":
+                self._send(200, {"status": "ok", "workers": workers.workers if workers else 0})
+            elif url.path == "/stats":
+                extra = {**THROTTLE.metrics(), **workers.pages.metrics()} if workers else {}
+                self._send(200, {**service.stats(), **extra})
+            elif url.path == "/quotes":
+                try:
+                    key = parse_query(q)
+                except ValueError as e:
+                    self._send(400, {"error": str(e)})
+                    return
+                started = time.monotonic()
+                try:
+                    result = service.quote(*key)
+                except FutureTimeout:
+                    self._send(504, {"error": "scrape timed out"})
+                    return
+                except Exception as e:
+                    self._send(502, {"error": f"scrape failed: {e}"})
+                    return
+                self._send(200, {**result, "took_ms": round((time.monotonic() - started) * 1000, 1)})
+            else:
+                self._send(404, {"error": "not found"})
+
+    return Handler
+
+
+def serve(service, host=QUOTE_HOST, port=QUOTE_PORT, workers=None):
+    """Starts the API in a daemon thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(service, workers))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+# --------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm-browser quote service")
+    parser.add_argument("--host", default=QUOTE_HOST)
+    parser.add_argument("--port", type=int, default=QUOTE_PORT)
+    parser.add_argument("--workers", type=int, default=QUOTE_WORKERS)
+    args = parser.parse_args()
+
+    print(f"Launching browser ({args.workers} workers, headless={scraper.HEADLESS_MODE})...")
+    workers = BrowserWorkers(args.workers).start()
+    service = QuoteService(workers.scrape)
+    server, url = serve(service, args.host, args.port, workers)
+    print(f"Quote service on {url}/quotes?zip=11121&kwh=5000&type=TIMPRIS (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("Stopping...")
+        server.shutdown()
+        workers.close()
+        THROTTLE.print_summary()
+        workers.pages.print_summary()
@@ -0,0 +1,217 @@
+# --------------------------------------------------------------
+# readiness.py
+# Event-driven waits instead of fixed sleeps
+# --------------------------------------------------------------
+# Every wait is tied to a concrete signal (selector visible,
+# network idle, result-card count settled/grown) and a per-step
+# deadline. How long each wait actually took is recorded so
+# print_summary() can show where the time goes.
+#
+# Override deadlines (ms) with e.g.
+#   READY_DEADLINES="results=30000,detail=10000"
+#
+# page.evaluate() has no timeout, so a hung renderer would block the
+# caller forever. evaluate() / evaluate_async() run the function through
+# wait_for_function() instead: called once (its result is truthy), but
+# under a timeout the driver enforces, so a hang raises.
+# --------------------------------------------------------------
+
+import os
+import time
+
+# ==================== CONFIGURATION ====================
+
+DEFAULT_DEADLINES = {
+    "homepage": 30000,
+    "cookie": 5000,
+    "zip": 15000,
+    "consumption": 15000,
+    "contract": 10000,
+    "duration": 10000,
+    "continue": 10000,
+    "results": 30000,
+    "show_more": 15000,
+    "pagination": 300000,  # the whole in-page "Visa mer" loop
+    "capture": 10000,
+    "detail": 15000,
+}
+
+# Card count must stay unchanged this long to count as "settled"
+SETTLE_QUIET_MS = 1500
+POLL_MS = 200
+
+EVALUATE_TIMEOUT_MS = int(os.getenv("EVALUATE_TIMEOUT_MS", "30000"))
+
+COUNT_JS = "(sel) => ({n: document.querySelectorAll(sel).length})"
+
+EXHAUST_JS = """
+async ({button, texts, cards, deadline, poll, gap}) => {
+    const count = () => document.querySelectorAll(cards).length;
+    const sleep = (ms) => new Promise(r => setTimeout(r, ms));
+    const find = () => [...document.querySelectorAll(button)].find(b =>
+        b.getClientRects().length > 0 && !b.disabled && texts.some(t => b.textContent.includes(t)));
+    let clicks = 0, stalled = false, btn, last = 0;
+    while ((btn = find())) {
+        const before = count();
+        const due = last + gap - performance.now();
+        if (clicks && due > 0) await sleep(due);
+        last = performance.now();
+        btn.click();
+        clicks++;
+        const until = performance.now() + deadline;
+        while (count() <= before && performance.now() < until) await sleep(poll);
+        if (count() <= before) { stalled = true; break; }
+    }
+    return {clicks, count: count(), stalled};
+}
+"""
+
+
+def evaluate(page, js, arg=None, timeout=EVALUATE_TIMEOUT_MS):
+    """page.evaluate(js, arg) that raises after `timeout` ms. `js` must
+    return something truthy (an object or array)."""
+    return page.wait_for_function(js, arg=arg, timeout=timeout, polling=POLL_MS).json_value()
+
+
+async def evaluate_async(page, js, arg=None, timeout=EVALUATE_TIMEOUT_MS):
+    handle = await page.wait_for_function(js, arg=arg, timeout=timeout, polling=POLL_MS)
+    return await handle.json_value()
+
+
+def count_matches(page, selector, timeout=EVALUATE_TIMEOUT_MS):
+    """page.locator(selector).count(), but raising on a hung page."""
+    return evaluate(page, COUNT_JS, selector, timeout)["n"]
+
+
+def deadlines_from_env():
+    deadlines = dict(DEFAULT_DEADLINES)
+    for part in os.getenv("READY_DEADLINES", "").split(","):
+        if "=" in part:
+            step, ms = part.split("=", 1)
+            deadlines[step.strip()] = int(ms)
+    return deadlines
+
+# --------------------------------------------------------------
+class Readiness:
+    def __init__(self, deadlines=None):
+        self.deadlines = deadlines or deadlines_from_env()
+        self.timings = {}   # step -> [seconds, ...]
+        self.timeouts = {}  # step -> number of waits that hit the deadline
+
+    def _record(self, step, started, ok):
+        self.timings.setdefault(step, []).append(time.monotonic() - started)
+        if not ok:
+            self.timeouts[step] = self.timeouts.get(step, 0) + 1
+        return ok
+
+    # --- selector visible / attached ---
+    def selector(self, page, step, selector, state="visible"):
+        started = time.monotonic()
+        try:
+            page.wait_for_selector(selector, state=state, timeout=self.deadlines[step])
+            return self._record(step, started, True)
+        except Exception:
+            return self._record(step, started, False)
+
+    async def selector_async(self, page, step, selector, state="visible"):
+        started = time.monotonic()
+        try:
+            await page.wait_for_selector(selector, state=state, timeout=self.deadlines[step])
+            return self._record(step, started, True)
+        except Exception:
+            return self._record(step, started, False)
+
+    # --- no network traffic for 500 ms (listing / detail XHRs done) ---
+    def network_idle(self, page, step):
+        started = time.monotonic()
+        try:
+            page.wait_for_load_state("networkidle", timeout=self.deadlines[step])
+            return self._record(step, started, True)
+        except Exception:
+            return self._record(step, started, False)
+
+    async def network_idle_async(self, page, step):
+        started = time.monotonic()
+        try:
+            await page.wait_for_load_state("networkidle", timeout=self.deadlines[step])
+            return self._record(step, started, True)
+        except Exception:
+            return self._record(step, started, False)
+
+    # --- result cards: count stops changing ---
+    def count_settled(self, page, step, selector, minimum=1, quiet_ms=SETTLE_QUIET_MS):
+        """Polls the number of `selector` matches until it is >= minimum and
+        unchanged for quiet_ms. Returns the final count (also on deadline)."""
+        started = time.monotonic()
+        deadline = started + self.deadlines[step] / 1000
+        last, since = -1, started
+        while True:
+            n = count_matches(page, selector)
+            now = time.monotonic()
+            if n != last:
+                last, since = n, now
+            elif n >= minimum and (now - since) * 1000 >= quiet_ms:
+                self._record(step, started, True)
+                return n
+            if now >= deadline:
+                self._record(step, started, False)
+                return n
+            page.wait_for_timeout(POLL_MS)
+
+    # --- result cards: count grows past `previous` ---
+    def count_above(self, page, step, selector, previous):
+        started = time.monotonic()
+        try:
+            page.wait_for_function(
+                "([sel, n]) => document.querySelectorAll(sel).length > n",
+                arg=[selector, previous],
+                timeout=self.deadlines[step],
+                polling=POLL_MS,
+            )
+            return self._record(step, started, True)
+        except Exception:
+            return self._record(step, started, False)
+
+    # --- "Visa mer" until the listing is complete, inside the page ---
+    def exhaust_pagination(self, page, step, button_selector, texts, selector, min_gap_ms=0):
+        """Clicks the visible `button_selector` whose text contains one of
+        `texts` from in-page JS, each time as soon as the `selector` count
+        has grown, until the button is gone or a click adds nothing within
+        the step deadline, at most one click per min_gap_ms. One round
+        trip for the whole listing, bounded by the "pagination" deadline.
+        Returns (clicks, final count); raises when the page hangs."""
+        started = time.monotonic()
+        try:
+            result = evaluate(
+                page, EXHAUST_JS,
+                {"button": button_selector, "texts": texts, "cards": selector,
+                 "deadline": self.deadlines[step], "poll": POLL_MS // 4, "gap": min_gap_ms},
+                timeout=self.deadlines["pagination"],
+            )
+        except Exception:
+            self._record(step, started, False)
+            return 0, count_matches(page, selector)
+        self._record(step, started, not result["stalled"])
+        return result["clicks"], result["count"]
+
+    # --------------------------------------------------------------
+    def summary(self):
+        rows = []
+        for step, secs in self.timings.items():
+            rows.append({
+                "step": step,
+                "waits": len(secs),
+                "total_s": round(sum(secs), 2),
+                "mean_s": round(sum(secs) / len(secs), 3),
+                "max_s": round(max(secs), 3),
+                "timeouts": self.timeouts.get(step, 0),
+            })
+        return sorted(rows, key=lambda r: r["total_s"], reverse=True)
+
+    def print_summary(self):
+        print("\nWait times per step:")
+        for r in self.summary():
+            print(
+                f"  {r['step']:<12} {r['waits']:>5} waits  total {r['total_s']:>8.2f}s  "
+                f"mean {r['mean_s']:>6.3f}s  max {r['max_s']:>6.3f}s  timeouts {r['timeouts']}"
+            )
@@ -0,0 +1,121 @@
+# --------------------------------------------------------------
+# routing.py
+# Resource blocking + bandwidth accounting for browser contexts
+# --------------------------------------------------------------
+# - context.route("**/*") aborts resource types / URL patterns that
+#   extraction never needs (images, fonts, media, analytics)
+# - Counts requests per resource type (blocked / allowed) and bytes
+#   actually transferred, so the savings show up per run
+# - ROUTE_BYTE_BUDGET_MB: warn once when a run goes over budget
+# --------------------------------------------------------------
+
+import os
+import re
+import threading
+
+# ==================== CONFIGURATION ====================
+
+# Stylesheets are NOT blocked by default: visibility checks
+# (cookie banner, "Visa mer") depend on CSS.
+BLOCK_RESOURCE_TYPES = os.getenv("BLOCK_RESOURCE_TYPES", "image,font,media")
+
+BLOCK_URL_PATTERNS = os.getenv(
+    "BLOCK_URL_PATTERNS",
+    "google-analytics.com,googletagmanager.com,doubleclick.net,hotjar.com,"
+    "siteimprove.com,facebook.net,clarity.ms",
+)
+
+ROUTE_BYTE_BUDGET_MB = float(os.getenv("ROUTE_BYTE_BUDGET_MB", "0"))
+
+
+def split_csv(value):
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+# --------------------------------------------------------------
+class RequestRouter:
+    def __init__(self, block_types=None, block_patterns=None, byte_budget=0):
+        self.block_types = set(block_types if block_types is not None else split_csv(BLOCK_RESOURCE_TYPES))
+        patterns = block_patterns if block_patterns is not None else split_csv(BLOCK_URL_PATTERNS)
+        self.block_re = re.compile("|".join(re.escape(p) for p in patterns)) if patterns else None
+        self.byte_budget = byte_budget or int(ROUTE_BYTE_BUDGET_MB * 1024 * 1024)
+        self.counts = {}  # resource_type -> {"allowed", "blocked", "bytes"}
+        self._lock = threading.Lock()
+        self._over_budget = False
+
+    def _bucket(self, resource_type):
+        return self.counts.setdefault(resource_type, {"allowed": 0, "blocked": 0, "bytes": 0})
+
+    def should_block(self, request):
+        if request.resource_type in self.block_types:
+            return True
+        return bool(self.block_re and self.block_re.search(request.url))
+
+    def _count(self, request):
+        blocked = self.should_block(request)
+        with self._lock:
+            self._bucket(request.resource_type)["blocked" if blocked else "allowed"] += 1
+        return blocked
+
+    def _add_bytes(self, resource_type, sizes):
+        n = max(0, sizes.get("responseBodySize", 0)) + max(0, sizes.get("responseHeadersSize", 0))
+        with self._lock:
+            self._bucket(resource_type)["bytes"] += n
+            if self.byte_budget and not self._over_budget and self.total_bytes() > self.byte_budget:
+                self._over_budget = True
+                print(f"Bandwidth budget exceeded: {self.total_bytes() / 1e6:.1f} MB")
+
+    # --- sync contexts ---
+    def attach(self, context):
+        context.route("**/*", self._handle)
+        context.on("requestfinished", self._finished)
+        return context
+
+    def _handle(self, route):
+        if self._count(route.request):
+            route.abort()
+        else:
+            route.fallback()  # next handler (HAR replay) or the network
+
+    def _finished(self, request):
+        try:
+            self._add_bytes(request.resource_type, request.sizes())
+        except Exception:
+            pass
+
+    # --- async contexts (DetailPool) ---
+    async def attach_async(self, context):
+        await context.route("**/*", self._handle_async)
+        context.on("requestfinished", self._finished_async)
+        return context
+
+    async def _handle_async(self, route):
+        if self._count(route.request):
+            await route.abort()
+        else:
+            await route.fallback()
+
+    async def _finished_async(self, request):
+        try:
+            self._add_bytes(request.resource_type, await request.sizes())
+        except Exception:
+            pass
+
+    # --------------------------------------------------------------
+    def total_bytes(self):
+        return sum(c["bytes"] for c in self.counts.values())
+
+    def summary(self):
+        with self._lock:
+            return {t: dict(c) for t, c in sorted(self.counts.items())}
+
+    def print_summary(self):
+        summary = self.summary()
+        print("\nRequests per resource type:")
+        for resource_type, c in summary.items():
+            print(
+                f"  {resource_type:<12} allowed {c['allowed']:>6}  blocked {c['blocked']:>6}  "
+                f"{c['bytes'] / 1e6:>8.2f} MB"
+            )
+        allowed = sum(c["allowed"] for c in summary.values())
+        blocked = sum(c["blocked"] for c in summary.values())
+        print(f"  total        allowed {allowed:>6}  blocked {blocked:>6}  {self.total_bytes() / 1e6:>8.2f} MB")
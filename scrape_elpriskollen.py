@@ -3,357 +3,546 @@
 # FULLY WORKING – WITH FAST PRIS 5-YEAR DURATION FIX
 # --------------------------------------------------------------
 # Runs 1 ZIP → 3 consumptions → 5 contract types (15 total)
+# - ZIP_INDEXES=all → every county in one process (shared browser)
+# - Grid, k-of-n shards and a cost estimate from planner.py
+#   (--grid FILE, --zips, --consumptions, --contract-types, --shard k/n,
+#   --plan-only)
+# - Progress journaled to scrape_journal.jsonl; --resume skips done work
+# - INCREMENTAL=true → only revisit detail pages whose card changed
+# - ZIPs whose listing matches one already scraped reuse its records
 # - Special handling: FAST PRIS → clicks "5 years" before continue
+# - Detail pages fetched on a pool of async tabs (DETAIL_CONCURRENCY)
 # - Headless = OFF by default (for testing)
-# - Saves: combined_output.json + combined_output.xlsx
+# - Streams records to output_stream/ as they are scraped, then
+#   saves combined_output.json/.jsonl/.xlsx/.csv from those streams
+# - Appends every run to a Parquet history (HISTORY_DIR, "" = off)
+# - Per-stage spans → run_trace.json + run_metrics.prom (tracing.py)
+# - --record-har / --replay-har: record a session once, then rerun it
+#   offline from the archives (har.py); replay skips history + upload
+# - Provider contact data cached per supplier → providers.json/.csv
+# - Every goto / click goes through one adaptive rate limit (throttle.py)
+# - Pages recycled / rebuilt on crash, hang or memory cap and the
+#   pass retried (page_pool.py); a browser that dies is relaunched and
+#   the ZIPs it had in flight requeued
 # --------------------------------------------------------------
 
 from playwright.sync_api import sync_playwright
-import time
-import json
-import pandas as pd
 import re
 import os
 import sys
 import subprocess
+import queue
+import socket
+import threading
+
+from detail_pages import CONTEXT_OPTIONS, DetailPool, scrape_detail_page
+from readiness import Readiness, count_matches, evaluate
+from capture import CAPTURE_MODE, ResponseCapture, capture_name
+from routing import RequestRouter
+from navigator import HOMEPAGE, SITE_URL, ResultsNavigator
+from journal import Journal, merge_in_listing_order
+from fingerprints import INCREMENTAL, LISTING_DEDUP, FingerprintStore, ListingIndex, card_hash
+from output_stream import STREAM_DIR, StreamPart, export_streams, iter_records
+from tracing import TRACER, span
+from throttle import THROTTLE
+from page_pool import PagePool
+from har import RECORD_HAR, REPLAY_HAR, HarSession
+from providers import NORMALIZE_PROVIDERS, PROVIDERS_PATH, ProviderCache, normalize_record
+from planner import COUNTIES, CONSUMPTION_LEVELS, CONTRACT_TYPES, parse_zip_indexes
+import planner
+import history_store
 
 # ==================== CONFIGURATION ====================
 
-COUNTIES = [
-    {"county": "Stockholm län", "town": "Stockholm", "zip_code": "11121"},
-    {"county": "Uppsala län", "town": "Uppsala", "zip_code": "75310"},
-    {"county": "Södermanlands län", "town": "Nyköping", "zip_code": "61131"},
-    {"county": "Östergötlands län", "town": "Linköping", "zip_code": "58222"},
-    {"county": "Jönköpings län", "town": "Jönköping", "zip_code": "55315"},
-    {"county": "Kronobergs län", "town": "Växjö", "zip_code": "35222"},
-    {"county": "Kalmar län", "town": "Kalmar", "zip_code": "39231"},
-    {"county": "Gotlands län", "town": "Visby", "zip_code": "62157"},
-    {"county": "Blekinge län", "town": "Karlskrona", "zip_code": "37131"},
-    {"county": "Skåne län", "town": "Malmö", "zip_code": "21122"},
-    {"county": "Hallands län", "town": "Halmstad", "zip_code": "30243"},
-    {"county": "Västra Götalands län", "town": "Göteborg", "zip_code": "41103"},
-    {"county": "Värmlands län", "town": "Karlstad", "zip_code": "65224"},
-    {"county": "Örebro län", "town": "Örebro", "zip_code": "70210"},
-    {"county": "Västmanlands län", "town": "Västerås", "zip_code": "72211"},
-    {"county": "Dalarnas län", "town": "Falun", "zip_code": "79171"},
-    {"county": "Gävleborgs län", "town": "Gävle", "zip_code": "80320"},
-    {"county": "Västernorrlands län", "town": "Härnösand", "zip_code": "87131"},
-    {"county": "Jämtlands län", "town": "Östersund", "zip_code": "83131"},
-    {"county": "Västerbottens län", "town": "Umeå", "zip_code": "90327"},
-    {"county": "Norrbottens län", "town": "Luleå", "zip_code": "97231"},
-]
-
 # HEADLESS = OFF by default (you SEE the browser)
 HEADLESS_MODE = os.getenv("HEADLESS", "true").lower() == "true"
 
-# ZIP_INDEX: 0 to 20
-ZIP_INDEX = int(os.getenv("ZIP_INDEX", "0"))
+# Which ZIPs / passes: planner.py (ZIP_INDEX 0–20, ZIP_INDEXES "all" or "0,3,5-7", ...)
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "3"))
 
-if ZIP_INDEX >= len(COUNTIES):
-    print(f"Invalid ZIP_INDEX {ZIP_INDEX}. Must be 0–20.")
-    sys.exit(0)
+# Detail pages: DETAIL_CONCURRENCY async tabs (1 = old serial loop on the wizard page)
+DETAIL_CONCURRENCY = int(os.getenv("DETAIL_CONCURRENCY", "4"))
+DETAIL_MAX_IN_FLIGHT = int(os.getenv("DETAIL_MAX_IN_FLIGHT", str(DETAIL_CONCURRENCY)))
+DETAIL_CONTEXTS = int(os.getenv("DETAIL_CONTEXTS", "1"))
 
-SELECTED_ZIP = COUNTIES[ZIP_INDEX]
+# Wizard browser relaunches when it dies mid-run (its ZIPs are requeued)
+BROWSER_RELAUNCHES = int(os.getenv("BROWSER_RELAUNCHES", "2"))
 
-# --------------------------------------------------------------
-def save_combined_output(all_data):
-    # JSON
-    with open("combined_output.json", "w", encoding="utf-8") as f:
-        json.dump(all_data, f, indent=2, ensure_ascii=False)
-
-    # Excel (flatten price_breakdown)
-    flat = []
-    for item in all_data:
-        row = item.copy()
-        pb = row.pop("price_breakdown", {})
-        for k, v in pb.items():
-            col = f"price_{k.replace(' ', '_').replace('/', '_')}"
-            row[col] = v
-        es = row.pop("energy_sources", [])
-        row["energy_sources"] = "; ".join(es) if es else ""
-        flat.append(row)
-
-    df = pd.DataFrame(flat)
-    df.to_excel("combined_output.xlsx", index=False, engine="openpyxl")
-    print(f"Saved {len(all_data)} records → JSON + Excel")
+CARD_SELECTOR = "div.pLyFbiEj6YnPeSF9DI94"
+CARD_LINK_SELECTOR = "div.aVZNlNTkwbkNs_DcrCqg > a.env-button"
+SHOW_MORE_BUTTON = "button.env-button"
+SHOW_MORE_TEXTS = ["Visa mer", "Show more"]
 
-# --------------------------------------------------------------
-def scrape_for_zip(page, zip_info):
-    zip_code = zip_info["zip_code"]
-    county = zip_info["county"]
-    town = zip_info["town"]
+# Jump straight to learned result URLs (wizard only as fallback)
+DEEP_LINKS = os.getenv("DEEP_LINKS", "true").lower() == "true"
 
-    CONSUMPTION_LEVELS = ["2000", "5000", "20000"]
-    CONTRACT_TYPES = [
-        "KVARTSPRIS",
-        "TIMPRIS",
-        "RÖRLIGT PRIS (MÅNADSBASERAT)",
-        "MIXAT PRIS 1 ÅR",
-        "FAST PRIS"
-    ]
+# --------------------------------------------------------------
+def save_combined_output(all_data):
+    # Same files as a streamed run: JSON, JSONL, Excel, CSV
+    with StreamPart(STREAM_DIR, "combined") as part:
+        for record in all_data:
+            part.write(record)
+    total = export_streams(STREAM_DIR, ["combined"])
+    print(f"Saved {total} records → JSON + Excel")
 
-    all_results = []
 
-    for consumption in CONSUMPTION_LEVELS:
-        for idx, contract_name in enumerate(CONTRACT_TYPES, start=1):
-            print(f"\nScraping: {town} ({zip_code}) | {consumption} kWh | {contract_name}")
+def stream_name(index, zip_info=None):
+    zip_info = zip_info or COUNTIES[index]
+    return f"zip_{index:02d}_{zip_info['zip_code']}"
 
-            # --- 1. Go to homepage ---
-            page.goto("https://elpriskollen.se/", timeout=60000)
-            time.sleep(3)
+# --------------------------------------------------------------
+def run_wizard(page, labels, idx, ready, navigator):
+    """Homepage → ZIP → consumption → contract type → Fortsätt.
+    Returns False if a step failed and the pass should be skipped."""
+    # --- 1. Go to homepage ---
+    with span("homepage", labels):
+        THROTTLE.goto(page, HOMEPAGE, timeout=60000)
+        ready.selector(page, "homepage", "#pcode")
+
+    # --- 2. Cookie banner (once per context) ---
+    with span("cookie", labels):
+        navigator.accept_cookies(page, ready)
+
+    # --- 3. Enter ZIP ---
+    with span("zip_entry", labels):
+        page.fill("#pcode", labels["zip_code"])
+        THROTTLE.click(page, "#next-page")
+        if not ready.selector(page, "zip", "#annual_consumption"):
+            print(f"Consumption step did not appear for {labels['zip_code']}")
+            return False
+
+    # --- 4. Enter consumption ---
+    with span("consumption", labels):
+        page.fill("#annual_consumption", labels["consumption"])
+        THROTTLE.click(page, "#next-page")
+
+    # --- 5. Select contract type ---
+    contract_selector = f".contractTypeButtons > a.selectButton:nth-child({idx})"
+    with span("contract_select", labels):
+        try:
+            page.wait_for_selector(contract_selector, timeout=ready.deadlines["consumption"])
+            THROTTLE.click(page, contract_selector)
+        except Exception as e:
+            print(f"Failed to click {labels['contract_type']}: {e}")
+            return False
 
-            # --- 2. Cookie banner ---
+    # --- 6. FAST PRIS: Select 5-year duration ---
+    if labels["contract_type"] == "FAST PRIS":
+        print("  → FAST PRIS: selecting 5-year duration")
+        with span("duration", labels):
             try:
-                cookie_btn = page.get_by_role("button", name="Godkänn alla kakor")
-                cookie_btn.wait_for(state="visible", timeout=10000)
-                cookie_btn.click()
-                page.wait_for_timeout(1000)
-            except Exception:
-                pass
-
-            # --- 3. Enter ZIP ---
-            page.fill("#pcode", zip_code)
-            page.click("#next-page")
-            page.wait_for_timeout(2000)
-
-            # --- 4. Enter consumption ---
-            page.fill("#annual_consumption", consumption)
-            page.click("#next-page")
-            page.wait_for_timeout(2000)
-
-            # --- 5. Select contract type ---
-            contract_selector = f".contractTypeButtons > a.selectButton:nth-child({idx})"
-            try:
-                page.wait_for_selector(contract_selector, timeout=10000)
-                page.click(contract_selector)
-                page.wait_for_timeout(1500)
+                duration_btn = page.locator(
+                    "#app > div > div.guide__preamble > div.env-form-element > "
+                    "div.fastaDesktop > div.contractTypeFastChild > div:nth-child(6) > a"
+                )
+                duration_btn.wait_for(state="visible", timeout=ready.deadlines["duration"])
+                THROTTLE.click(duration_btn)
             except Exception as e:
-                print(f"Failed to click {contract_name}: {e}")
-                continue
+                print(f"  Could not select 5-year duration: {e}")
 
-            # --- 6. FAST PRIS: Select 5-year duration ---
-            if contract_name == "FAST PRIS":
-                print("  → FAST PRIS: selecting 5-year duration")
-                try:
-                    duration_btn = page.locator(
-                        "#app > div > div.guide__preamble > div.env-form-element > "
-                        "div.fastaDesktop > div.contractTypeFastChild > div:nth-child(6) > a"
-                    )
-                    duration_btn.wait_for(state="visible", timeout=10000)
-                    duration_btn.click()
-                    page.wait_for_timeout(1000)
-                except Exception as e:
-                    print(f"  Could not select 5-year duration: {e}")
+    # --- 7. Click "Fortsätt" ---
+    with span("continue", labels):
+        try:
+            continue_btn = page.locator("#app > div > div.epk-button > a.env-button")
+            continue_btn.wait_for(state="visible", timeout=ready.deadlines["continue"])
+            THROTTLE.click(continue_btn)
+            ready.network_idle(page, "results")
+            ready.count_settled(page, "results", CARD_SELECTOR)
+        except Exception as e:
+            print(f"Failed to click Fortsätt: {e}")
+            return False
 
-            page.wait_for_timeout(1000)
+    return True
 
-            # --- 7. Click "Fortsätt" ---
-            try:
-                continue_btn = page.locator("#app > div > div.epk-button > a.env-button")
-                continue_btn.wait_for(state="visible", timeout=10000)
-                continue_btn.click()
-                page.wait_for_timeout(3000)
-                time.sleep(15)  # Wait for results
-            except Exception as e:
-                print(f"Failed to click Fortsätt: {e}")
-                continue
+# --------------------------------------------------------------
+def fetch_details(page, items, labels, detail_pool=None, ready=None, on_record=None, providers=None):
+    """Detail records for `items`, in order. Failed pages are skipped."""
+    if detail_pool is not None:
+        return detail_pool.fetch(items, labels, on_record)
 
-            # --- 8. "Visa mer" loop ---
-            while True:
-                try:
-                    show_more = page.locator(
-                        "button.env-button:has-text('Visa mer'), "
-                        "button.env-button:has-text('Show more')"
-                    ).first
-                    if show_more.is_visible(timeout=3000):
-                        page.evaluate("window.scrollTo(0, document.body.scrollHeight * 0.9)")
-                        page.wait_for_timeout(500)
-                        show_more.scroll_into_view_if_needed()
-                        show_more.click()
-                        page.wait_for_timeout(2000)
-                    else:
-                        break
-                except Exception:
-                    break
+    records = []
+    for item in items:
+        try:
+            record = scrape_detail_page(page, item, labels, ready=ready, providers=providers)
+            records.append(record)
+            if on_record is not None:
+                on_record(record)
+            print(f"  Scraped: {record['contract_name']}")
+        except Exception as e:
+            print(f"  Error on detail page {item['url']}: {e}")
+            continue
+    return records
 
-            # --- 9. Collect profile cards ---
-            profile_cards = page.locator("div.pLyFbiEj6YnPeSF9DI94").all()
-            urls_and_durations = []
+# --------------------------------------------------------------
+CARDS_JS = """
+([cardSel, linkSel]) => [...document.querySelectorAll(cardSel)].map(card => {
+    const link = card.querySelector(linkSel);
+    return {text: card.innerText, href: link ? link.getAttribute("href") : null};
+})
+"""
+
+
+def collect_cards(page):
+    """Listing items (url, contract_duration, card_hash) from every card,
+    read in a single evaluate() instead of two locator calls per card."""
+    items = []
+    for card in evaluate(page, CARDS_JS, [CARD_SELECTOR, CARD_LINK_SELECTOR]):
+        href = (card["href"] or "").strip()
+        if not href:
+            continue
+        duration = re.search(r'(\d+\s*(?:år|månader))', card["text"])
+        items.append({
+            "url": SITE_URL + href,
+            "contract_duration": duration.group(1) if duration else None,
+            "card_hash": card_hash(card["text"], href),
+        })
+    return items
 
-            for card in profile_cards:
-                try:
-                    text = card.inner_text()
-                    duration = re.search(r'(\d+\s*(?:år|månader))', text)
-                    duration = duration.group(1) if duration else None
-
-                    link = card.locator("div.aVZNlNTkwbkNs_DcrCqg > a.env-button")
-                    href = link.get_attribute("href")
-                    if href:
-                        full_url = "https://elpriskollen.se" + href.strip()
-                        urls_and_durations.append({"url": full_url, "contract_duration": duration})
-                except Exception:
-                    continue
+# --------------------------------------------------------------
+def scrape_for_zip(page, zip_info, **kwargs):
+    return list(iter_zip_records(page, zip_info, **kwargs))
 
-            print(f"  Found {len(urls_and_durations)} contracts")
 
-            # --- 10. Scrape each detail page ---
-            for item in urls_and_durations:
-                url = item["url"]
-                contract_duration = item["contract_duration"]
-                try:
-                    page.goto(url, timeout=60000)
-                    page.wait_for_timeout(2500)
-
-                    # Header
-                    contract_type = electrical_area = None
-                    try:
-                        headers = page.locator(
-                            "div.SvveEH5y1QdtM2MuMz07 div.e3icZ8YXD7PTtS8321U3 "
-                            "div.AOqumsb2RS0O78r9kzMX"
-                        ).all()
-                        contract_type = headers[0].inner_text().strip() if len(headers) > 0 else None
-                        electrical_area = headers[1].inner_text().strip() if len(headers) > 1 else None
-                    except Exception:
-                        pass
-
-                    contract_name = page.locator("div.SvveEH5y1QdtM2MuMz07 h1").inner_text().strip()
-                    provider_name = page.locator("div.AWGCPcYaBUXjAUTBLl0c h3").inner_text().strip()
-                    jämförpris_block = page.locator("div.gdeuxYpfTrq6O5EdKun6 h2").first.inner_text().strip()
-                    consumption_info = page.locator("div.gdeuxYpfTrq6O5EdKun6 p").first.inner_text().strip()
-
-                    # Price table
-                    price_breakdown = {}
-                    try:
-                        rows = page.locator("table.env-table.env-table--zebra tbody tr").all()
-                        for r in rows:
-                            cells = r.locator("td").all()
-                            if len(cells) >= 2:
-                                k = cells[0].inner_text().strip()
-                                v = cells[1].inner_text().strip()
-                                price_breakdown[k] = v
-                    except Exception:
-                        pass
-
-                    # Contact
-                    provider_phone = None
-                    try:
-                        provider_phone = page.locator(
-                            "div.AWGCPcYaBUXjAUTBLl0c h4:has-text('Telefon') + a"
-                        ).inner_text().strip()
-                    except Exception:
-                        pass
-
-                    provider_email = None
-                    try:
-                        mail_href = page.locator(
-                            "div.AWGCPcYaBUXjAUTBLl0c h4:has-text('E-post') + a"
-                        ).get_attribute("href")
-                        if mail_href and mail_href.startswith("mailto:"):
-                            provider_email = mail_href[7:].strip()
-                    except Exception:
-                        pass
-
-                    # Links
-                    change_link = terms_link = website_link = None
-                    try:
-                        links = page.locator("div.Tgc321GpCPUvHqOKChsl a[target='_blank']").all()
-                        change_link = links[0].get_attribute("href") if len(links) > 0 else None
-                        terms_link = links[1].get_attribute("href") if len(links) > 1 else None
-                        website_link = links[2].get_attribute("href") if len(links) > 2 else None
-                    except Exception:
-                        pass
-
-                    # Energy sources
-                    energy_sources = []
-                    try:
-                        body_text = page.inner_text("body").lower()
-                        for kw in ["förnybar", "vatten", "vind", "solkraft", "kärnkraft", "fossilt", "residualmix"]:
-                            if kw in body_text:
-                                energy_sources.append(kw.capitalize())
-                        energy_sources = list(set(energy_sources))
-                    except Exception:
-                        pass
-
-                    # Text fields
-                    notice_period = billing = payment = expiry = None
-                    try:
-                        txt = page.inner_text("body").lower()
-                        m = re.search(r'uppsägningstid[:\s]*([^\n\.]+)', txt)
-                        if m:
-                            notice_period = m.group(1).strip()
-                        if "fakturering" in txt and "månadsvis" in txt:
-                            billing = "Månadsvis i efterskott"
-                        if any(w in txt for w in ["betalning", "autogiro", "swish"]):
-                            payment = "Autogiro, Swish, Faktura"
-                        if "tillsvidare" in txt or "förlängs automatiskt" in txt:
-                            expiry = "Övergår till tillsvidare avtal vid utgång"
-                    except Exception:
-                        pass
-
-                    # Save record
-                    record = {
-                        "scraped_zip_code": zip_code,
-                        "scraped_county": county,
-                        "scraped_town": town,
-                        "scraped_consumption_kwh": consumption,
-                        "selected_contract_type": contract_name,
-                        "url": url,
-                        "title": page.title(),
-                        "contract_duration": contract_duration,
-                        "contract_type": contract_type,
-                        "electrical_area": electrical_area,
-                        "contract_name": contract_name,
-                        "provider_name": provider_name,
-                        "consumption_info": consumption_info,
-                        "jämförpris": jämförpris_block,
-                        "energy_sources": energy_sources,
-                        "price_breakdown": price_breakdown,
-                        "notice_period": notice_period,
-                        "billing_options": billing,
-                        "payment_options": payment,
-                        "expiry_info": expiry,
-                        "change_contract_link": change_link,
-                        "terms_link": terms_link,
-                        "supplier_website": website_link,
-                        "provider_phone": provider_phone,
-                        "provider_email": provider_email,
-                    }
-                    all_results.append(record)
-                    print(f"  Scraped: {contract_name}")
+def iter_zip_records(page, zip_info, detail_pool=None, ready=None, capture=None, navigator=None,
+                     journal=None, fingerprints=None, providers=None, listings=None, passes=None):
+    """Yields records as each (consumption, contract type) pass finishes.
+    `passes`: [(consumption, contract type), ...] from the plan; default all 15."""
+    zip_code = zip_info["zip_code"]
+    county = zip_info["county"]
+    town = zip_info["town"]
 
+    if passes is None:
+        passes = [(c, t) for c in CONSUMPTION_LEVELS for t in CONTRACT_TYPES]
+
+    ready = ready or Readiness()
+    navigator = navigator or ResultsNavigator(enabled=DEEP_LINKS)
+
+    for consumption, contract_name in passes:
+        idx = CONTRACT_TYPES.index(contract_name) + 1  # button position
+        print(f"\nScraping: {town} ({zip_code}) | {consumption} kWh | {contract_name}")
+        labels = {
+            "zip_code": zip_code,
+            "county": county,
+            "town": town,
+            "consumption": consumption,
+            "contract_type": contract_name,
+        }
+        if journal is not None and journal.task_done(labels):
+            records = journal.task_records(labels)
+            yield from records
+            print(f"  Already done (journal): {len(records)} records")
+            continue
+        if capture is not None:
+            capture.clear()
+
+        # --- 1-7. Result view: deep link, or the wizard as fallback ---
+        def open_results():
+            with span("results_view", labels):
+                return navigator.open_results(
+                    page, labels, ready,
+                    lambda p: run_wizard(p, labels, idx, ready, navigator),
+                    CARD_SELECTOR,
+                )
+
+        if not open_results():
+            continue
+
+        # --- 7b. Capture mode: records straight from the listing JSON ---
+        if capture is not None:
+            results_url = page.url
+            with span("capture", labels):
+                ready.network_idle(page, "capture")  # listing XHRs may outlive the first cards
+                capture.dump(capture_name(labels))
+                records = capture.records(page, labels, rendered=count_matches(page, CARD_SELECTOR))
+            if records is not None:
+                if journal is not None:
+                    for record in records:
+                        journal.record_detail(labels, record)
+                    journal.record_task(labels, records)
+                print(f"  Finished (capture): {consumption} kWh – {contract_name}, {len(records)} records")
+                yield from records
+                continue
+            print("  capture: falling back to DOM")
+            if page.url != results_url and not open_results():  # learning the detail endpoint left the view
+                continue
+
+        # --- 8. "Visa mer" until the listing is complete (one in-page loop) ---
+        with span("visa_mer", labels) as attrs:
+            THROTTLE.acquire("click")
+            attrs["clicks"], attrs["cards"] = ready.exhaust_pagination(
+                page, "show_more", SHOW_MORE_BUTTON, SHOW_MORE_TEXTS, CARD_SELECTOR,
+                min_gap_ms=THROTTLE.min_gap_ms(),
+            )
+            THROTTLE.charge("click", attrs["clicks"] - 1)
+
+        # --- 9. Collect profile cards (one snapshot of the final DOM) ---
+        with span("card_collection", labels) as attrs:
+            urls_and_durations = collect_cards(page)
+            attrs["cards"] = len(urls_and_durations)
+
+        print(f"  Found {len(urls_and_durations)} contracts")
+
+        # --- 9b. Same listing as a ZIP already scraped → its records, retagged ---
+        reused = listings.lookup(labels, urls_and_durations) if listings is not None else None
+        if reused is not None:
+            if journal is not None:
+                for record in reused:
+                    journal.record_detail(labels, record)
+                journal.record_task(labels, reused)
+            if fingerprints is not None:
+                fingerprints.update(labels, urls_and_durations, reused)
+            print(f"  Finished (listing reuse): {consumption} kWh – {contract_name}")
+            yield from reused
+            continue
+
+        # --- 10. Scrape each detail page (skipping journaled / unchanged ones) ---
+        cached = journal.cached_details(labels) if journal is not None else {}
+        todo = [item for item in urls_and_durations if item["url"] not in cached]
+        if cached:
+            print(f"  {len(urls_and_durations) - len(todo)} detail pages already in journal")
+        if fingerprints is not None:
+            carried = fingerprints.unchanged(labels, todo)
+            todo = [item for item in todo if item["url"] not in carried]
+            print(f"  {len(carried)} unchanged cards carried forward, {len(todo)} to fetch")
+            for record in carried.values():
+                if journal is not None:
+                    journal.record_detail(labels, record)
+            cached.update(carried)
+        on_record = (lambda r: journal.record_detail(labels, r)) if journal is not None else None
+        with span("details", labels, pages=len(todo)):
+            fresh = fetch_details(page, todo, labels, detail_pool, ready, on_record, providers)
+        records = merge_in_listing_order(urls_and_durations, cached, fresh)
+        if journal is not None:
+            journal.record_task(labels, records)
+        if fingerprints is not None:
+            fingerprints.update(labels, urls_and_durations, records)
+        if listings is not None:
+            listings.add(labels, urls_and_durations, records)
+
+        print(f"  Finished: {consumption} kWh – {contract_name}")
+        yield from records
+
+# --------------------------------------------------------------
+# Multi-ZIP scheduler: one Chromium, one isolated context per ZIP,
+# SCHEDULER_WORKERS ZIPs in flight. Worker threads each drive the
+# shared browser over CDP (sync Playwright objects are per thread).
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def scrape_zip_in_context(browser, job, router, shared, har=None, pages=None):
+    """Streams one ZIP's records to its own part; returns the record count.
+    `job` is a planner job (index, zip_info, passes); `shared` holds the
+    run-wide iter_zip_records kwargs (ready, detail_pool, ...). Each pass
+    runs on a PageSlot of `pages` and is retried there if the page breaks."""
+    har = har or HarSession()
+    pages = pages or PagePool()
+    index, zip_info = job["index"], job["zip_info"]
+    name = stream_name(index, zip_info)
+    providers = shared.get("providers")
+    navigator = ResultsNavigator(enabled=DEEP_LINKS)
+    capture = {}
+
+    def setup(context_name):
+        context = browser.new_context(**CONTEXT_OPTIONS, **har.context_options(context_name))
+        har.attach(context)
+        router.attach(context)
+        THROTTLE.attach(context)
+        return context
+
+    def on_open(page):
+        navigator.consent_done = False  # new context, new cookie jar
+        capture["page"] = ResponseCapture(page) if CAPTURE_MODE else None
+
+    slot = pages.slot(browser, name, setup, on_open)
+    try:
+        with span("zip", zip=zip_info["zip_code"]), StreamPart(STREAM_DIR, name) as part:
+            for consumption, contract_type in job["passes"]:
+                label = f"{zip_info['zip_code']} {consumption} kWh {contract_type}"
+                try:
+                    records = pages.run_pass(slot, lambda page: list(iter_zip_records(
+                        page, zip_info, capture=capture["page"], navigator=navigator,
+                        passes=[(consumption, contract_type)], **shared,
+                    )), label)
                 except Exception as e:
-                    print(f"  Error on detail page {url}: {e}")
+                    if not browser.is_connected():
+                        raise  # the ZIP is requeued on a relaunched browser
+                    print(f"  Pass failed after {pages.retries} retries: {label}: {e}")
                     continue
+                for record in records:
+                    if providers is not None:
+                        providers.add_records((record,))  # journaled / carried / captured ones too
+                    part.write(normalize_record(record) if NORMALIZE_PROVIDERS else record)
+        return part.count
+    finally:
+        navigator.print_summary()
+        slot.close()
+
+
+def drain_jobs(browser, jobs, router, shared, har, pages):
+    """Scrapes queued jobs until the queue is empty (True) or `browser`
+    is gone (False); the job that was running then is put back."""
+    while True:
+        try:
+            job = jobs.get_nowait()
+        except queue.Empty:
+            return True
+        try:
+            scrape_zip_in_context(browser, job, router, shared, har, pages)
+        except Exception as e:
+            if not browser.is_connected():
+                print(f"Browser lost on {job['zip_info']['zip_code']} ({e}), requeued")
+                jobs.put(job)
+                return False
+            print(f"CRITICAL ERROR on {job['zip_info']['zip_code']}: {e}")
 
-            print(f"  Finished: {consumption} kWh – {contract_name}")
 
-    return all_results
+def scheduler_worker(cdp_url, jobs, router, shared, har, pages):
+    with sync_playwright() as p:
+        try:
+            browser = p.chromium.connect_over_cdp(cdp_url)
+        except Exception as e:
+            print(f"Worker could not connect to the browser: {e}")
+            return
+        drain_jobs(browser, jobs, router, shared, har, pages)
 
 # --------------------------------------------------------------
 def run():
-    all_data = []
+    plan = planner.make_plan()
+    planner.print_plan(plan, SCHEDULER_WORKERS)
+    if plan["plan_only"]:
+        return
+    jobs_planned = plan["jobs"]
+    if not jobs_planned:
+        print("Nothing to do in this shard")
+        return
+    workers = max(1, min(SCHEDULER_WORKERS, len(jobs_planned)))
+    ready = Readiness()
+    router = RequestRouter()
+    journal = Journal()
+    fingerprints = FingerprintStore() if INCREMENTAL else None
+    har = HarSession(RECORD_HAR, REPLAY_HAR)
+    if har.replay_dir:
+        THROTTLE.disable("HAR replay")  # answered from the archives, nothing to be polite to
+    providers = ProviderCache()
+    listings = ListingIndex() if LISTING_DEDUP else None
+    pages = PagePool()
 
     with sync_playwright() as p:
-        print(f"Launching browser (headless={HEADLESS_MODE})...")
-        browser = p.chromium.launch(headless=HEADLESS_MODE)
-        context = browser.new_context(
-            viewport={"width": 1920, "height": 1080},
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        )
-        page = context.new_page()
+        print(f"Launching browser (headless={HEADLESS_MODE}, {len(jobs_planned)} ZIPs, {workers} workers)...")
+
+        def launch():
+            cdp_port = free_port() if workers > 1 else None
+            browser = p.chromium.launch(
+                headless=HEADLESS_MODE,
+                args=[f"--remote-debugging-port={cdp_port}"] if cdp_port else [],
+            )
+            return browser, f"http://127.0.0.1:{cdp_port}"
+
+        browser, cdp_url = launch()
 
+        detail_pool = None
         try:
-            results = scrape_for_zip(page, SELECTED_ZIP)
-            all_data.extend(results)
-        except Exception as e:
-            print(f"CRITICAL ERROR: {e}")
+            if DETAIL_CONCURRENCY > 1:
+                print(f"Starting detail pool ({DETAIL_CONCURRENCY} tabs, max {DETAIL_MAX_IN_FLIGHT} in flight)...")
+                detail_pool = DetailPool(
+                    pool_size=DETAIL_CONCURRENCY,
+                    max_in_flight=DETAIL_MAX_IN_FLIGHT,
+                    contexts=DETAIL_CONTEXTS,
+                    headless=HEADLESS_MODE,
+                    ready=ready,
+                    router=router,
+                    har=har,
+                    providers=providers,
+                    pages=pages,
+                ).start()
+
+            shared = {
+                "ready": ready,
+                "detail_pool": detail_pool,
+                "journal": journal,
+                "fingerprints": fingerprints,
+                "providers": providers,
+                "listings": listings,
+            }
+            jobs = queue.Queue()
+            for job in jobs_planned:
+                jobs.put(job)
+            relaunches = 0
+            while True:
+                if workers == 1:
+                    drain_jobs(browser, jobs, router, shared, har, pages)
+                else:
+                    threads = [
+                        threading.Thread(
+                            target=scheduler_worker,
+                            args=(cdp_url, jobs, router, shared, har, pages),
+                        )
+                        for _ in range(workers)
+                    ]
+                    for t in threads:
+                        t.start()
+                    for t in threads:
+                        t.join()
+                if jobs.empty():
+                    break
+                if relaunches == BROWSER_RELAUNCHES:
+                    print(f"CRITICAL ERROR: browser lost {relaunches + 1} times, {jobs.qsize()} ZIPs not scraped")
+                    break
+                relaunches += 1
+                pages.count("browser")
+                print(f"Relaunching browser for {jobs.qsize()} remaining ZIPs ({relaunches}/{BROWSER_RELAUNCHES})...")
+                try:
+                    browser.close()
+                except Exception:
+                    pass  # already gone
+                browser, cdp_url = launch()
         finally:
+            if detail_pool is not None:
+                detail_pool.close()
             browser.close()
-
-    save_combined_output(all_data)
-    print(f"\nALL DONE! Total records: {len(all_data)}")
+            journal.close()
+
+    ready.print_summary()
+    router.print_summary()
+    TRACER.print_summary()
+    har.print_summary()
+    THROTTLE.print_summary()
+    pages.print_summary()
+    providers.print_summary()
+    if listings is not None:
+        listings.print_summary()
+    if fingerprints is not None:
+        fingerprints.save()
+        fingerprints.print_summary()
+    # Same order as running each ZIP on its own and concatenating
+    names = [stream_name(job["index"], job["zip_info"]) for job in jobs_planned]
+    total = export_streams(STREAM_DIR, names)
+    print(f"Saved {total} records → JSON + Excel")
+    print(f"Saved {providers.save()} providers → {PROVIDERS_PATH}.json/.csv")
+    if har.replay_dir:
+        print("HAR replay: history and Google Sheets upload skipped")
+    elif history_store.HISTORY_DIR:
+        rows = history_store.append_run(iter_records(STREAM_DIR, names))
+        print(f"Appended {rows} rows to history → {history_store.HISTORY_DIR}/")
+    if not har.replay_dir:
+        print(f"Task durations of {planner.update_stats(TRACER)} tasks → {planner.TASK_STATS_PATH}")
+    TRACER.save_trace()
+    TRACER.save_metrics(extra={
+        "records_total": total,
+        "zips_total": len(jobs_planned),
+        "listing_pages_saved_total": listings.pages_saved if listings is not None else 0,
+        **THROTTLE.metrics(),
+        **pages.metrics(),
+    })
+    print(f"\nALL DONE! Total records: {total}")
 
     # Upload to Google Sheets
+    if har.replay_dir:
+        return
     try:
         subprocess.run([sys.executable, "upload_to_sheets.py"], check=True)
         print("Google Sheets upload triggered")
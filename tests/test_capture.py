@@ -0,0 +1,162 @@
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from standin_site import StandinSite, serve
+
+import capture
+import navigator
+from capture import ResponseCapture
+from throttle import THROTTLE
+
+LABELS = {"zip_code": "11121", "county": "Stockholm", "town": "Stockholm", "consumption": "5000",
+          "contract_type": "TIMPRIS"}
+LISTING = "/api/avtalslista?postnummer=11121&forbrukning=5000&avtalstyp=2"
+
+
+@pytest.fixture(scope="module")
+def standin():
+    """(site, base_url) of a stand-in running for this module's tests."""
+    site = StandinSite(contracts=25, page_size=10)
+    server, base_url = serve(site)
+    yield site, base_url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def site_url(standin, monkeypatch):
+    """Points the scraper modules at the stand-in. They read SITE_URL at
+    import time, so their module-level copies are patched as well."""
+    site, base_url = standin
+    monkeypatch.setenv("SITE_URL", base_url)
+    monkeypatch.setattr(navigator, "SITE_URL", base_url)
+    monkeypatch.setattr(navigator, "HOMEPAGE", base_url + "/")
+    monkeypatch.setattr(capture, "CAPTURE_HOST", base_url.split("://", 1)[1])
+    monkeypatch.setattr(capture, "SITE_ROOT", base_url)
+    monkeypatch.setattr(THROTTLE, "enabled", False)
+    site.hits.clear()
+    return base_url
+
+
+class Reply:
+    def __init__(self, status, body):
+        self.status = status
+        self.ok = 200 <= status < 300
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class HttpRequest:
+    """context.request stand-in: plain GETs against the stand-in site."""
+
+    def get(self, url, timeout=None):
+        try:
+            with urllib.request.urlopen(url) as r:
+                return Reply(r.status, json.load(r))
+        except urllib.error.HTTPError as e:
+            return Reply(e.code, None)
+
+
+class Page:
+    def __init__(self):
+        self.context = type("Context", (), {"request": HttpRequest()})()
+
+    def on(self, event, handler):
+        pass
+
+    def goto(self, url, **kwargs):
+        pass  # a detail page that makes no JSON request
+
+    def wait_for_load_state(self, state=None, **kwargs):
+        pass
+
+
+def captured(base_url, path):
+    """ResponseCapture holding the stand-in's answer to `path`, as if the
+    results page had fetched it."""
+    page = Page()
+    cap = ResponseCapture(page)
+    url = base_url + path
+    cap.payloads.append({"url": url, "method": "GET", "status": 200, "body": HttpRequest().get(url).json()})
+    cap.detail_template = base_url + "/api/avtalsdetalj/{id}?forbrukning=5000"
+    return cap, page
+
+
+def test_capture_follows_listing_pages(standin, site_url):
+    site, _ = standin
+    cap, page = captured(site_url, LISTING + "&offset=0&limit=10")
+    records = cap.records(page, LABELS, rendered=10)
+    assert len(records) == 25
+    assert len({r["url"] for r in records}) == 25
+    assert site.hits["api"] == 3  # first page + two followed
+    assert all(r["price_breakdown"] for r in records)
+
+
+def test_capture_falls_back_when_paging_cannot_be_followed(site_url):
+    cap, page = captured(site_url, LISTING + "&limit=10")  # no offset parameter to advance
+    assert cap.records(page, LABELS, rendered=10) is None
+
+
+def test_capture_falls_back_below_rendered_cards(site_url):
+    cap, page = captured(site_url, LISTING + "&offset=0&limit=25")
+    assert cap.records(page, LABELS, rendered=30) is None
+
+
+def test_capture_falls_back_when_a_detail_fails(standin, site_url):
+    site, _ = standin
+    cap, page = captured(site_url, LISTING + "&offset=0&limit=25")
+    cap.detail_template = site_url + "/api/saknas/{id}"  # 404 for every contract
+    assert cap.records(page, LABELS, rendered=10) is None
+    assert site.hits["other"] == 1  # gave up on the first failure
+
+
+def test_capture_falls_back_when_detail_endpoint_is_not_learned(site_url):
+    cap, page = captured(site_url, LISTING + "&offset=0&limit=25")
+    cap.detail_template = None
+    assert cap.records(page, LABELS, rendered=10) is None
+
+# --------------------------------------------------------------
+# End to end: wizard + capture against the stand-in (needs Chromium)
+
+@pytest.fixture(scope="module")
+def browser():
+    sync_api = pytest.importorskip("playwright.sync_api")
+    with sync_api.sync_playwright() as p:
+        try:
+            browser = p.chromium.launch()
+        except Exception as e:
+            pytest.skip(f"Chromium not available: {e}")
+        yield browser
+        browser.close()
+
+
+def test_capture_mode_scrape_against_standin(browser, standin, site_url, monkeypatch):
+    import scrape_elpriskollen as scraper
+    from navigator import ResultsNavigator
+    from readiness import Readiness
+
+    site, _ = standin
+    monkeypatch.setattr(scraper, "SITE_URL", site_url)
+    monkeypatch.setattr(scraper, "HOMEPAGE", site_url + "/")
+    context = browser.new_context(**scraper.CONTEXT_OPTIONS)
+    page = context.new_page()
+    try:
+        records = scraper.scrape_for_zip(
+            page, {"zip_code": "11121", "county": "Stockholm", "town": "Stockholm"},
+            passes=[("5000", "TIMPRIS")], ready=Readiness(), capture=ResponseCapture(page),
+            navigator=ResultsNavigator(enabled=False),
+        )
+    finally:
+        context.close()
+    assert len(records) == site.contracts
+    assert site.hits.get("detail") == 1  # one visit to learn the detail endpoint, the rest replayed
+    assert {r["scraped_zip_code"] for r in records} == {"11121"}
@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from detail_pages import make_record, parse_snapshot
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_snapshot(name="detail_snapshot.json"):
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_parse_snapshot_fields():
+    fields = parse_snapshot(load_snapshot())
+    assert fields == {
+        "title": "Fast pris 3 år – Norrsken Energi | Elpriskollen",
+        "contract_type": "Fast pris",
+        "electrical_area": "Elområde SE3",
+        "contract_name": "Fast pris 3 år",
+        "provider_name": "Norrsken Energi",
+        "consumption_info": "Vid en förbrukning på 5 000 kWh/år",
+        "jämförpris": "128,45 öre/kWh",
+        "price_breakdown": {"Elpris": "104,20 öre/kWh", "Påslag": "4,90 öre/kWh", "Fast avgift": "39 kr/mån"},
+        "energy_sources": ["Vatten", "Vind"],
+        "notice_period": "1 månad",
+        "billing_options": "Månadsvis i efterskott",
+        "payment_options": "Autogiro, Swish, Faktura",
+        "expiry_info": "Övergår till tillsvidare avtal vid utgång",
+        "change_contract_link": "https://norrsken.example/byt",
+        "terms_link": "https://norrsken.example/villkor.pdf",
+        "supplier_website": "https://www.norrsken.example/",
+        "provider_phone": "010-123 45 67",
+        "provider_email": "kundservice@norrsken.example",
+    }
+
+
+def test_parse_snapshot_feeds_make_record():
+    labels = {"zip_code": "11121", "county": "Stockholm", "town": "Stockholm", "consumption": "5000",
+              "contract_type": "FAST PRIS"}
+    item = {"url": "https://elpriskollen.se/avtal/12345?forbrukning=5000", "contract_duration": "3 år"}
+    record = make_record(labels, item, parse_snapshot(load_snapshot()))
+    assert record["provider_id"] == "norrsken-energi"
+    assert record["scraped_zip_code"] == "11121"
+
+
+def test_parse_snapshot_optional_parts_missing():
+    snapshot = load_snapshot()
+    for key in ("headers", "price_rows", "phone", "email_href", "links", "body_text"):
+        snapshot.pop(key)
+    fields = parse_snapshot(snapshot)
+    assert fields["contract_type"] is None and fields["supplier_website"] is None
+    assert fields["price_breakdown"] == {} and fields["energy_sources"] == []
+    assert fields["provider_phone"] is None and fields["provider_email"] is None
+
+
+def test_parse_snapshot_requires_contract_name():
+    snapshot = load_snapshot()
+    snapshot["contract_name"] = None
+    with pytest.raises(ValueError, match="contract_name"):
+        parse_snapshot(snapshot)
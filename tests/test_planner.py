@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import planner
+from planner import balance, make_plan, parse_args, parse_contract_type, parse_shard, update_stats
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("FAST PRIS", "FAST PRIS"),
+    ("fast", "FAST PRIS"),
+    (" timpris ", "TIMPRIS"),
+    ("rörligt", "RÖRLIGT PRIS (MÅNADSBASERAT)"),
+    ("1", "KVARTSPRIS"),
+    ("5", "FAST PRIS"),
+])
+def test_parse_contract_type(value, expected):
+    assert parse_contract_type(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", None, "0", "6", "spotpris", "PRIS"])
+def test_parse_contract_type_rejects(value):
+    with pytest.raises(ValueError):
+        parse_contract_type(value)
+
+
+def test_parse_shard():
+    assert parse_shard("") == (1, 1)
+    assert parse_shard("2/4") == (2, 4)
+    with pytest.raises(ValueError):
+        parse_shard("5/4")
+
+
+def test_balance_longest_first_onto_least_loaded():
+    bins = balance([5, 4, 3, 3, 3], 2)
+    assert bins == [[8.0, [0, 3]], [10.0, [1, 2, 4]]]
+
+
+def test_balance_assigns_every_task_once():
+    weights = [90, 12.5, 30, 30, 61, 7, 90, 45]
+    bins = balance(weights, 3)
+    assigned = sorted(i for _, items in bins for i in items)
+    assert assigned == list(range(len(weights)))
+    assert [load for load, _ in bins] == [sum(weights[i] for i in items) for _, items in bins]
+
+
+@pytest.fixture
+def clean_env(monkeypatch):
+    for name in ("GRID_CONFIG", "ZIP_INDEXES", "ZIP_INDEX", "CONSUMPTION_LEVELS", "CONTRACT_TYPES", "SHARD"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(planner, "GRID_CONFIG", "")
+
+
+def test_shards_split_the_grid(clean_env):
+    argv = ["--zips", "0-3", "--consumptions", "2000,5000", "--contract-types", "fast,timpris"]
+    stats = {}
+    everything = {planner.task_id(t) for t in make_plan(parse_args(argv), stats)["tasks"]}
+    shards = [{planner.task_id(t) for t in make_plan(parse_args(argv + ["--shard", f"{k}/3"]), stats)["tasks"]}
+              for k in (1, 2, 3)]
+    assert len(everything) == 4 * 2 * 2
+    assert set().union(*shards) == everything
+    assert sum(len(s) for s in shards) == len(everything)
+
+
+class Tracer:
+    def __init__(self, spans):
+        self.spans = spans
+
+
+def span(name, seconds, **attrs):
+    attrs = {"zip": "11121", "consumption": "5000", "contract": "TIMPRIS", **attrs}
+    return (name, 0.0, seconds, "main", attrs, True)
+
+
+def test_update_stats_moving_average(tmp_path):
+    path = str(tmp_path / "task_stats.json")
+    first = Tracer([span("results_view", 10.0), span("card_collection", 5.0, cards=20), span("details", 45.0)])
+    assert update_stats(first, path) == 1
+    key = planner.task_id({"zip_code": "11121", "consumption": "5000", "contract_type": "TIMPRIS"})
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)[key] == {"seconds": 60.0, "cards": 20.0}
+
+    second = Tracer([span("results_view", 10.0), span("card_collection", 5.0, cards=30), span("details", 85.0),
+                     span("zip", 500.0)])  # not a task stage
+    update_stats(second, path)
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)[key] == {"seconds": 80.0, "cards": 25.0}
@@ -0,0 +1,61 @@
+import pytest
+
+import throttle
+from throttle import Throttle
+
+
+def test_burst_then_spaced_at_the_rate():
+    t = Throttle(rate=2, burst=2)
+    waits = [t._reserve("goto") for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.5, abs=0.05)
+    assert waits[3] == pytest.approx(1.0, abs=0.05)
+    assert t.requests == {"goto": 4}
+
+
+def test_charge_books_requests_made_without_acquire():
+    t = Throttle(rate=2, burst=1)
+    t.charge("click", 3)
+    assert t._reserve("goto") == pytest.approx(1.5, abs=0.05)
+
+
+def test_disabled_never_waits():
+    t = Throttle(rate=2, burst=1)
+    t.disable("HAR replay")
+    assert [t._reserve("goto") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert t.off_reason == "HAR replay"
+    assert not Throttle(rate=0).enabled
+
+
+def test_additive_increase_up_to_max():
+    t = Throttle(rate=2, max_rate=2.1)
+    t.observe(200, 100)
+    assert t.rate == pytest.approx(2 + throttle.RATE_STEP)
+    for _ in range(10):
+        t.observe(200, 100)
+    assert t.rate == 2.1
+
+
+def test_multiplicative_decrease_once_per_cooldown():
+    t = Throttle(rate=4, min_rate=0.2)
+    t.observe(503)
+    assert t.rate == pytest.approx(4 * throttle.RATE_BACKOFF)
+    t.observe(503)  # within RATE_COOLDOWN: counted, not applied again
+    assert t.rate == pytest.approx(4 * throttle.RATE_BACKOFF)
+    assert t.signals == {"5xx": 2} and t.backoffs == {"5xx": 1}
+
+
+def test_429_pauses_for_retry_after():
+    t = Throttle(rate=4, burst=4)
+    t.observe(429, retry_after=2)
+    assert t._reserve("goto") == pytest.approx(2, abs=0.05)
+
+
+def test_latency_spike_after_warmup():
+    t = Throttle(rate=4)
+    for _ in range(throttle.WARMUP_RESPONSES + 1):
+        t.observe(200, 200)
+    rate = t.rate
+    t.observe(200, 5000)
+    assert t.backoffs == {"latency": 1}
+    assert t.rate == pytest.approx(rate * throttle.RATE_BACKOFF)
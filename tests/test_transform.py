@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+
+from transform import parse_quantity
+
+
+@pytest.mark.parametrize("text, value, unit", [
+    ("128,45 öre/kWh", 128.45, "öre/kWh"),
+    ("39 kr/mån", 39.0, "kr/mån"),
+    ("1 234,50 kr/år", 1234.5, "kr/år"),
+    ("Vid en förbrukning på 5 000 kWh/år", 5000.0, "kWh/år"),
+    ("Jämförpris 2026: 98,1 öre/kWh", 98.1, "öre/kWh"),
+    ("-2,5 %", -2.5, "%"),
+    ("12.3", 12.3, None),
+    ("3 kronor", 3.0, None),
+])
+def test_parse_quantity(text, value, unit):
+    values, units = parse_quantity(pd.Series([text]))
+    assert values[0] == pytest.approx(value)
+    assert (units[0] if pd.notna(units[0]) else None) == unit
+
+
+def test_parse_quantity_missing_and_repeated():
+    values, units = parse_quantity(pd.Series(["4,90 öre/kWh", None, "ingen siffra", "4,90 öre/kWh"], index=[5, 6, 7, 8]))
+    assert list(values.index) == [5, 6, 7, 8]
+    assert values[5] == values[8] == pytest.approx(4.9)
+    assert pd.isna(values[6]) and pd.isna(values[7])
+    assert pd.isna(units[6])
@@ -0,0 +1,55 @@
+from upload_to_sheets import FakeSheetsBackend, SheetUploader, row_key
+
+
+def records(n=3, consumption=5000):
+    return [{"scraped_zip_code": "11121", "scraped_consumption_kwh": consumption,
+             "selected_contract_type": "TIMPRIS", "url": f"https://example.se/avtal/{i}",
+             "price_breakdown": {"Elpris": f"{90 + i},5 öre/kWh"}} for i in range(n)]
+
+
+def upload(backend, recs, when="2026-10-17 06:00"):
+    sleeps = []
+    uploader = SheetUploader(backend, scrape_datetime=when, sleep=sleeps.append)
+    uploader.upload(recs)
+    return uploader, sleeps
+
+
+def test_row_key_matches_values_read_back_from_the_sheet():
+    written = ["11121", "5000", "TIMPRIS", "https://example.se/avtal/0", "2026-10-17 06:00"]
+    read_back = [11121, 5000, "TIMPRIS", "https://example.se/avtal/0", 46312.25]  # unformatted values
+    assert row_key(written) == row_key(read_back)
+    assert row_key([11121, 5000.0, "TIMPRIS", "u", "2026-10-17"]) == row_key(["11121", 5000, "TIMPRIS", "u", 46312])
+
+
+def test_rerun_skips_rows_already_in_the_sheet():
+    backend = FakeSheetsBackend()
+    first, _ = upload(backend, records())
+    assert first.appended == 3
+    rerun, _ = upload(backend, records(), when="2026-10-17 18:30")  # same day, later run
+    assert (rerun.appended, rerun.skipped) == (0, 3)
+    assert len(backend.rows) == 4  # header + 3
+
+
+def test_rerun_appends_new_consumption_only():
+    backend = FakeSheetsBackend()
+    upload(backend, records())
+    rerun, _ = upload(backend, records() + records(consumption=2000))
+    assert (rerun.appended, rerun.skipped) == (3, 3)
+
+
+def test_5xx_after_the_rows_landed_does_not_duplicate_them():
+    # calls: get_header, set_header, append_rows (written, then 503), get_columns
+    backend = FakeSheetsBackend(fail_every=3, fail_status=503)
+    uploader, sleeps = upload(backend, records())
+    assert len(sleeps) == 1
+    assert uploader.appended == 3
+    assert len(backend.rows) == 4
+
+
+def test_429_is_backed_off_and_retried():
+    # calls: get_header, set_header, append_rows (429, nothing written), append_rows
+    backend = FakeSheetsBackend(fail_every=3, fail_status=429)
+    uploader, sleeps = upload(backend, records())
+    assert len(sleeps) == 1 and sleeps[0] > 0
+    assert uploader.appended == 3
+    assert len(backend.rows) == 4
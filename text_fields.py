@@ -0,0 +1,88 @@
+# --------------------------------------------------------------
+# text_fields.py
+# Energy sources + contract terms from one body-text snapshot
+# --------------------------------------------------------------
+# All keyword rules (energy sources, notice period, billing,
+# payment, expiry) are merged into one de-duplicated keyword table.
+# extract() lowercases the body once, then runs one str.find per
+# keyword (so the body is scanned once per keyword, each scan in C)
+# and derives every field from those first positions; the notice
+# period is read right at its keyword instead of by a second regex.
+#
+# Pure Python, no browser: works on archived page text, e.g.
+#   python text_fields.py page.txt [...]
+# Benchmark: python benchmarks/bench_text_fields.py
+# --------------------------------------------------------------
+
+import json
+import re
+import sys
+
+ENERGY_KEYWORDS = ["förnybar", "vatten", "vind", "solkraft", "kärnkraft", "fossilt", "residualmix"]
+
+NOTICE_KEYWORD = "uppsägningstid"
+NOTICE_VALUE_RE = re.compile(r"[:\s]*([^\n\.]+)")
+
+# field → (keywords, "all" | "any", value when matched)
+TERM_RULES = {
+    "billing_options": (("fakturering", "månadsvis"), "all", "Månadsvis i efterskott"),
+    "payment_options": (("betalning", "autogiro", "swish"), "any", "Autogiro, Swish, Faktura"),
+    "expiry_info": (("tillsvidare", "förlängs automatiskt"), "any", "Övergår till tillsvidare avtal vid utgång"),
+}
+
+# --------------------------------------------------------------
+class TextFieldExtractor:
+    def __init__(self, energy_keywords=ENERGY_KEYWORDS, term_rules=TERM_RULES):
+        self.energy_keywords = list(energy_keywords)
+        self.term_rules = dict(term_rules)
+        keywords = [*self.energy_keywords, NOTICE_KEYWORD]
+        for words, _, _ in self.term_rules.values():
+            keywords.extend(words)
+        self.keywords = tuple(dict.fromkeys(keywords))
+
+    def first_positions(self, lowered):
+        """{keyword: first index} for every keyword present in `lowered`,
+        one str.find per keyword."""
+        found = {}
+        for kw in self.keywords:
+            i = lowered.find(kw)
+            if i >= 0:
+                found[kw] = i
+        return found
+
+    def notice_period(self, lowered, start):
+        # first occurrence followed by a value, like re.search would find
+        i = start
+        while i >= 0:
+            m = NOTICE_VALUE_RE.match(lowered, i + len(NOTICE_KEYWORD))
+            if m:
+                return m.group(1).strip()
+            i = lowered.find(NOTICE_KEYWORD, i + 1)
+        return None
+
+    def extract(self, body_text):
+        """Returns energy_sources (keyword order, capitalized), notice_period,
+        billing_options, payment_options and expiry_info."""
+        lowered = (body_text or "").lower()
+        hits = self.first_positions(lowered)
+        fields = {
+            "energy_sources": [kw.capitalize() for kw in self.energy_keywords if kw in hits],
+            "notice_period": self.notice_period(lowered, hits[NOTICE_KEYWORD]) if NOTICE_KEYWORD in hits else None,
+        }
+        for field, (words, mode, value) in self.term_rules.items():
+            matched = all(w in hits for w in words) if mode == "all" else any(w in hits for w in words)
+            fields[field] = value if matched else None
+        return fields
+
+
+TEXT_FIELDS = TextFieldExtractor()
+
+
+def extract_text_fields(body_text):
+    return TEXT_FIELDS.extract(body_text)
+
+# --------------------------------------------------------------
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8") as f:
+            print(json.dumps({"file": path, **extract_text_fields(f.read())}, ensure_ascii=False))
@@ -0,0 +1,208 @@
+# --------------------------------------------------------------
+# throttle.py
+# One adaptive request budget for every goto / click in the process
+# --------------------------------------------------------------
+# THROTTLE.goto(page, url, ...) / THROTTLE.click(page, selector) /
+# THROTTLE.click(locator) wait for a slot in a token bucket shared by
+# all worker threads, contexts and the detail pool, then act.
+#
+# The rate adapts (AIMD) to what the site answers: attach(context)
+# watches document / XHR responses; every healthy one raises the rate
+# by RATE_STEP up to RATE_MAX, a 429, a 5xx or a latency spike
+# (RATE_SPIKE x the running mean) multiplies it by RATE_BACKOFF, at
+# most once per RATE_COOLDOWN seconds, down to RATE_MIN. A 429 also
+# pauses all requests for its Retry-After.
+#
+#   RATE_LIMIT=0 → no throttling (responses are still counted);
+#   a --replay-har run turns it off too (disable())
+#
+# Current rate, backoff events and time spent waiting end up in the
+# Prometheus textfile (metrics()) and in print_summary().
+# --------------------------------------------------------------
+
+import asyncio
+import os
+import threading
+import time
+
+# ==================== CONFIGURATION ====================
+
+RATE_LIMIT = float(os.getenv("RATE_LIMIT", "2"))      # starting rate, requests/s
+RATE_MIN = float(os.getenv("RATE_MIN", "0.2"))
+RATE_MAX = float(os.getenv("RATE_MAX", "8"))
+RATE_BURST = int(os.getenv("RATE_BURST", "4"))
+RATE_STEP = float(os.getenv("RATE_STEP", "0.05"))     # + requests/s per healthy response
+RATE_BACKOFF = float(os.getenv("RATE_BACKOFF", "0.5"))
+RATE_COOLDOWN = float(os.getenv("RATE_COOLDOWN", "5"))
+RATE_SPIKE = float(os.getenv("RATE_SPIKE", "3"))
+
+SPIKE_MIN_MS = 1000    # never call anything faster than this a spike
+WARMUP_RESPONSES = 10  # latency baseline needs this many samples first
+LATENCY_ALPHA = 0.1
+WATCHED_TYPES = ("document", "xhr", "fetch")
+
+
+def retry_after_seconds(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None  # HTTP-date form: fall back to the backoff pause
+
+# --------------------------------------------------------------
+class Throttle:
+    def __init__(self, rate=RATE_LIMIT, min_rate=RATE_MIN, max_rate=RATE_MAX, burst=RATE_BURST):
+        self.enabled = rate > 0
+        self.rate = min(max(rate, min_rate), max_rate) if self.enabled else 0.0
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = max(1, burst)
+        self.tat = 0.0            # theoretical arrival time of the next request (GCRA)
+        self.paused_until = 0.0
+        self.last_backoff = 0.0
+        self.latency_ms = None    # running mean of healthy responses
+        self.requests = {}        # kind -> count
+        self.responses = 0
+        self.waited = 0.0
+        self.backoffs = {}        # reason -> backoff events applied
+        self.signals = {}         # reason -> bad responses seen (incl. during cooldown)
+        self.min_seen = self.rate
+        self.off_reason = None if self.enabled else "RATE_LIMIT=0"
+        self._lock = threading.Lock()
+
+    def disable(self, reason):
+        """No more waiting, e.g. when nothing reaches the site (HAR replay)."""
+        with self._lock:
+            self.enabled = False
+            self.paused_until = 0.0
+            self.off_reason = reason
+
+    # --- budget ---
+    def _reserve(self, kind, n=1):
+        """Seconds the caller must wait before its request; reserves the slot."""
+        now = time.monotonic()
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + n
+            if not self.enabled:
+                return 0.0
+            interval = 1.0 / self.rate
+            tat = max(self.tat, now, self.paused_until)
+            start = max(now, self.paused_until, tat - (self.burst - 1) * interval)
+            self.tat = tat + n * interval
+            wait = start - now
+            self.waited += wait
+            return wait
+
+    def acquire(self, kind="request"):
+        wait = self._reserve(kind)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, kind="request"):
+        wait = self._reserve(kind)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def charge(self, kind, n):
+        """Books `n` requests made without acquire() (e.g. clicks inside one
+        evaluate()), so the requests after them wait for the budget."""
+        if n > 0:
+            self._reserve(kind, n)
+
+    def min_gap_ms(self):
+        return 1000.0 / self.rate if self.enabled else 0.0
+
+    # --- wrapped actions ---
+    def goto(self, page, url, **kwargs):
+        self.acquire("goto")
+        return page.goto(url, **kwargs)
+
+    async def goto_async(self, page, url, **kwargs):
+        await self.acquire_async("goto")
+        return await page.goto(url, **kwargs)
+
+    def click(self, target, selector=None, **kwargs):
+        """click on a page (with selector) or on a locator (without)."""
+        self.acquire("click")
+        return target.click(selector, **kwargs) if selector is not None else target.click(**kwargs)
+
+    # --- feedback ---
+    def attach(self, context):
+        """Feeds document / XHR responses of `context` (sync or async API) into observe()."""
+        context.on("response", self._on_response)
+        return context
+
+    def _on_response(self, response):
+        request = response.request
+        if request.resource_type not in WATCHED_TYPES:
+            return
+        try:
+            latency = request.timing.get("responseStart", -1)
+        except Exception:
+            latency = -1
+        self.observe(response.status, latency if latency >= 0 else None,
+                     retry_after_seconds(response.headers.get("retry-after")))
+
+    def observe(self, status, latency_ms=None, retry_after=None):
+        now = time.monotonic()
+        with self._lock:
+            self.responses += 1
+            reason = None
+            if status == 429:
+                reason = "429"
+            elif status is not None and status >= 500:
+                reason = "5xx"
+            elif (latency_ms is not None and self.latency_ms is not None and self.responses > WARMUP_RESPONSES
+                  and latency_ms > max(SPIKE_MIN_MS, RATE_SPIKE * self.latency_ms)):
+                reason = "latency"
+
+            if reason is None:
+                if latency_ms is not None:
+                    self.latency_ms = latency_ms if self.latency_ms is None else (
+                        (1 - LATENCY_ALPHA) * self.latency_ms + LATENCY_ALPHA * latency_ms)
+                if self.enabled:
+                    self.rate = min(self.max_rate, self.rate + RATE_STEP)
+                return
+
+            self.signals[reason] = self.signals.get(reason, 0) + 1
+            if status == 429 and self.enabled:
+                self.paused_until = max(self.paused_until, now + (retry_after if retry_after is not None else RATE_COOLDOWN))
+            if not self.enabled or now - self.last_backoff < RATE_COOLDOWN:
+                return
+            self.last_backoff = now
+            self.backoffs[reason] = self.backoffs.get(reason, 0) + 1
+            self.rate = max(self.min_rate, self.rate * RATE_BACKOFF)
+            self.min_seen = min(self.min_seen, self.rate)
+        print(f"  throttle: {reason} → backing off to {self.rate:.2f} req/s")
+
+    # --------------------------------------------------------------
+    def metrics(self):
+        """Gauges / counters for TRACER.save_metrics(extra=...)."""
+        with self._lock:
+            out = {
+                "throttle_rate_per_second": round(self.rate, 3),
+                "throttle_min_rate_per_second": round(self.min_seen, 3),
+                "throttle_wait_seconds_total": round(self.waited, 3),
+                "throttle_responses_total": self.responses,
+                "throttle_backoff_events_total": sum(self.backoffs.values()),
+            }
+            for kind, n in self.requests.items():
+                out[f"throttle_{kind}_requests_total"] = n
+            for reason in ("429", "5xx", "latency"):
+                out[f"throttle_backoff_{reason}_total"] = self.backoffs.get(reason, 0)
+        return out
+
+    def print_summary(self):
+        requests = ", ".join(f"{n} {kind}" for kind, n in sorted(self.requests.items())) or "none"
+        if not self.enabled:
+            print(f"\nThrottle: off ({self.off_reason}); requests: {requests}")
+            return
+        signals = ", ".join(f"{n} {r}" for r, n in sorted(self.signals.items())) or "none"
+        print(
+            f"\nThrottle: {requests}; rate now {self.rate:.2f} req/s (low {self.min_seen:.2f}), "
+            f"waited {self.waited:.1f}s; bad responses: {signals}; "
+            f"backoffs: {sum(self.backoffs.values())}"
+        )
+
+
+# Process-wide budget: every thread, context and the detail pool share it
+THROTTLE = Throttle()
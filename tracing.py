@@ -0,0 +1,166 @@
+# --------------------------------------------------------------
+# tracing.py
+# Per-stage spans → JSON trace + Prometheus textfile
+# --------------------------------------------------------------
+# with span("homepage", labels): ...   times one stage; labels (the
+# wizard selection) become zip / consumption / contract attributes.
+#
+# At the end of run():
+#   TRACE_PATH    Chrome trace-event JSON (open in Perfetto or
+#                 chrome://tracing), one event per span
+#   METRICS_PATH  Prometheus textfile (node_exporter textfile
+#                 collector): per-stage sum / count / max / errors
+# Either path set to "" disables that output.
+# --------------------------------------------------------------
+
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# ==================== CONFIGURATION ====================
+
+TRACE_PATH = os.getenv("TRACE_PATH", "run_trace.json")
+METRICS_PATH = os.getenv("METRICS_PATH", "run_metrics.prom")
+METRICS_PREFIX = "elpriskollen"
+
+
+def label_attrs(labels):
+    if not labels:
+        return {}
+    return {
+        "zip": labels.get("zip_code"),
+        "consumption": labels.get("consumption"),
+        "contract": labels.get("contract_type"),
+    }
+
+
+def current_track():
+    """Async tasks (detail pool) get their own track, threads theirs."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return task.get_name() if task is not None else threading.current_thread().name
+
+# --------------------------------------------------------------
+class Tracer:
+    def __init__(self):
+        self.spans = []  # (name, start epoch s, duration s, track, attrs, ok)
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, labels=None, **attrs):
+        attrs = {**label_attrs(labels), **attrs}
+        start = time.time()
+        t0 = time.perf_counter()
+        ok = True
+        try:
+            yield attrs
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            entry = (name, start, time.perf_counter() - t0, current_track(), attrs, ok)
+            with self._lock:
+                self.spans.append(entry)
+
+    # --------------------------------------------------------------
+    def stages(self):
+        """{stage: {"count", "sum", "max", "errors"}}, slowest first."""
+        stats = {}
+        with self._lock:
+            spans = list(self.spans)
+        for name, _, dur, _, _, ok in spans:
+            s = stats.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0, "errors": 0})
+            s["count"] += 1
+            s["sum"] += dur
+            s["max"] = max(s["max"], dur)
+            s["errors"] += 0 if ok else 1
+        return dict(sorted(stats.items(), key=lambda kv: kv[1]["sum"], reverse=True))
+
+    def trace_events(self):
+        with self._lock:
+            spans = list(self.spans)
+        tracks = {}
+        events = []
+        for name, start, dur, track, attrs, ok in spans:
+            tid = tracks.setdefault(track, len(tracks) + 1)
+            events.append({
+                "name": name,
+                "ph": "X",
+                "ts": round((start - self.started) * 1e6),
+                "dur": round(dur * 1e6),
+                "pid": 1,
+                "tid": tid,
+                "args": {**{k: v for k, v in attrs.items() if v is not None}, "ok": ok},
+            })
+        events.extend(
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": track}}
+            for track, tid in tracks.items()
+        )
+        return events
+
+    def save_trace(self, path=TRACE_PATH):
+        if not path:
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "traceEvents": self.trace_events(),
+                "displayTimeUnit": "ms",
+                "otherData": {"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started))},
+            }, f, ensure_ascii=False)
+
+    def prometheus_text(self, extra=None):
+        p = METRICS_PREFIX
+        lines = [
+            f"# HELP {p}_stage_seconds Wall time spent per scrape stage.",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        stages = self.stages()
+        for name, s in stages.items():
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {s["sum"]:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {s["count"]}')
+        lines += [f"# HELP {p}_stage_max_seconds Slowest single span per stage.", f"# TYPE {p}_stage_max_seconds gauge"]
+        lines += [f'{p}_stage_max_seconds{{stage="{name}"}} {s["max"]:.6f}' for name, s in stages.items()]
+        lines += [f"# HELP {p}_stage_errors_total Spans that ended in an exception.", f"# TYPE {p}_stage_errors_total counter"]
+        lines += [f'{p}_stage_errors_total{{stage="{name}"}} {s["errors"]}' for name, s in stages.items()]
+        lines += [
+            f"# HELP {p}_run_duration_seconds Wall time of the run so far.",
+            f"# TYPE {p}_run_duration_seconds gauge",
+            f"{p}_run_duration_seconds {time.time() - self.started:.3f}",
+            f"# HELP {p}_last_run_timestamp_seconds When the run started.",
+            f"# TYPE {p}_last_run_timestamp_seconds gauge",
+            f"{p}_last_run_timestamp_seconds {self.started:.0f}",
+        ]
+        for name, value in (extra or {}).items():
+            lines += [f"# TYPE {p}_{name} gauge", f"{p}_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def save_metrics(self, path=METRICS_PATH, extra=None):
+        """Written to a temp file and renamed, as the textfile collector expects."""
+        if not path:
+            return
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text(extra))
+        os.replace(tmp, path)
+
+    def print_summary(self):
+        print("\nTime per stage:")
+        for name, s in self.stages().items():
+            print(
+                f"  {name:<20} {s['count']:>6} spans  total {s['sum']:>9.2f}s  "
+                f"mean {s['sum'] / s['count']:>7.3f}s  max {s['max']:>7.3f}s  errors {s['errors']}"
+            )
+
+
+# Process-wide tracer; spans from every thread and the detail pool land here
+TRACER = Tracer()
+
+
+def span(name, labels=None, **attrs):
+    return TRACER.span(name, labels, **attrs)
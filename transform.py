@@ -0,0 +1,115 @@
+# --------------------------------------------------------------
+# transform.py
+# Records → flat / typed DataFrame, in bulk
+# --------------------------------------------------------------
+# - records_to_frame(records): the flat export layout every output
+#   path uses (price_breakdown → price_<key> columns, energy_sources
+#   → "a; b"), column order identical to the old per-record loop
+# - records_to_frame(records, typed=True): additionally parses the
+#   Swedish-formatted strings ("123,45 öre/kWh", "1 234 kr/mån") in
+#   jämförpris, consumption_info and every price_* column into
+#   <col>_value (float) + <col>_unit columns
+#
+#   python transform.py combined_output.jsonl typed_output.parquet
+# Benchmark against the old loop: python benchmarks/bench_flatten.py
+# --------------------------------------------------------------
+
+import pandas as pd
+
+# number with space / nbsp / thin-space thousands separators (one
+# between digits, never a newline), decimal comma or, without a comma,
+# decimal point ("12.3", as capture.as_text writes API floats), optional unit
+THOUSANDS_SEPARATORS = " \u00a0\u2009\u202f"
+QUANTITY_VALUE = f"(?P<value>-?\\d(?:[{THOUSANDS_SEPARATORS}]?\\d)*(?:[,.]\\d+)?)\\s*"
+QUANTITY_UNIT = r"(?P<unit>öre/kWh|kr/kWh|kr/mån(?:ad)?|kr/år|kWh/år|kWh|öre|kr|%)(?![^\W\d_])"
+QUANTITY_RE = f"{QUANTITY_VALUE}(?:{QUANTITY_UNIT})?"
+# a number with a unit wins over an earlier bare one ("Jämförpris 2026: 98,1 öre/kWh")
+QUANTITY_WITH_UNIT_RE = QUANTITY_VALUE + QUANTITY_UNIT
+
+PARSED_COLUMNS = ["jämförpris", "consumption_info"]
+
+
+def price_column(key):
+    return f"price_{key.replace(' ', '_').replace('/', '_')}"
+
+# --------------------------------------------------------------
+def records_to_frame(records, typed=False):
+    records = records if isinstance(records, list) else list(records)
+    df = pd.DataFrame.from_records(records)
+    if df.empty:
+        return df
+
+    first_keys = 0
+    if "price_breakdown" in df.columns:
+        pb = pd.DataFrame.from_records([p or {} for p in df.pop("price_breakdown")], index=df.index)
+        pb.columns = [price_column(str(k)) for k in pb.columns]
+        if pb.columns.duplicated().any():
+            # "a b" and "a_b" land in one column; later keys win, like the old loop
+            pb = pb.T.groupby(level=0, sort=False).last().T
+        first_keys = len({price_column(str(k)) for k in (records[0].get("price_breakdown") or {})})
+    else:
+        pb = pd.DataFrame(index=df.index)
+
+    es = None
+    if "energy_sources" in df.columns:
+        es = df.pop("energy_sources").map(lambda v: "; ".join(v) if isinstance(v, list) and v else "")
+
+    # Old loop: row 0 decides the order (base, its price keys, energy_sources),
+    # price keys first seen in later rows are appended after that
+    parts = [df, pb.iloc[:, :first_keys]]
+    if es is not None:
+        parts.append(es.to_frame("energy_sources"))
+    parts.append(pb.iloc[:, first_keys:])
+    flat = pd.concat(parts, axis=1)
+
+    if typed:
+        flat = add_typed_columns(flat)
+    return flat
+
+
+def parse_quantity(series):
+    """Swedish-formatted strings → (float values, unit strings). The first
+    number with a unit is taken, else the first number. Each distinct
+    string is parsed once; prices repeat a lot across rows."""
+    codes, uniques = pd.factorize(series.astype("string"))
+    uniques = pd.Series(uniques, dtype="string")
+    with_unit = uniques.str.extract(QUANTITY_WITH_UNIT_RE)
+    ext = with_unit.where(with_unit["value"].notna(), uniques.str.extract(QUANTITY_RE))
+    values = pd.to_numeric(
+        ext["value"].str.replace(r"[^\d,.\-]", "", regex=True).str.replace(",", ".", regex=False),
+        errors="coerce",
+    ).astype("Float64")
+    # code -1 (missing) → the appended NA slot
+    values = pd.concat([values, pd.Series([pd.NA], dtype="Float64")], ignore_index=True)
+    units = pd.concat([ext["unit"], pd.Series([pd.NA], dtype="string")], ignore_index=True)
+    return (
+        pd.Series(values.array.take(codes), index=series.index),
+        pd.Series(units.array.take(codes), index=series.index),
+    )
+
+
+def add_typed_columns(flat):
+    cols = [c for c in flat.columns if c in PARSED_COLUMNS or c.startswith("price_")]
+    typed = {}
+    for col in cols:
+        typed[f"{col}_value"], typed[f"{col}_unit"] = parse_quantity(flat[col])
+    return pd.concat([flat, pd.DataFrame(typed, index=flat.index)], axis=1)
+
+# --------------------------------------------------------------
+if __name__ == "__main__":
+    # python transform.py combined_output.jsonl typed_output.parquet
+    import json
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python transform.py <records.jsonl|.json> <typed.parquet|.csv>")
+        sys.exit(1)
+    src, dst = sys.argv[1:]
+    with open(src, "r", encoding="utf-8") as f:
+        records = json.load(f) if src.endswith(".json") else [json.loads(l) for l in f if l.strip()]
+    df = records_to_frame(records, typed=True)
+    if dst.endswith(".csv"):
+        df.to_csv(dst, index=False)
+    else:
+        df.to_parquet(dst, index=False)
+    print(f"{len(df)} rows, {len(df.columns)} columns → {dst}")
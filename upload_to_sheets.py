@@ -1,53 +1,335 @@
 # upload_to_sheets.py
-import json
-import pandas as pd
-from datetime import datetime
-import gspread
-from google.oauth2.service_account import Credentials
+# --------------------------------------------------------------
+# Appends scraped records to the Google Sheet
+# --------------------------------------------------------------
+# - Fan-in: any number of record files (shard outputs), e.g.
+#     python upload_to_sheets.py shard_*/combined_output.jsonl
+#   default: combined_output.jsonl, else combined_output.json
+# - Batched: UPLOAD_BATCH_ROWS rows per append_rows call, records are
+#   streamed from .jsonl inputs batch by batch
+# - Backoff: quota (429) and 5xx errors are retried with truncated
+#   exponential backoff + jitter; an append that failed with a 5xx may
+#   still have been written, so the key columns are re-read first and
+#   only the rows that are not in the sheet are appended again
+# - Idempotent: rows whose natural key (zip, consumption, contract
+#   type, url, scrape date) is already in the sheet, or earlier in the
+#   same upload, are skipped, so reruns and overlapping shards don't
+#   duplicate rows
+# - Backend is swappable: GspreadBackend (real sheet) or
+#   FakeSheetsBackend (in memory), SHEETS_BACKEND=fake for a dry run
+# --------------------------------------------------------------
 import os
+import random
+import sys
+import time
+import math
+from datetime import datetime, timedelta
+from itertools import zip_longest
+
+from output_stream import expand_inputs, iter_input_records
+from transform import records_to_frame
 
 # === CONFIG ===
 GOOGLE_SHEET_URL = "https://docs.google.com/spreadsheets/d/1CpRBgEPTQRE96PnitwTfE8ZzpSOAgUR11-m-9uL43Z4/edit?gid=0#gid=0"
-JSON_INPUT = "combined_output.json"
+CREDENTIALS_FILE = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json")
+SHEETS_BACKEND = os.getenv("SHEETS_BACKEND", "gspread")  # gspread | fake
+UPLOAD_BATCH_ROWS = int(os.getenv("UPLOAD_BATCH_ROWS", "500"))
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "6"))
+UPLOAD_BACKOFF_BASE = float(os.getenv("UPLOAD_BACKOFF_BASE", "1.0"))
+UPLOAD_BACKOFF_MAX = 64.0
 
-def upload_to_google_sheet():
-    print("Loading data...")
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Natural key of a sheet row; scrape_datetime is reduced to its date
+KEY_COLUMNS = ["zip_code", "scraped_consumption_kwh", "selected_contract_type", "url", "scrape_datetime"]
+
+# Day 0 of the serial numbers Sheets stores dates as
+SHEETS_EPOCH = datetime(1899, 12, 30)
+
+
+def key_value(v):
+    """One key cell as text. Rows are appended USER_ENTERED, so "5000" comes
+    back from the sheet as the number 5000; numbers and numeric strings are
+    both written the same way ("5000", never "5000.0")."""
+    if v is None or isinstance(v, float) and math.isnan(v):
+        return ""
+    if isinstance(v, str):
+        try:
+            v = float(v)
+        except ValueError:
+            return v.strip()
+    if isinstance(v, (int, float)) and math.isfinite(v):
+        return str(int(v)) if float(v).is_integer() else repr(float(v))
+    return str(v)
+
+
+def key_date(v):
+    """Date part of scrape_datetime, from "YYYY-MM-DD HH:MM" text or a
+    serial number as read back from the sheet."""
+    if isinstance(v, (int, float)) and not (isinstance(v, float) and math.isnan(v)):
+        return (SHEETS_EPOCH + timedelta(days=v)).strftime("%Y-%m-%d")
+    return key_value(v)[:10]
+
+
+def row_key(values):
+    """values in KEY_COLUMNS order → hashable key (date part of scrape_datetime)."""
+    *values, when = values
+    return tuple(key_value(v) for v in values) + (key_date(when),)
+
+# --------------------------------------------------------------
+# Backends: anything with get_header / set_header / get_columns / append_rows
+# (set_header(header, insert=True) puts the header above existing rows)
+
+class GspreadBackend:
+    def __init__(self, url=GOOGLE_SHEET_URL, credentials=CREDENTIALS_FILE):
+        import gspread
+        from google.oauth2.service_account import Credentials
+
+        creds = Credentials.from_service_account_file(credentials, scopes=["https://www.googleapis.com/auth/spreadsheets"])
+        self.sheet = gspread.authorize(creds).open_by_url(url).sheet1
+
+    def get_header(self):
+        return self.sheet.row_values(1)
+
+    def set_header(self, header, insert=False):
+        if insert:
+            self.sheet.insert_row(header, 1)
+        else:
+            self.sheet.update(range_name="A1", values=[header])
+
+    def get_columns(self, indexes):
+        """Values below the header of the given 0-based columns, one list each.
+        Read unformatted (dates as serial numbers), so the keys don't depend
+        on the sheet's number and date formats."""
+        from gspread.utils import rowcol_to_a1
+
+        if not indexes:
+            return []
+        letters = [rowcol_to_a1(1, i + 1)[:-1] for i in indexes]
+        ranges = self.sheet.batch_get([f"{c}2:{c}" for c in letters], value_render_option="UNFORMATTED_VALUE",
+                                      date_time_render_option="SERIAL_NUMBER")
+        return [[row[0] if row else "" for row in values] for values in ranges]
+
+    def append_rows(self, rows):
+        self.sheet.append_rows(rows, value_input_option="USER_ENTERED")
+
+
+class QuotaError(Exception):
+    """What FakeSheetsBackend raises; shaped like gspread's APIError."""
+
+    def __init__(self, status_code=429):
+        super().__init__(f"HTTP {status_code}")
+        self.response = type("Response", (), {"status_code": status_code})()
+
+
+def as_entered(value):
+    """What a USER_ENTERED cell holds: numeric text becomes a number and
+    "YYYY-MM-DD HH:MM" a date serial number."""
+    if not isinstance(value, str):
+        return value
+    try:
+        return (datetime.strptime(value, "%Y-%m-%d %H:%M") - SHEETS_EPOCH) / timedelta(days=1)
+    except ValueError:
+        pass
     try:
-        with open(JSON_INPUT, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        print(f"{JSON_INPUT} not found.")
-        return
+        number = float(value)
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() else number
+
+
+class FakeSheetsBackend:
+    """In-memory sheet. fail_every=n raises `fail_status` on every n-th
+    call; a 5xx from append_rows comes after the rows were written, like
+    a response lost on the way back. Appended values are stored and read
+    back the way GspreadBackend sees them (see as_entered)."""
+
+    def __init__(self, rows=None, fail_every=0, fail_status=429):
+        self.rows = [list(r) for r in (rows or [])]
+        self.fail_every = fail_every
+        self.fail_status = fail_status
+        self.calls = 0
 
-    if not data:
+    def _call(self):
+        self.calls += 1
+        if self.fail_every and self.calls % self.fail_every == 0:
+            raise QuotaError(self.fail_status)
+
+    def get_header(self):
+        self._call()
+        return list(self.rows[0]) if self.rows else []
+
+    def set_header(self, header, insert=False):
+        self._call()
+        if self.rows and not insert:
+            self.rows[0] = list(header)
+        else:
+            self.rows.insert(0, list(header))
+
+    def get_columns(self, indexes):
+        self._call()
+        return [[r[i] if i < len(r) else "" for r in self.rows[1:]] for i in indexes]
+
+    def append_rows(self, rows):
+        rows = [[as_entered(v) for v in r] for r in rows]
+        if self.fail_status >= 500:
+            self.rows.extend(rows)
+            self._call()
+        else:
+            self._call()
+            self.rows.extend(rows)
+
+
+def make_backend(kind=SHEETS_BACKEND):
+    if kind == "fake":
+        return FakeSheetsBackend()
+    return GspreadBackend()
+
+# --------------------------------------------------------------
+def status_of(exc):
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def is_retryable(exc):
+    return status_of(exc) in RETRYABLE_STATUS
+
+
+def backoff(e, attempt, retries=UPLOAD_MAX_RETRIES, base=UPLOAD_BACKOFF_BASE, sleep=time.sleep):
+    delay = min(UPLOAD_BACKOFF_MAX, base * 2 ** attempt) + random.uniform(0, base)
+    print(f"Sheets API {e}; retrying in {delay:.1f}s ({attempt + 1}/{retries})")
+    sleep(delay)
+
+
+def with_backoff(fn, *args, retries=UPLOAD_MAX_RETRIES, base=UPLOAD_BACKOFF_BASE, sleep=time.sleep):
+    """For idempotent calls only (reads, header writes); appends go
+    through SheetUploader._append."""
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            backoff(e, attempt, retries, base, sleep)
+
+
+def iter_batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# --------------------------------------------------------------
+class SheetUploader:
+    def __init__(self, backend, batch_rows=UPLOAD_BATCH_ROWS, scrape_datetime=None, sleep=time.sleep):
+        self.backend = backend
+        self.batch_rows = batch_rows
+        self.scrape_datetime = scrape_datetime or datetime.now().strftime("%Y-%m-%d %H:%M")
+        self.sleep = sleep
+        self.header = None
+        self.headerless = False
+        self.seen = set()
+        self.appended = 0
+        self.skipped = 0
+        self.zips = set()
+
+    def _call(self, fn, *args):
+        return with_backoff(fn, *args, sleep=self.sleep)
+
+    def _load_existing(self):
+        self.header = self._call(self.backend.get_header)
+        if self.header and "scrape_datetime" not in self.header:
+            # rows from before the uploader wrote a header: put one above them
+            self.headerless = True
+            self.header = []
+            return
+        present = [c for c in KEY_COLUMNS if c in self.header]
+        if len(present) < len(KEY_COLUMNS):
+            return  # empty sheet or an old layout without the key columns
+        columns = self._call(self.backend.get_columns, [self.header.index(c) for c in KEY_COLUMNS])
+        for values in zip_longest(*columns, fillvalue=""):  # trailing blanks are omitted by the API
+            self.seen.add(row_key(values))
+        print(f"Sheet has {len(self.seen)} existing rows")
+
+    def _frame(self, records):
+        df = records_to_frame(records)
+        df.insert(0, "scrape_datetime", self.scrape_datetime)
+        df.insert(1, "zip_code", [r.get("scraped_zip_code", "") for r in records])
+        return df
+
+    def _extend_header(self, columns):
+        new = [c for c in columns if c not in self.header]
+        if new or not self.header:
+            self.header = self.header + new
+            self._call(self.backend.set_header, self.header, self.headerless)
+            self.headerless = False
+
+    def _in_sheet(self):
+        """Keys of the rows now in the sheet (re-read from the key columns)."""
+        columns = self._call(self.backend.get_columns, [self.header.index(c) for c in KEY_COLUMNS])
+        return {row_key(values) for values in zip_longest(*columns, fillvalue="")}
+
+    def _append(self, rows, keys):
+        """append_rows is not idempotent. A 429 means nothing was written,
+        so it is retried as is; after a 5xx the batch may have landed, so
+        the key columns are re-read and only the missing rows are retried."""
+        for attempt in range(UPLOAD_MAX_RETRIES + 1):
+            try:
+                return self.backend.append_rows(rows)
+            except Exception as e:
+                if attempt == UPLOAD_MAX_RETRIES or not is_retryable(e):
+                    raise
+                backoff(e, attempt, sleep=self.sleep)
+                if status_of(e) != 429:
+                    if any(c not in self.header for c in KEY_COLUMNS):
+                        raise  # no way to tell whether the rows landed
+                    present = self._in_sheet()
+                    missing = [i for i, key in enumerate(keys) if key not in present]
+                    if not missing:
+                        print("Batch was written despite the error; not appending it again")
+                        return
+                    rows, keys = [rows[i] for i in missing], [keys[i] for i in missing]
+
+    def upload_batch(self, records):
+        df = self._frame(records)
+        keep = []
+        for values in df.reindex(columns=KEY_COLUMNS).itertuples(index=False, name=None):
+            key = row_key(values)
+            keep.append(key not in self.seen)
+            self.seen.add(key)
+        df = df[keep]
+        self.skipped += len(keep) - len(df)
+        if df.empty:
+            return
+        self._extend_header(df.columns)
+        df = df.reindex(columns=self.header)
+        keys = [row_key(values) for values in df.reindex(columns=KEY_COLUMNS).itertuples(index=False, name=None)]
+        rows = df.astype(object).where(df.notna(), "").values.tolist()
+        self._append(rows, keys)
+        self.appended += len(rows)
+        self.zips.update(df["zip_code"])
+
+    def upload(self, records):
+        self._load_existing()
+        for batch in iter_batches(records, self.batch_rows):
+            self.upload_batch(batch)
+        return self.appended
+
+
+def upload_to_google_sheet(paths=None, backend=None):
+    print("Loading data...")
+    files = expand_inputs(paths)
+    uploader = SheetUploader(backend or make_backend())
+    uploader.upload(iter_input_records(files))
+    if not uploader.appended and not uploader.skipped:
         print("No data.")
-        return
-
-    # Flatten
-    flat_data = []
-    for item in data:
-        flat = item.copy()
-        pb = flat.pop("price_breakdown", {})
-        for k, v in pb.items():
-            flat[f"price_{k.replace(' ', '_').replace('/', '_')}"] = v
-        es = flat.pop("energy_sources", [])
-        flat["energy_sources"] = "; ".join(es) if es else ""
-        flat_data.append(flat)
-
-    df = pd.DataFrame(flat_data).fillna("").astype(str).replace("nan", "")
-
-    scrape_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-    df.insert(0, "scrape_datetime", scrape_date)
-    df.insert(1, "zip_code", data[0].get("scraped_zip_code", ""))
-
-    # Auth
-    creds = Credentials.from_service_account_file("credentials.json", scopes=["https://www.googleapis.com/auth/spreadsheets"])
-    client = gspread.authorize(creds)
-    sheet = client.open_by_url(GOOGLE_SHEET_URL).sheet1
-
-    # Append
-    sheet.append_rows(df.values.tolist(), value_input_option="USER_ENTERED")
-    print(f"Appended {len(df)} rows for ZIP {data[0].get('scraped_zip_code')}")
+        return uploader
+    print(f"Appended {uploader.appended} rows for ZIP {', '.join(sorted(uploader.zips))} "
+          f"({uploader.skipped} already in the sheet) from {len(files)} file(s)")
+    return uploader
 
 if __name__ == "__main__":
-    upload_to_google_sheet()
+    upload_to_google_sheet(sys.argv[1:])